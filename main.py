@@ -3,6 +3,7 @@ import sys
 import os
 from src.GUI.user.login_laucher_user import login_user
 from src.GUI.admin.login_laucher_admin import login_admin
+from src.BUS.ai_core.model_warmup import get_warmup_service
 # --- IMPORT FILE GIAO DIỆN USER & ADMIN ---
 # Import từ thư mục GUI/user/ và GUI/admin/
 
@@ -161,4 +162,6 @@ def main(page: ft.Page):
     page.add(layout)
 
 if __name__ == "__main__":
+    # Nạp trước ArcFace + model ngủ gật trong background trong lúc UI hiển thị
+    get_warmup_service().start()
     ft.app(target=main, assets_dir=".")
\ No newline at end of file
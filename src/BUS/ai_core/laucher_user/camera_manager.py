@@ -2,13 +2,23 @@ import cv2
 import base64
 import threading
 import time
-import os
-from .sleep_detector import SleepDetector
+from src.BUS.ai_core.model_warmup import get_warmup_service
+from src.BUS.ai_core.model_config import get_config_section
+from src.BUS.ai_core.laucher_user.frame_mailbox import FrameMailbox
+from src.BUS.ai_core.laucher_user.inference_scheduler import InferenceScheduler
+from src.BUS.ai_core.laucher_user.face_roi import FaceROITracker
+from src.BUS.ai_core.laucher_user.drowsiness_state import DrowsinessStateMachine
+from src.BUS.ai_core.laucher_user.overlay_renderer import OverlayRenderer
+from src.BUS.ai_core.laucher_user.detections import empty_detections
 
 class CameraManager:
     def __init__(self, update_callback, alert_callback=None, camera_index=0):
         """
         Quản lý camera cho giao diện người dùng chính (Driver Dashboard).
+        Pipeline 3 stage, nối bằng mailbox 1 ô (latest-frame-wins):
+            capture (tốc độ camera) → inference (tốc độ model) → encode/UI (camera.pipeline.ui_fps)
+        Stage chậm chỉ bỏ lỡ frame trung gian, không bao giờ xử lý frame cũ.
+        InferenceScheduler điều tốc model; giữa 2 lần suy luận, UI vẽ lại detections gần nhất.
         :param update_callback: Hàm callback nhận chuỗi base64 image để cập nhật UI
         :param alert_callback: Hàm callback nhận thông báo cảnh báo (msg)
         :param camera_index: Chỉ số camera (0: default)
@@ -19,36 +29,83 @@ class CameraManager:
         self.cap = None
         self.is_running = False
         self.thread = None
+        self.threads = []
         self.lock = threading.Lock()
-        
+
+        # Mailbox giữa các stage
+        self.inference_box = FrameMailbox("inference")
+        self.render_box = FrameMailbox("render")
+
+        pipeline_config = get_config_section("camera", "pipeline")
+        self.ui_interval = 1.0 / max(float(pipeline_config.get('ui_fps', 30)), 1.0)
+        self.jpeg_quality = int(pipeline_config.get('jpeg_quality', 80))
+        self.capture_buffer_size = int(pipeline_config.get('buffer_size', 1))
+        self.ui_visible = True
+        self.overlay = OverlayRenderer(enabled=bool(
+            get_config_section("drowsiness_detection", "overlay").get('enabled', True)
+        ))
+        self.frame_counts = {'capture': 0, 'inference': 0, 'render': 0}
+        self.capture_fps = float(get_config_section("camera").get('fps', 30))
+
+        # Điều tốc suy luận + detections gần nhất để dùng lại giữa 2 lần chạy model
+        self.scheduler = InferenceScheduler(get_config_section("drowsiness_detection", "scheduler"))
+        self.last_detections = empty_detections()
+
+        # Vùng mặt tài xế: model chạy trên crop nhỏ thay vì cả frame 640x480
+        self.face_roi = FaceROITracker(get_config_section("drowsiness_detection", "roi"))
+
         # AI Detection
         self.is_ai_active = False
-        self.last_alert_time = 0 
-        self.ALERT_COOLDOWN = 3.0 
-        self.eye_closed_start_time = None 
-        self.is_sleeping_alert_sent = False # Cờ đánh dấu đã gửi cảnh báo ngủ gật chưa
-        
+        # Trạng thái phiên AI (scheduler / ROI / drowsiness) chỉ được sửa trên luồng inference;
+        # toggle_ai chỉ tăng session, luồng inference reset khi thấy session mới
+        self.state_lock = threading.Lock()
+        self.session = 0
+        self._active_session = 0
+        # PERCLOS + microsleep theo timestamp lúc chụp (không tính lag xử lý)
+        self.drowsiness = DrowsinessStateMachine(get_config_section("drowsiness_detection", "temporal"))
+
+        # Model do ModelWarmupService nạp nền - camera chạy ngay, AI bật khi model sẵn sàng
+        self.sleep_detector = None
         try:
-            model_path = os.path.abspath("models/trained_modek_Run/best.pt")
-            self.sleep_detector = SleepDetector(model_path)
+            future = get_warmup_service().future('drowsiness')
+            get_warmup_service().start(['drowsiness'])
+            future.add_done_callback(self._on_detector_ready)
         except Exception as e:
             print(f"Lỗi init SleepDetector: {e}")
             self.sleep_detector = None
 
+    def _on_detector_ready(self, future):
+        """Callback khi warm-up model ngủ gật xong"""
+        if future.exception() is None:
+            self.sleep_detector = future.result()
+        else:
+            print(f"Lỗi init SleepDetector: {future.exception()}")
+
     def start(self):
-        """Khởi động luồng đọc camera"""
+        """Khởi động 3 luồng capture / inference / render"""
         if self.is_running:
             return
-        
+
         try:
             self.cap = cv2.VideoCapture(self.camera_index)
             if not self.cap.isOpened():
                 print(f"❌ [CAMERA] Không thể mở camera {self.camera_index}")
                 return
+            # Buffer driver nhỏ nhất có thể → cap.read() luôn trả frame mới
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, self.capture_buffer_size)
 
+            self.inference_box.reset()
+            self.render_box.reset()
+            self.frame_counts = {'capture': 0, 'inference': 0, 'render': 0}
             self.is_running = True
-            self.thread = threading.Thread(target=self._capture_loop, daemon=True)
-            self.thread.start()
+            self.threads = [
+                threading.Thread(target=self._capture_loop, name="camera-capture", daemon=True),
+                threading.Thread(target=self._inference_loop, name="camera-inference", daemon=True),
+                threading.Thread(target=self._render_loop, name="camera-render", daemon=True),
+            ]
+            self.thread = self.threads[0]
+            for thread in self.threads:
+                thread.start()
             print("✅ [CAMERA] Đã khởi động camera dashboard")
         except Exception as e:
             print(f"❌ [CAMERA] Lỗi khởi động: {e}")
@@ -56,9 +113,13 @@ class CameraManager:
     def stop(self):
         """Dừng camera và giải phóng tài nguyên"""
         self.is_running = False
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=1.0)
-        
+        self.inference_box.close()
+        self.render_box.close()
+        for thread in self.threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+        self.threads = []
+
         with self.lock:
             if self.cap:
                 self.cap.release()
@@ -66,18 +127,43 @@ class CameraManager:
         print("🛑 [CAMERA] Đã dừng camera dashboard")
 
     def toggle_ai(self, active: bool):
-        """Bật/Tắt chế độ nhận diện buồn ngủ"""
-        self.is_ai_active = active
+        """Bật/Tắt chế độ nhận diện buồn ngủ (reset phiên chạy trên luồng inference)"""
+        with self.state_lock:
+            self.is_ai_active = active
+            self.session += 1
+            # Overlay không vẽ lại detections của phiên cũ trong lúc chờ luồng inference
+            self.last_detections = empty_detections()
+        if not self.is_running:
+            # Không có luồng inference → reset ngay tại đây
+            self._apply_session()
         status = "BẬT" if active else "TẮT"
         print(f"🤖 [AI CORE] Chế độ giám sát: {status}")
 
+    def set_ui_visible(self, visible: bool):
+        """UI ẩn → bỏ hẳn stage vẽ + encode (AI và cảnh báo vẫn chạy)"""
+        self.ui_visible = visible
+
+    def stats(self):
+        """Số frame mỗi stage đã xử lý / bỏ qua (để đo pipeline)"""
+        return {
+            **self.frame_counts,
+            'inference_dropped': self.inference_box.dropped,
+            'render_dropped': self.render_box.dropped,
+            'stride': self.scheduler.stride(self.capture_fps),
+            **self.scheduler.report(),
+            **self._drowsiness_metrics()
+        }
+
+    # ================= STAGE 1: CAPTURE =================
+
     def _capture_loop(self):
-        """Vòng lặp đọc frame liên tục"""
+        """Đọc frame theo tốc độ camera, phát vào mailbox (không chờ stage sau)"""
         while self.is_running:
             with self.lock:
                 if not self.cap or not self.cap.isOpened():
                     break
                 ret, frame = self.cap.read()
+            captured_at = time.monotonic()
 
             if not ret:
                 time.sleep(0.1)
@@ -85,54 +171,132 @@ class CameraManager:
 
             # Lật ảnh ngang (Mirror effect)
             frame = cv2.flip(frame, 1)
+            self.frame_counts['capture'] += 1
+
+            if self._ai_enabled():
+                # Stage render vẽ lên frame → đưa bản copy, frame gốc (+ lúc chụp) cho model
+                self.inference_box.put((captured_at, frame))
+                if self.ui_visible:
+                    self.render_box.put(frame.copy() if self.overlay.enabled else frame)
+            elif self.ui_visible:
+                self.render_box.put(frame)
+
+        self.inference_box.close()
+        self.render_box.close()
+
+    # ================= STAGE 2: INFERENCE =================
+
+    def _inference_loop(self):
+        """Chạy model trên frame MỚI NHẤT theo nhịp InferenceScheduler"""
+        while self.is_running:
+            self._apply_session()
 
-            # AI Processing
-            is_drowsy = False
-            if self.is_ai_active and self.sleep_detector:
-                frame, detections, is_drowsy = self.sleep_detector.predict(frame)
-                
-                # ================= ALERT LOGIC =================
-                if is_drowsy:
-                    # Bắt đầu đếm thời gian
-                    if self.eye_closed_start_time is None:
-                        self.eye_closed_start_time = time.time()
-                    
-                    duration = time.time() - self.eye_closed_start_time
-                    
-                    # Nếu nhắm mắt >= 1.5s VÀ chưa báo động lần nào trong đợt này
-                    if duration >= 1.5 and not self.is_sleeping_alert_sent:
-                        self.is_sleeping_alert_sent = True # Đã báo, không spam nữa
-                        if self.alert_callback:
-                            self.alert_callback(f"⚠️ CẢNH BÁO: ĐANG NGỦ GẬT!")
-                            print(f"⚠️ [ALERT] Start sleeping event detected")
-                            
-                else:
-                    # Người dùng mở mắt lại
-                    if self.is_sleeping_alert_sent:
-                        # Kết thúc đợt ngủ gật -> Tính tổng thời gian
-                        if self.eye_closed_start_time:
-                            total_duration = time.time() - self.eye_closed_start_time
-                            msg = f"✅ Đã tỉnh giấc! Tổng thời gian ngủ: {total_duration:.1f}s"
-                            if self.alert_callback:
-                                self.alert_callback(msg, type="info") # type="info" để hiển thị màu khác nếu cần
-                            print(f"✅ [ALERT] End sleeping event. Total: {total_duration:.2f}s")
-                    
-                    # Reset trạng thái
-                    self.eye_closed_start_time = None
-                    self.is_sleeping_alert_sent = False
-                # ===============================================
+            # Chờ tới lượt: các frame đến trong lúc chờ bị mailbox ghi đè (stride)
+            delay = self.scheduler.wait_time()
+            if delay > 0:
+                time.sleep(min(delay, 0.5))
+                continue
+
+            item = self.inference_box.get(timeout=0.5)
+            if item is None:
+                continue
+            _, (captured_at, frame) = item
+
+            detector = self.sleep_detector
+            with self.state_lock:
+                session = self.session
+                active = self.is_ai_active
+            if not active or detector is None or session != self._active_session:
+                continue
+
+            started_at = time.monotonic()
+            roi = self.face_roi.update(frame, started_at)
+            _, detections, _ = detector.predict(
+                frame, annotate=False, roi=roi, imgsz=self.face_roi.imgsz if roi else None
+            )
+            score = detector.closed_score(detections)
+
+            with self.state_lock:
+                # Bật / tắt AI trong lúc predict → kết quả thuộc phiên cũ, bỏ
+                if session != self.session:
+                    continue
+                self.scheduler.record(time.monotonic() - started_at, started_at)
+                self.frame_counts['inference'] += 1
+                self.last_detections = detections
+                event = self.drowsiness.update(score, captured_at)
+            self._handle_drowsiness_event(event)
+
+    def _handle_drowsiness_event(self, event):
+        """Chuyển sự kiện của DrowsinessStateMachine thành thông báo UI"""
+        if event is None or not self.alert_callback:
+            return
+
+        if event['type'] == 'start':
+            if event['reason'] == 'perclos':
+                self.alert_callback(f"⚠️ CẢNH BÁO: MỆT MỎI! Nhắm mắt {event['perclos']:.0%} thời gian gần đây")
+            else:
+                self.alert_callback(f"⚠️ CẢNH BÁO: ĐANG NGỦ GẬT!")
+            print(f"⚠️ [ALERT] Start sleeping event detected ({event['reason']}, PERCLOS {event['perclos']:.0%})")
+        else:
+            msg = f"✅ Đã tỉnh giấc! Tổng thời gian ngủ: {event['duration']:.1f}s"
+            self.alert_callback(msg, type="info") # type="info" để hiển thị màu khác nếu cần
+            print(f"✅ [ALERT] End sleeping event. Total: {event['duration']:.2f}s")
+
+    # ================= STAGE 3: ENCODE / UI =================
+
+    def _render_loop(self):
+        """Encode JPEG → Base64 → callback UI, tối đa ui_fps, luôn lấy frame mới nhất"""
+        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
+        next_frame_at = 0.0
+        while self.is_running:
+            # Giới hạn FPS UI: ngủ tới lượt kế tiếp, frame đến trong lúc chờ bị ghi đè
+            delay = next_frame_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            item = self.render_box.get(timeout=0.5)
+            if item is None:
+                continue
+            _, frame = item
+            next_frame_at = time.monotonic() + self.ui_interval
+
+            if not self.ui_visible:
+                continue
+            if self.is_ai_active:
+                detector = self.sleep_detector
+                if detector is not None:
+                    self.overlay.draw(frame, self.last_detections, detector.names, detector.drowsy_class_ids)
 
             try:
                 # Encode sang JPEG -> Base64
-                _, buffer = cv2.imencode('.jpg', frame)
+                _, buffer = cv2.imencode('.jpg', frame, encode_params)
                 b64_img = base64.b64encode(buffer).decode('utf-8')
-                
+
                 # Gọi callback cập nhật UI
                 if self.update_callback:
                     self.update_callback(b64_img)
-            
+                self.frame_counts['render'] += 1
+
             except Exception as e:
                 print(f"⚠️ [CAMERA] Lỗi xử lý frame: {e}")
-            
-            # Giới hạn FPS (~30fps)
-            time.sleep(0.03)
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _ai_enabled(self):
+        return self.is_ai_active and self.sleep_detector is not None
+
+    def _apply_session(self):
+        """Reset trạng thái phiên AI nếu toggle_ai đã mở phiên mới"""
+        with self.state_lock:
+            if self._active_session == self.session:
+                return
+            self._active_session = self.session
+            self.scheduler.reset()
+            self.face_roi.reset()
+            self.last_detections = empty_detections()
+            event = self.drowsiness.stop(time.monotonic())
+        self._handle_drowsiness_event(event)
+
+    def _drowsiness_metrics(self):
+        with self.state_lock:
+            return self.drowsiness.metrics(time.monotonic())
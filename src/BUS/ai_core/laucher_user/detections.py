@@ -0,0 +1,68 @@
+"""
+Drowsiness Detections
+=====================
+Định dạng kết quả gọn của SleepDetector.predict: 1 mảng NumPy có cấu trúc,
+mỗi hàng 1 box (cls, conf, xyxy trong tọa độ frame).
+
+Tách khỏi sleep_detector.py để CameraManager / OverlayRenderer dùng được
+mà không phải import ultralytics (model vẫn nạp nền qua ModelWarmupService).
+"""
+
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([('cls', np.int32), ('conf', np.float32), ('xyxy', np.float32, (4,))])
+
+# Tên class chứa 1 trong các từ khóa này được tính là nhắm mắt / ngủ gật
+DROWSY_KEYWORDS = ("close", "closed", "sleep", "drowsy", "eye_close")
+
+
+def empty_detections() -> np.ndarray:
+    """Mảng detections rỗng (không có box / model chưa sẵn sàng)"""
+    return np.empty(0, dtype=DETECTION_DTYPE)
+
+
+def from_boxes_data(data: np.ndarray, offset_x: int = 0, offset_y: int = 0) -> np.ndarray:
+    """
+    Chuyển boxes.data của Ultralytics (đã .cpu().numpy(), 1 lần copy) sang DETECTION_DTYPE
+
+    Args:
+        data: (N, 6) [x1, y1, x2, y2, conf, cls] - hoặc (N, 7) khi có track id
+        offset_x, offset_y: Gốc của crop ROI trong frame
+
+    Returns:
+        np.ndarray DETECTION_DTYPE (N,)
+    """
+    detections = np.empty(len(data), dtype=DETECTION_DTYPE)
+    detections['xyxy'] = data[:, :4]
+    # conf / cls luôn là 2 cột cuối (kể cả khi có cột track id)
+    detections['conf'] = data[:, -2]
+    detections['cls'] = data[:, -1]
+    if offset_x or offset_y:
+        detections['xyxy'] += np.array([offset_x, offset_y, offset_x, offset_y], dtype=np.float32)
+    return detections
+
+
+def drowsy_lookup(names) -> np.ndarray:
+    """
+    Bảng tra bool theo class id: True nếu tên class khớp DROWSY_KEYWORDS
+    (khớp chuỗi 1 lần lúc nạp model thay vì mỗi box mỗi frame)
+
+    Args:
+        names: {class_id: tên} hoặc list tên (model.names)
+    """
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    names = {int(k): str(v) for k, v in (names or {}).items()}
+    lookup = np.zeros(max(names, default=-1) + 1, dtype=bool)
+    for cls_id, name in names.items():
+        lookup[cls_id] = any(k in name.lower() for k in DROWSY_KEYWORDS)
+    return lookup
+
+
+def drowsy_mask(detections: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+    """Mask bool các detection thuộc class ngủ gật (1 phép index cho cả mảng)"""
+    cls = detections['cls']
+    mask = np.zeros(len(cls), dtype=bool)
+    known = (cls >= 0) & (cls < len(lookup))
+    mask[known] = lookup[cls[known]]
+    return mask
@@ -0,0 +1,229 @@
+"""
+Drowsiness State Machine
+========================
+Bộ máy trạng thái ngủ gật theo thời gian (drowsiness_detection.temporal),
+tách khỏi CameraManager để kiểm thử độc lập (không cần camera / model):
+
+- Ring buffer NumPy cố định: điểm nhắm mắt + timestamp LÚC CHỤP của từng frame
+- Hysteresis: nhắm khi score >= closed_threshold, mở lại khi score <= open_threshold
+  và giữ mở >= recovery_seconds → 1 frame trượt không reset đợt nhắm mắt
+- PERCLOS (tỷ lệ thời gian nhắm mắt trong window_seconds), tần suất chớp mắt,
+  thời lượng microsleep - tất cả cập nhật O(1) mỗi frame bằng tổng chạy
+- Phát sự kiện 'start' / 'stop' (dict) để CameraManager gọi alert_callback
+"""
+
+import numpy as np
+from typing import Dict, Optional
+
+
+class DrowsinessStateMachine:
+    """PERCLOS + microsleep trên ring buffer, cập nhật O(1) mỗi frame"""
+
+    DEFAULTS = {
+        'capacity': 1024,           # Số frame tối đa trong ring buffer
+        'window_seconds': 30.0,     # Cửa sổ tính PERCLOS / blink rate
+        'closed_threshold': 0.15,   # score >= ngưỡng → nhắm (= conf của SleepDetector.predict:
+                                    # mọi box nhắm mắt model trả về đều tính, như logic cũ)
+        'open_threshold': 0.1,      # score <= ngưỡng → mở (giữa 2 ngưỡng: giữ trạng thái)
+        'recovery_seconds': 0.3,    # Phải mở liên tục bao lâu mới tính là mở lại
+        'microsleep_seconds': 1.5,  # Nhắm liên tục bao lâu thì cảnh báo
+        'perclos_alert': 0.4,       # PERCLOS >= ngưỡng cũng cảnh báo (0 = tắt)
+        'max_gap': 0.5              # Khoảng trống tối đa giữa 2 mẫu (lag / mất frame)
+    }
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: drowsiness_detection.temporal trong model_config.json
+        """
+        self.config = {**self.DEFAULTS, **(config or {})}
+        self.capacity = max(int(self.config['capacity']), 8)
+        self.window_seconds = float(self.config['window_seconds'])
+        self.closed_threshold = float(self.config['closed_threshold'])
+        self.open_threshold = min(float(self.config['open_threshold']), self.closed_threshold)
+        self.recovery_seconds = float(self.config['recovery_seconds'])
+        self.microsleep_seconds = float(self.config['microsleep_seconds'])
+        self.perclos_alert = float(self.config['perclos_alert'])
+        self.max_gap = float(self.config['max_gap'])
+
+        self._scores = np.zeros(self.capacity, dtype=np.float32)
+        self._stamps = np.zeros(self.capacity, dtype=np.float64)
+        self._durations = np.zeros(self.capacity, dtype=np.float64)
+        self._closed = np.zeros(self.capacity, dtype=bool)
+        self._blinks = np.zeros(self.capacity, dtype=bool)
+        self.reset()
+
+    def reset(self):
+        """Xóa lịch sử (khi tắt / bật lại AI)"""
+        self._head = 0
+        self._count = 0
+        self._total_time = 0.0
+        self._closed_time = 0.0
+        self._blink_count = 0
+        self._last_stamp = None
+
+        self.is_closed = False
+        self.is_alerting = False
+        self.closure_start = None
+        self._open_since = None
+        self.alert_reason = None
+        self.alert_start = None
+
+    # ========== CẬP NHẬT ==========
+
+    def update(self, score: float, timestamp: float) -> Optional[Dict]:
+        """
+        Thêm 1 frame đã suy luận
+
+        Args:
+            score: Điểm nhắm mắt 0..1 (vd: conf lớn nhất của class nhắm mắt, 0 nếu không có)
+            timestamp: Thời điểm CHỤP frame (time.monotonic()), không phải lúc xử lý xong
+
+        Returns:
+            Sự kiện {'type': 'start' | 'stop', 'reason', 'duration', 'perclos', 'timestamp'}
+            hoặc None
+        """
+        if self._last_stamp is not None and timestamp <= self._last_stamp:
+            return None
+
+        # Mẫu trước "kéo dài" tới mẫu này (giới hạn max_gap để lag không bị tính là nhắm)
+        if self._last_stamp is not None:
+            prev = (self._head - 1) % self.capacity
+            duration = min(timestamp - self._last_stamp, self.max_gap)
+            self._durations[prev] = duration
+            self._total_time += duration
+            if self._closed[prev]:
+                self._closed_time += duration
+        self._last_stamp = timestamp
+
+        blink_ended = self._step_hysteresis(float(score), timestamp)
+        self._push(float(score), timestamp, blink_ended)
+        self._evict(timestamp)
+        return self._emit(timestamp)
+
+    def stop(self, timestamp: float) -> Optional[Dict]:
+        """Kết thúc đợt cảnh báo đang mở (khi tắt AI) rồi reset"""
+        event = None
+        if self.is_alerting:
+            event = self._event('stop', timestamp)
+        self.reset()
+        return event
+
+    # ========== CHỈ SỐ ==========
+
+    @property
+    def perclos(self) -> float:
+        """Tỷ lệ thời gian nhắm mắt trong cửa sổ"""
+        return self._closed_time / self._total_time if self._total_time > 0 else 0.0
+
+    @property
+    def blink_rate(self) -> float:
+        """Số lần chớp mắt / phút trong cửa sổ"""
+        return self._blink_count * 60.0 / self._total_time if self._total_time > 0 else 0.0
+
+    def closure_duration(self, timestamp: float) -> float:
+        """Thời lượng nhắm mắt liên tục hiện tại (microsleep), 0 nếu đang mở"""
+        return timestamp - self.closure_start if self.closure_start is not None else 0.0
+
+    def metrics(self, timestamp: float) -> Dict:
+        return {
+            'perclos': self.perclos,
+            'blink_rate': self.blink_rate,
+            'closure_duration': self.closure_duration(timestamp),
+            'is_closed': self.is_closed,
+            'is_alerting': self.is_alerting,
+            'samples': self._count
+        }
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _step_hysteresis(self, score: float, timestamp: float) -> bool:
+        """Cập nhật trạng thái mắt; True nếu frame này kết thúc 1 lần chớp mắt"""
+        if score >= self.closed_threshold:
+            self._open_since = None
+            if not self.is_closed:
+                self.is_closed = True
+                self.closure_start = timestamp
+            return False
+
+        if not self.is_closed or score > self.open_threshold:
+            self._open_since = None
+            return False
+
+        # Mở mắt phải giữ đủ recovery_seconds mới tính (chống 1 frame trượt)
+        if self._open_since is None:
+            self._open_since = timestamp
+        if timestamp - self._open_since < self.recovery_seconds:
+            return False
+
+        closure = self._open_since - self.closure_start
+        self.is_closed = False
+        self.closure_start = None
+        self._open_since = None
+        return closure < self.microsleep_seconds
+
+    def _push(self, score: float, timestamp: float, blink: bool):
+        if self._count == self.capacity:
+            self._drop_oldest()
+        i = self._head
+        self._scores[i] = score
+        self._stamps[i] = timestamp
+        self._durations[i] = 0.0
+        self._closed[i] = self.is_closed
+        self._blinks[i] = blink
+        self._blink_count += int(blink)
+        self._head = (i + 1) % self.capacity
+        self._count += 1
+
+    def _evict(self, timestamp: float):
+        """Bỏ mẫu cũ hơn cửa sổ (amortized O(1))"""
+        while self._count > 1:
+            tail = (self._head - self._count) % self.capacity
+            if timestamp - self._stamps[tail] <= self.window_seconds:
+                break
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        tail = (self._head - self._count) % self.capacity
+        duration = self._durations[tail]
+        self._total_time -= duration
+        if self._closed[tail]:
+            self._closed_time -= duration
+        self._blink_count -= int(self._blinks[tail])
+        self._count -= 1
+        # Tránh sai số tích lũy của tổng chạy
+        if self._count <= 1:
+            self._total_time = self._closed_time = 0.0
+
+    def _emit(self, timestamp: float) -> Optional[Dict]:
+        """Sự kiện start / stop theo microsleep hoặc PERCLOS"""
+        microsleep = self.closure_duration(timestamp) >= self.microsleep_seconds
+        perclos_high = (self.perclos_alert > 0 and self._total_time >= self.window_seconds * 0.5
+                        and self.perclos >= self.perclos_alert)
+
+        if not self.is_alerting and (microsleep or perclos_high):
+            self.is_alerting = True
+            self.alert_reason = 'microsleep' if microsleep else 'perclos'
+            self.alert_start = self.closure_start if microsleep else timestamp
+            return self._event('start', timestamp)
+
+        if self.is_alerting and not self.is_closed:
+            # PERCLOS cần hạ hẳn xuống dưới ngưỡng (hysteresis 20%) mới tắt
+            if self.alert_reason == 'microsleep' or self.perclos < self.perclos_alert * 0.8:
+                event = self._event('stop', timestamp)
+                self.is_alerting = False
+                self.alert_reason = None
+                self.alert_start = None
+                return event
+        return None
+
+    def _event(self, kind: str, timestamp: float) -> Dict:
+        start = self.alert_start if self.alert_start is not None else timestamp
+        return {
+            'type': kind,
+            'reason': self.alert_reason,
+            'duration': max(timestamp - start, 0.0),
+            'perclos': self.perclos,
+            'blink_rate': self.blink_rate,
+            'timestamp': timestamp
+        }
@@ -0,0 +1,217 @@
+"""
+Drowsiness Pipeline Benchmark
+=============================
+Micro-benchmark các bước quanh model ngủ gật trên CPU.
+
+Chạy:
+    python -m src.BUS.ai_core.laucher_user.drowsy_benchmark overlay [--boxes 0 1 3] [--repeat 200]
+    python -m src.BUS.ai_core.laucher_user.drowsy_benchmark overlay --images <thư mục ảnh>
+    python -m src.BUS.ai_core.laucher_user.drowsy_benchmark postprocess [--boxes 1 3 10] [--repeat 500]
+
+Lệnh 'overlay' so sánh results[0].plot() của Ultralytics (cách cũ) với
+OverlayRenderer.draw (cv2 in-place) trên cùng frame + cùng số detection.
+
+Lệnh 'postprocess' so sánh vòng lặp từng box (int(box.cls), float(box.conf),
+box.xyxy.tolist(), khớp từ khóa theo tên) với 1 lần .cpu().numpy() →
+mảng DETECTION_DTYPE + bảng tra class ngủ gật.
+"""
+
+import argparse
+import numpy as np
+from typing import Dict, List
+
+from src.BUS.ai_core.login_user.face_benchmark import StageTimer, print_summary, load_frames
+from src.BUS.ai_core.laucher_user.overlay_renderer import OverlayRenderer
+from src.BUS.ai_core.laucher_user.detections import (
+    DROWSY_KEYWORDS, drowsy_lookup, drowsy_mask, from_boxes_data
+)
+
+# Ultralytics (tùy chọn) - chỉ cần để dựng Results cho baseline
+try:
+    import torch
+    from ultralytics.engine.results import Results
+    ULTRALYTICS_AVAILABLE = True
+except ImportError:
+    ULTRALYTICS_AVAILABLE = False
+
+DEMO_NAMES = {0: 'open_eye', 1: 'closed_eye', 2: 'yawn'}
+
+
+# ============================================================================
+# DỮ LIỆU GIẢ LẬP
+# ============================================================================
+
+def synthetic_frames(count: int = 8, width: int = 640, height: int = 480, seed: int = 0) -> List[np.ndarray]:
+    """Frame BGR nhiễu (cùng kích thước camera dashboard)"""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def synthetic_boxes(count: int, width: int = 640, height: int = 480, seed: int = 0) -> np.ndarray:
+    """(count, 6) [x1, y1, x2, y2, conf, cls] nằm trong frame"""
+    rng = np.random.default_rng(seed)
+    x1 = rng.uniform(0, width * 0.7, count)
+    y1 = rng.uniform(20, height * 0.7, count)
+    w = rng.uniform(40, width * 0.3, count)
+    h = rng.uniform(30, height * 0.3, count)
+    conf = rng.uniform(0.3, 0.95, count)
+    cls = rng.integers(0, len(DEMO_NAMES), count)
+    return np.stack([x1, y1, x1 + w, y1 + h, conf, cls], axis=1).astype(np.float32)
+
+
+DEMO_DROWSY_IDS = frozenset(np.flatnonzero(drowsy_lookup(DEMO_NAMES)).tolist())
+
+
+# ============================================================================
+# BENCHMARK OVERLAY
+# ============================================================================
+
+def benchmark_overlay(frames: List[np.ndarray], box_counts: List[int], repeat: int = 200) -> Dict:
+    """
+    Thời gian vẽ 1 frame: results.plot() vs OverlayRenderer.draw
+
+    Returns:
+        Dict: summary của StageTimer ({'<cách> / <n> box': {'mean', 'p50', 'p95', 'n'}})
+    """
+    timer = StageTimer()
+    renderer = OverlayRenderer()
+
+    for count in box_counts:
+        height, width = frames[0].shape[:2]
+        boxes = synthetic_boxes(count, width, height)
+        detections = from_boxes_data(boxes)
+
+        if ULTRALYTICS_AVAILABLE:
+            tensor = torch.from_numpy(boxes)
+            for i in range(repeat):
+                frame = frames[i % len(frames)]
+                result = Results(orig_img=frame, path='', names=DEMO_NAMES, boxes=tensor)
+                timer.measure(f'plot() / {count} box', result.plot)
+
+        for i in range(repeat):
+            # Copy ngoài vùng đo: renderer vẽ in-place lên frame pipeline đã sở hữu
+            frame = frames[i % len(frames)].copy()
+            timer.measure(f'cv2 overlay / {count} box', renderer.draw, frame, detections,
+                          DEMO_NAMES, DEMO_DROWSY_IDS)
+
+    return timer.summary()
+
+
+def _run_overlay(args):
+    frames = load_frames(images_dir=args.images) if args.images else synthetic_frames()
+    if not frames:
+        print("❌ Không có frame nào để đo")
+        return
+    if not ULTRALYTICS_AVAILABLE:
+        print("⚠️ Không có ultralytics/torch - chỉ đo OverlayRenderer")
+
+    summary = benchmark_overlay(frames, args.boxes, args.repeat)
+    print_summary(f"Vẽ overlay {frames[0].shape[1]}x{frames[0].shape[0]}", summary)
+
+    for count in args.boxes:
+        plot = summary.get(f'plot() / {count} box')
+        overlay = summary.get(f'cv2 overlay / {count} box')
+        if plot and overlay and overlay['mean'] > 0:
+            print(f"   ⚡ {count} box: nhanh hơn {plot['mean'] / overlay['mean']:.1f}x")
+
+
+# ============================================================================
+# BENCHMARK HẬU XỬ LÝ
+# ============================================================================
+
+def legacy_postprocess(results, names: Dict[int, str]):
+    """Cách cũ của SleepDetector.predict: vòng lặp Python + sync tensor→scalar mỗi box"""
+    detections = []
+    is_drowsy = False
+    for r in results:
+        for box in r.boxes:
+            cls_id = int(box.cls)
+            cls_name = names[cls_id] if names else str(cls_id)
+            detections.append({
+                "class": cls_id,
+                "name": cls_name,
+                "conf": float(box.conf),
+                "bbox": box.xyxy.tolist()
+            })
+            if any(k in cls_name.lower() for k in DROWSY_KEYWORDS):
+                is_drowsy = True
+    return detections, is_drowsy
+
+
+def vectorized_postprocess(results, lookup: np.ndarray):
+    """Cách mới: 1 lần chuyển boxes.data + mask theo bảng tra class id"""
+    detections = from_boxes_data(results[0].boxes.data.cpu().numpy())
+    return detections, bool(drowsy_mask(detections, lookup).any())
+
+
+def benchmark_postprocess(box_counts: List[int], repeat: int = 500) -> Dict:
+    """
+    Thời gian hậu xử lý 1 frame: vòng lặp từng box vs vectorized
+
+    Returns:
+        Dict: summary của StageTimer
+    """
+    timer = StageTimer()
+    frame = synthetic_frames(1)[0]
+    lookup = drowsy_lookup(DEMO_NAMES)
+
+    for count in box_counts:
+        results = [Results(orig_img=frame, path='', names=DEMO_NAMES,
+                           boxes=torch.from_numpy(synthetic_boxes(count, seed=count)))]
+
+        # Hai cách phải cho cùng kết quả
+        legacy, legacy_drowsy = legacy_postprocess(results, DEMO_NAMES)
+        compact, compact_drowsy = vectorized_postprocess(results, lookup)
+        assert legacy_drowsy == compact_drowsy and len(legacy) == len(compact)
+
+        for _ in range(repeat):
+            timer.measure(f'per-box loop / {count} box', legacy_postprocess, results, DEMO_NAMES)
+            timer.measure(f'vectorized / {count} box', vectorized_postprocess, results, lookup)
+
+    return timer.summary()
+
+
+def _run_postprocess(args):
+    if not ULTRALYTICS_AVAILABLE:
+        print("❌ Cần ultralytics + torch để dựng Results giống model thật")
+        return
+
+    summary = benchmark_postprocess(args.boxes, args.repeat)
+    print_summary("Hậu xử lý detections", summary)
+
+    for count in args.boxes:
+        legacy = summary.get(f'per-box loop / {count} box')
+        compact = summary.get(f'vectorized / {count} box')
+        if legacy and compact and compact['mean'] > 0:
+            print(f"   ⚡ {count} box: nhanh hơn {legacy['mean'] / compact['mean']:.1f}x")
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline phát hiện ngủ gật (CPU)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    overlay = commands.add_parser('overlay', help="results.plot() vs OverlayRenderer (cv2 in-place)")
+    overlay.add_argument('--images', help="Thư mục ảnh thật (mặc định: frame giả lập 640x480)")
+    overlay.add_argument('--boxes', type=int, nargs='+', default=[0, 1, 3])
+    overlay.add_argument('--repeat', type=int, default=200)
+    overlay.set_defaults(func=_run_overlay)
+
+    postprocess = commands.add_parser('postprocess', help="Vòng lặp từng box vs mảng DETECTION_DTYPE")
+    postprocess.add_argument('--boxes', type=int, nargs='+', default=[1, 3, 10])
+    postprocess.add_argument('--repeat', type=int, default=500)
+    postprocess.set_defaults(func=_run_postprocess)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Face ROI Tracker
+================
+Vùng khuôn mặt tài xế cho model ngủ gật (drowsiness_detection.roi):
+
+- Định kỳ (detect_interval giây) tìm mặt bằng Haar cascade của OpenCV
+  trên ảnh xám thu nhỏ - rẻ hơn YOLO nhiều lần
+- Giữa 2 lần tìm, giữ box ổn định (EMA); mất mặt quá hold_seconds → None
+  (model chạy lại trên toàn frame)
+- Box được nới padding rồi cắt trong biên frame; YOLO chạy trên crop này
+  với imgsz nhỏ, box kết quả được cộng lại offset (xem SleepDetector.predict)
+"""
+
+import time
+import cv2
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+Box = Tuple[int, int, int, int]
+
+
+class FaceROITracker:
+    """Tìm + giữ ổn định vùng mặt tài xế"""
+
+    DEFAULTS = {
+        'enabled': True,
+        'imgsz': 320,            # imgsz của YOLO khi chạy trên crop
+        'detect_interval': 0.5,  # Giây giữa 2 lần chạy Haar
+        'hold_seconds': 1.0,     # Giữ box cũ bao lâu khi không thấy mặt
+        'padding': 0.35,         # Nới mỗi cạnh theo tỷ lệ kích thước mặt
+        'smoothing': 0.5,        # EMA box (1 = không làm mượt)
+        'detect_width': 320,     # Thu nhỏ frame trước khi chạy Haar
+        'min_face_ratio': 0.12   # Mặt nhỏ hơn tỷ lệ này của cạnh ngắn bị bỏ qua
+    }
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: drowsiness_detection.roi trong model_config.json
+        """
+        self.config = {**self.DEFAULTS, **(config or {})}
+        self.enabled = bool(self.config['enabled'])
+        self.imgsz = int(self.config['imgsz'])
+        self.detect_interval = float(self.config['detect_interval'])
+        self.hold_seconds = float(self.config['hold_seconds'])
+        self.padding = float(self.config['padding'])
+        self.smoothing = float(self.config['smoothing'])
+        self.detect_width = int(self.config['detect_width'])
+        self.min_face_ratio = float(self.config['min_face_ratio'])
+
+        self._cascade = None
+        if self.enabled:
+            try:
+                cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+                self._cascade = None if cascade.empty() else cascade
+            except Exception as e:
+                print(f"⚠️ [ROI] Không nạp được Haar cascade: {e}")
+            if self._cascade is None:
+                self.enabled = False
+
+        self.reset()
+
+    def reset(self):
+        """Quên box hiện tại (khi bật lại AI)"""
+        self._face: Optional[np.ndarray] = None
+        self._last_detect = 0.0
+        self._last_seen = 0.0
+
+    def update(self, frame: np.ndarray, now: Optional[float] = None) -> Optional[Box]:
+        """
+        Cập nhật vùng mặt cho frame hiện tại
+
+        Args:
+            frame: Ảnh BGR
+            now: time.monotonic() (mặc định = hiện tại)
+
+        Returns:
+            (x1, y1, x2, y2) ROI đã nới padding, hoặc None nếu nên chạy toàn frame
+        """
+        if not self.enabled or frame is None:
+            return None
+
+        now = time.monotonic() if now is None else now
+        if self._face is None or now - self._last_detect >= self.detect_interval:
+            self._last_detect = now
+            face = self._detect(frame)
+            if face is not None:
+                self._last_seen = now
+                if self._face is None:
+                    self._face = face
+                else:
+                    self._face += self.smoothing * (face - self._face)
+
+        if self._face is None or now - self._last_seen > self.hold_seconds:
+            self._face = None
+            return None
+        return self._padded(frame.shape)
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _detect(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Mặt lớn nhất (x1, y1, x2, y2) trong tọa độ frame gốc"""
+        height, width = frame.shape[:2]
+        scale = min(self.detect_width / float(width), 1.0)
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        min_side = max(int(min(gray.shape[:2]) * self.min_face_ratio), 20)
+        faces = self._cascade.detectMultiScale(gray, scaleFactor=1.2, minNeighbors=4, minSize=(min_side, min_side))
+        if len(faces) == 0:
+            return None
+
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        return np.array([x, y, x + w, y + h], dtype=np.float32) / scale
+
+    def _padded(self, shape) -> Box:
+        height, width = shape[:2]
+        x1, y1, x2, y2 = self._face
+        pad_x = (x2 - x1) * self.padding
+        pad_y = (y2 - y1) * self.padding
+        return (
+            int(max(x1 - pad_x, 0)),
+            int(max(y1 - pad_y, 0)),
+            int(min(x2 + pad_x, width)),
+            int(min(y2 + pad_y, height))
+        )
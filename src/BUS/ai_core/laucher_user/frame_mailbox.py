@@ -0,0 +1,78 @@
+"""
+Frame Mailbox
+=============
+Hộp thư 1 ô giữa các stage của pipeline camera: put() luôn ghi đè frame cũ
+(latest-frame-wins), get() chờ tới khi có frame MỚI hơn frame đã lấy.
+
+Stage chậm không bao giờ xếp hàng việc cũ - nó chỉ bỏ lỡ frame trung gian
+(đếm trong .dropped).
+"""
+
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+
+class FrameMailbox:
+    """Mailbox 1 ô, thread-safe, 1 producer - 1 consumer"""
+
+    def __init__(self, name: str = "mailbox"):
+        self.name = name
+        self._cond = threading.Condition()
+        self._item: Any = None
+        self._seq = 0
+        self._taken_seq = 0
+        self._closed = False
+        self._stamp = 0.0
+        self.dropped = 0
+
+    def put(self, item: Any):
+        """Ghi đè frame hiện có (frame chưa ai lấy bị tính là dropped)"""
+        with self._cond:
+            if self._seq > self._taken_seq:
+                self.dropped += 1
+            self._item = item
+            self._seq += 1
+            self._stamp = time.monotonic()
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[int, Any]]:
+        """
+        Lấy frame mới nhất chưa lấy
+
+        Args:
+            timeout: Giây chờ tối đa (None = chờ tới khi có frame / đóng)
+
+        Returns:
+            (seq, item) hoặc None nếu hết giờ / mailbox đã đóng
+        """
+        with self._cond:
+            ready = self._cond.wait_for(lambda: self._closed or self._seq > self._taken_seq, timeout)
+            if not ready or self._seq <= self._taken_seq:
+                return None
+            self._taken_seq = self._seq
+            return self._seq, self._item
+
+    def peek(self) -> Tuple[int, Any]:
+        """Frame mới nhất (kể cả đã lấy) - không chặn, không đánh dấu đã lấy"""
+        with self._cond:
+            return self._seq, self._item
+
+    def age(self) -> float:
+        """Số giây kể từ lần put() gần nhất"""
+        with self._cond:
+            return time.monotonic() - self._stamp if self._seq else float('inf')
+
+    def close(self):
+        """Đánh thức mọi get() đang chờ (khi dừng pipeline)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reset(self):
+        """Mở lại mailbox rỗng (khi khởi động lại pipeline)"""
+        with self._cond:
+            self._item = None
+            self._seq = self._taken_seq = 0
+            self._closed = False
+            self.dropped = 0
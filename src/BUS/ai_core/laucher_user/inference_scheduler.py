@@ -0,0 +1,132 @@
+"""
+Inference Scheduler
+===================
+Điều tốc model ngủ gật theo độ trễ đo được (drowsiness_detection.scheduler):
+
+- Đo latency mỗi lần predict (EMA)
+- Khoảng cách giữa 2 lần suy luận = max(1 / target_fps, latency / cpu_budget)
+  → model chiếm tối đa cpu_budget thời gian của 1 core
+- Không bao giờ thưa hơn 1 / min_fps để cửa sổ nhắm mắt 1.5s vẫn đủ mẫu
+- Giữa 2 lần suy luận, pipeline dùng lại detections gần nhất
+
+report() trả về tốc độ phát hiện thực tế + số mẫu trong cửa sổ cảnh báo.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class InferenceScheduler:
+    """Quyết định khi nào chạy model và đo tốc độ phát hiện thực tế"""
+
+    DEFAULTS = {
+        'target_fps': 10.0,      # Tốc độ phát hiện mong muốn
+        'min_fps': 5.0,          # Sàn: luôn đủ mẫu cho cửa sổ cảnh báo
+        'cpu_budget': 0.5,       # Tỷ lệ thời gian 1 core dành cho model
+        'window_seconds': 1.5,   # Cửa sổ nhắm mắt dùng để cảnh báo
+        'smoothing': 0.2         # Hệ số EMA cho latency
+    }
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: drowsiness_detection.scheduler trong model_config.json
+        """
+        self.config = {**self.DEFAULTS, **(config or {})}
+        self.target_fps = max(float(self.config['target_fps']), 0.1)
+        self.min_fps = min(max(float(self.config['min_fps']), 0.1), self.target_fps)
+        self.cpu_budget = min(max(float(self.config['cpu_budget']), 0.05), 1.0)
+        self.window_seconds = float(self.config['window_seconds'])
+        self.smoothing = float(self.config['smoothing'])
+
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=64)
+        self._under_sampled = False
+        self.reset()
+
+    def reset(self):
+        """Xóa số đo (khi bật lại AI / đổi camera)"""
+        with self._lock:
+            self.latency = None
+            self.interval = 1.0 / self.target_fps
+            self._next_due = 0.0
+            self._history.clear()
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Số giây còn lại tới lần suy luận kế tiếp (0 = chạy ngay)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return max(self._next_due - now, 0.0)
+
+    def should_run(self, now: Optional[float] = None) -> bool:
+        return self.wait_time(now) == 0.0
+
+    def record(self, latency: float, started_at: Optional[float] = None):
+        """
+        Ghi nhận 1 lần suy luận và tính lại khoảng cách tới lần kế tiếp
+
+        Args:
+            latency: Thời gian predict (giây)
+            started_at: time.monotonic() lúc bắt đầu predict
+        """
+        started_at = time.monotonic() - latency if started_at is None else started_at
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+
+            budget_interval = self.latency / self.cpu_budget
+            self.interval = min(max(1.0 / self.target_fps, budget_interval), 1.0 / self.min_fps)
+            self._next_due = started_at + self.interval
+            self._history.append(started_at)
+
+        self._check_sampling()
+
+    def stride(self, capture_fps: float) -> int:
+        """Số frame camera giữa 2 lần suy luận"""
+        return max(int(round(self.interval * capture_fps)), 1)
+
+    def effective_fps(self, now: Optional[float] = None) -> float:
+        """Tốc độ phát hiện thực tế trên cửa sổ cảnh báo gần nhất"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            recent = [t for t in self._history if now - t <= self.window_seconds]
+        if len(recent) < 2:
+            return 0.0
+        span = recent[-1] - recent[0]
+        return (len(recent) - 1) / span if span > 0 else 0.0
+
+    def report(self) -> Dict:
+        """
+        Returns:
+            Dict: {'latency_ms', 'interval_ms', 'target_fps', 'effective_fps',
+                   'samples_per_window', 'cpu_share'}
+        """
+        fps = self.effective_fps()
+        latency = self.latency or 0.0
+        return {
+            'latency_ms': latency * 1000.0,
+            'interval_ms': self.interval * 1000.0,
+            'target_fps': self.target_fps,
+            'effective_fps': fps,
+            'samples_per_window': fps * self.window_seconds,
+            'cpu_share': latency / self.interval if self.interval > 0 else 0.0
+        }
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _check_sampling(self):
+        """Log 1 lần khi model quá chậm để giữ min_fps (cửa sổ cảnh báo thiếu mẫu)"""
+        latency = self.latency or 0.0
+        under_sampled = latency * self.min_fps > 1.0
+        if under_sampled != self._under_sampled:
+            self._under_sampled = under_sampled
+            if under_sampled:
+                print(f"⚠️ [SCHEDULER] Model chậm ({latency * 1000:.0f} ms) - chỉ đạt "
+                      f"{1.0 / latency:.1f} FPS < {self.min_fps:.1f} FPS, cửa sổ "
+                      f"{self.window_seconds:.1f}s có ~{self.window_seconds / latency:.0f} mẫu")
+            else:
+                print(f"✅ [SCHEDULER] Tốc độ phát hiện đã đạt >= {self.min_fps:.1f} FPS")
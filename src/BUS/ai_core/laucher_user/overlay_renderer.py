@@ -0,0 +1,89 @@
+"""
+Overlay Renderer
+================
+Vẽ detections ngủ gật thẳng lên frame (in-place) bằng primitive cv2,
+thay cho results[0].plot() của Ultralytics (copy ảnh + annotator kiểu PIL
++ trả mảng mới ở mọi frame, kể cả khi không có detection).
+
+- Kích thước nhãn được tính 1 lần cho mỗi class (cv2.getTextSize cache)
+- Không có detection → không làm gì
+- enabled = False (UI bị ẩn) → tắt hẳn
+"""
+
+import cv2
+from typing import Collection, Dict, Optional, Tuple
+
+DROWSY_COLOR = (0, 0, 255)   # BGR đỏ
+AWAKE_COLOR = (0, 200, 0)    # BGR xanh lá
+TEXT_COLOR = (255, 255, 255)
+
+
+class OverlayRenderer:
+    """Vẽ box + nhãn lên frame đang có, không cấp phát ảnh mới"""
+
+    def __init__(self, enabled: bool = True, font_scale: float = 0.5, thickness: int = 2):
+        """
+        Args:
+            enabled: False = draw() không làm gì (UI ẩn / chạy headless)
+            font_scale: Cỡ chữ nhãn
+            thickness: Độ dày viền box
+        """
+        self.enabled = enabled
+        self.font = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self._labels: Dict[Tuple[int, str], Tuple[int, int, int]] = {}
+
+    def draw(self, frame, detections, names: Optional[Dict[int, str]] = None,
+             drowsy_ids: Collection[int] = ()):
+        """
+        Vẽ detections lên frame (sửa trực tiếp frame)
+
+        Args:
+            frame: Ảnh BGR (được sửa tại chỗ)
+            detections: Mảng DETECTION_DTYPE (cls, conf, xyxy) của SleepDetector.predict
+            names: {class_id: tên class}
+            drowsy_ids: Class id tính là nhắm mắt / ngủ gật (tô đỏ)
+
+        Returns:
+            Chính frame đầu vào
+        """
+        if not self.enabled or frame is None or len(detections) == 0:
+            return frame
+
+        names = names or {}
+        height = frame.shape[0]
+        # Chuyển cả mảng sang list Python 1 lần thay vì đọc từng phần tử numpy
+        for cls_id, conf, (x1, y1, x2, y2) in zip(detections['cls'].tolist(), detections['conf'].tolist(),
+                                                   detections['xyxy'].astype(int).tolist()):
+            name = names.get(cls_id, str(cls_id))
+            color = DROWSY_COLOR if cls_id in drowsy_ids else AWAKE_COLOR
+            text_w, text_h, baseline = self._label_size(cls_id, name)
+
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, self.thickness)
+
+            # Nền nhãn phía trên box (lật vào trong nếu chạm mép trên)
+            top = y1 - text_h - baseline - 2
+            if top < 0:
+                top = min(y1, height - text_h - baseline - 2)
+            cv2.rectangle(frame, (x1, top), (x1 + text_w + 4, top + text_h + baseline + 2), color, -1)
+            cv2.putText(frame, f"{name} {conf:.2f}", (x1 + 2, top + text_h + 1), self.font, self.font_scale,
+                        TEXT_COLOR, 1, cv2.LINE_AA)
+        return frame
+
+    def clear_cache(self):
+        """Xóa cache kích thước nhãn (khi đổi model / cỡ chữ)"""
+        self._labels.clear()
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _label_size(self, cls_id: int, name: str) -> Tuple[int, int, int]:
+        """(w, h, baseline) của nhãn 'name 0.00' - tính 1 lần mỗi class"""
+        key = (int(cls_id), name)
+        size = self._labels.get(key)
+        if size is None:
+            (text_w, text_h), baseline = cv2.getTextSize(f"{name} 0.00", self.font, self.font_scale, 1)
+            size = (text_w, text_h, baseline)
+            self._labels[key] = size
+        return size
+
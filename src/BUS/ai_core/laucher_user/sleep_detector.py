@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 from ultralytics import YOLO
 import os
+from src.BUS.ai_core.laucher_user.overlay_renderer import OverlayRenderer
+from src.BUS.ai_core.laucher_user.detections import drowsy_lookup, drowsy_mask, empty_detections, from_boxes_data
 
 class SleepDetector:
     def __init__(self, model_path):
@@ -12,6 +14,10 @@ class SleepDetector:
         self.model_path = model_path
         self.model = None
         self.is_loaded = False
+        self.overlay = OverlayRenderer()
+        self.names = {}
+        self.drowsy_class_ids = frozenset()
+        self._drowsy_lookup = np.zeros(0, dtype=bool)
         
         # Load model immediately if path exists
         if os.path.exists(model_path):
@@ -23,57 +29,68 @@ class SleepDetector:
         try:
             print(f"🔄 [AI CORE] Loading model from: {self.model_path}")
             self.model = YOLO(self.model_path)
+            self._resolve_drowsy_classes()
             self.is_loaded = True
             print("✅ [AI CORE] Sleep detection model loaded successfully")
         except Exception as e:
             print(f"❌ [AI CORE] Error loading model: {e}")
             self.is_loaded = False
 
-    def predict(self, frame, conf=0.15):
+    def _resolve_drowsy_classes(self):
+        """Match drowsy keywords against class names once, at load time"""
+        names = self.model.names or {}
+        if isinstance(names, (list, tuple)):
+            names = dict(enumerate(names))
+        self.names = {int(k): str(v) for k, v in names.items()}
+        self._drowsy_lookup = drowsy_lookup(self.names)
+        self.drowsy_class_ids = frozenset(np.flatnonzero(self._drowsy_lookup).tolist())
+        print(f"✅ [AI CORE] Drowsy classes: {sorted(self.names[i] for i in self.drowsy_class_ids)}")
+
+    def drowsy_mask(self, detections):
+        """Boolean mask of detections whose class is a drowsy class"""
+        return drowsy_mask(detections, self._drowsy_lookup)
+
+    def closed_score(self, detections):
+        """Highest confidence among drowsy detections (0.0 if none)"""
+        if len(detections) == 0:
+            return 0.0
+        conf = detections['conf'][self.drowsy_mask(detections)]
+        return float(conf.max()) if len(conf) else 0.0
+
+    def predict(self, frame, conf=0.15, annotate=True, roi=None, imgsz=None):
         """
         Run inference on a single frame
         :param frame: Input image (BGR)
         :param conf: Confidence threshold (lower = more sensitive)
-        :return: annotated_frame, detections, is_drowsy
+        :param annotate: Draw detections in place on frame (False = leave it untouched)
+        :param roi: (x1, y1, x2, y2) face region - run the model on this crop only
+        :param imgsz: Model input size (None = model default); use a small one with roi
+        :return: annotated_frame, detections (DETECTION_DTYPE array, xyxy in frame coordinates), is_drowsy
         """
         if not self.is_loaded or self.model is None:
-            return frame, [], False
+            return frame, empty_detections(), False
 
         try:
+            offset_x, offset_y = 0, 0
+            source = frame
+            if roi is not None:
+                offset_x, offset_y, x2, y2 = roi
+                source = frame[offset_y:y2, offset_x:x2]
+
             # Run inference with lower confidence threshold
-            results = self.model(frame, verbose=False, conf=conf)
+            kwargs = {'imgsz': imgsz} if imgsz else {}
+            results = self.model(source, verbose=False, conf=conf, **kwargs)
             
-            # Draw detections
-            annotated_frame = results[0].plot() 
-            
-            detections = []
-            is_drowsy = False
-            
-            # Get class names dict
-            names = self.model.names
-            
-            for r in results:
-                for box in r.boxes:
-                    cls_id = int(box.cls)
-                    cls_name = names[cls_id] if names else str(cls_id)
-                    conf_score = float(box.conf)
-                    
-                    detections.append({
-                        "class": cls_id,
-                        "name": cls_name,
-                        "conf": conf_score,
-                        "bbox": box.xyxy.tolist()
-                    })
-                    
-                    # Logic nhận diện nhắm mắt/buồn ngủ
-                    # Kiểm tra nếu tên class chứa "close" hoặc "sleep" hoặc "drowsy"
-                    # Thêm "closed" để chắc chắn
-                    keys = ["close", "closed", "sleep", "drowsy", "eye_close"]
-                    if any(k in cls_name.lower() for k in keys):
-                        is_drowsy = True
+            # One device→host transfer for all boxes instead of per-box tensor→scalar syncs
+            detections = from_boxes_data(results[0].boxes.data.cpu().numpy(), offset_x, offset_y)
+            is_drowsy = bool(self.drowsy_mask(detections).any())
+
+            # Draw detections (cv2 in place, no-op when nothing was detected)
+            if annotate:
+                self.overlay.draw(frame, detections, self.names, self.drowsy_class_ids)
 
-            return annotated_frame, detections, is_drowsy
+            return frame, detections, is_drowsy
             
         except Exception as e:
             print(f"⚠️ [AI CORE] Inference error: {e}")
-            return frame, [], False
+            return frame, empty_detections(), False
@@ -3,16 +3,23 @@ ArcFace Face Recognition System
 ================================
 YOLOv8 + InsightFace (ArcFace) + AES-256 Encryption + Cosine Similarity
 
+Pipeline (face_recognition.pipeline):
+- 'single_stage': SCRFD của InsightFace detect 1 lần → align 5 điểm → ArcFace
+- 'two_stage'   : YOLOv8 crop → FaceAnalysis.get (detect lại + landmark + gender/age)
+
 Tác giả: AI Assistant
 Ngày: 2026-02-02
 """
 
+import atexit
 import cv2
 import numpy as np
 import json
 import base64
+import hashlib
+import time
 from pathlib import Path
-from typing import Dict, Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List, Union
 from datetime import datetime
 
 # Cryptography
@@ -34,7 +41,7 @@ try:
     from ultralytics import YOLO
     import insightface
     from insightface.app import FaceAnalysis
-    from sklearn.metrics.pairwise import cosine_similarity
+    from insightface.utils import face_align
     HAS_MODELS = True
 except ImportError as e:
     import traceback
@@ -48,7 +55,14 @@ except Exception as e:
     FaceAnalysis = None
 
 # Base interface
-from src.BUS.ai_core.login_user.base_face_model import BaseFaceModel
+from src.BUS.ai_core.login_user.base_face_model import BaseFaceModel, ImageInput
+from src.BUS.ai_core.login_user.face_gallery import FaceGallery
+from src.BUS.ai_core.login_user import face_scoring
+from src.BUS.ai_core.login_user.face_quality import FaceQualityScorer
+from src.BUS.ai_core.login_user.key_cache import DerivedKeyCache, get_key_cache
+from src.BUS.ai_core.login_user.embedding_store import get_embedding_store
+from src.BUS.ai_core.login_user.sealed_gallery import SealedGallery, SecureArena
+from src.BUS.ai_core.model_config import get_config_section
 
 
 # ============================================================================
@@ -139,21 +153,162 @@ class YOLOv8FaceDetector:
 class ArcFaceEmbedding:
     """Trích xuất embedding 512D bằng InsightFace ArcFace"""
     
-    def __init__(self):
-        """Khởi tạo ArcFace model"""
+    DEFAULT_MODULES = ['detection', 'recognition']
+    DEFAULT_DET_SIZES = [160, 320, 480, 640]
+    
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Khởi tạo ArcFace model
+        
+        Args:
+            config: Cấu hình face_recognition.insightface {
+                'allowed_modules': List[str] (None/[] = toàn bộ buffalo_l),
+                'det_size': int (0 = tự chọn theo kích thước ảnh),
+                'det_size_candidates': List[int] (bội số của 32)
+            }
+        """
+        if config is None:
+            config = get_config_section("face_recognition", "insightface")
+        
+        self.allowed_modules = config.get('allowed_modules', self.DEFAULT_MODULES) or None
+        self.fixed_det_size = int(config.get('det_size', 0) or 0)
+        self.det_size_candidates = sorted(config.get('det_size_candidates', self.DEFAULT_DET_SIZES))
+        self.det_model = None
+        self.rec_model = None
+        self.init_seconds = 0.0
+        
         if not HAS_MODELS or FaceAnalysis is None:
             log_print("❌ [InsightFace] Libraries not installed or import failed")
             self.app = None
             return
             
         try:
-            self.app = FaceAnalysis(name='buffalo_l', providers=['CPUExecutionProvider'])
-            self.app.prepare(ctx_id=0, det_size=(640, 640))
-            log_print("✅ [InsightFace] ArcFace embedding model initialized")
+            start = time.perf_counter()
+            self.app = FaceAnalysis(
+                name='buffalo_l',
+                allowed_modules=self.allowed_modules,
+                providers=['CPUExecutionProvider']
+            )
+            prepare_size = self.fixed_det_size or self.det_size_candidates[-1]
+            self.app.prepare(ctx_id=0, det_size=(prepare_size, prepare_size))
+            self.det_model = self.app.det_model
+            self.rec_model = self.app.models.get('recognition')
+            self.init_seconds = time.perf_counter() - start
+            log_print(f"✅ [InsightFace] ArcFace embedding model initialized "
+                      f"({', '.join(self.app.models.keys())} - {self.init_seconds:.2f}s)")
         except Exception as e:
             pass
             self.app = None
     
+    def pick_det_size(self, height: int, width: int) -> Tuple[int, int]:
+        """
+        Chọn kích thước đầu vào detector theo ảnh thực tế
+        
+        Crop khuôn mặt ~200px không cần bị phóng lên 640x640.
+        
+        Returns:
+            (w, h) - ứng viên nhỏ nhất >= cạnh dài của ảnh
+        """
+        if self.fixed_det_size:
+            return self.fixed_det_size, self.fixed_det_size
+        longest = max(height, width)
+        for size in self.det_size_candidates:
+            if size >= longest:
+                return size, size
+        size = self.det_size_candidates[-1]
+        return size, size
+    
+    # ========== SINGLE-STAGE: DETECT 1 LẦN → ALIGN → RECOGNITION ==========
+    
+    def detect_faces(self, image_rgb: np.ndarray, min_face_size: int = 0) -> List[Dict]:
+        """
+        Phát hiện khuôn mặt bằng detector SCRFD của InsightFace (kèm 5 landmark)
+        
+        Args:
+            image_rgb: Ảnh đầu vào (RGB - giữ đúng quy ước của template đã đăng ký)
+            min_face_size: Kích thước khuôn mặt tối thiểu (pixels)
+            
+        Returns:
+            List[Dict]: [{'bbox': [x, y, w, h], 'confidence': float, 'kps': (5, 2)}]
+        """
+        if self.det_model is None:
+            return []
+        
+        bboxes, kpss = self.det_model.detect(
+            image_rgb,
+            input_size=self.pick_det_size(*image_rgb.shape[:2]),
+            max_num=0,
+            metric='default'
+        )
+        faces = []
+        for i, (x1, y1, x2, y2, score) in enumerate(bboxes):
+            w, h = x2 - x1, y2 - y1
+            if w < min_face_size or h < min_face_size:
+                continue
+            faces.append({
+                'bbox': [int(x1), int(y1), int(w), int(h)],
+                'confidence': float(score),
+                'kps': kpss[i] if kpss is not None else None
+            })
+        return faces
+    
+    def align_face(self, image_rgb: np.ndarray, kps: np.ndarray) -> np.ndarray:
+        """Căn chỉnh khuôn mặt theo 5 landmark về 112x112 (giống FaceAnalysis.get)"""
+        return face_align.norm_crop(image_rgb, landmark=kps, image_size=self.rec_model.input_size[0])
+    
+    def embed_aligned(self, aligned_face: np.ndarray) -> Optional[np.ndarray]:
+        """Chạy riêng model recognition trên ảnh đã align → embedding chuẩn hóa"""
+        if self.rec_model is None:
+            return None
+        embedding = self.rec_model.get_feat(aligned_face).flatten()
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return None
+        return embedding / norm
+    
+    def embed_aligned_batch(self, aligned_faces: List[np.ndarray]) -> Optional[np.ndarray]:
+        """
+        Chạy recognition cho nhiều khuôn mặt đã align trong 1 lần forward
+        
+        Returns:
+            np.ndarray(K, 512) đã chuẩn hóa theo hàng hoặc None
+        """
+        if self.rec_model is None or len(aligned_faces) == 0:
+            return None
+        embeddings = np.asarray(self.rec_model.get_feat(list(aligned_faces)), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+    
+    def extract_from_frame(self, image: np.ndarray, min_face_size: int = 0) -> Tuple[Optional[np.ndarray], Optional[Dict]]:
+        """
+        Single-stage: 1 lần detect trên cả frame, bỏ qua landmark 3D / gender-age
+        
+        Args:
+            image: Frame BGR
+            min_face_size: Kích thước khuôn mặt tối thiểu (pixels)
+            
+        Returns:
+            (embedding, face) của khuôn mặt lớn nhất, (None, None) nếu không có
+        """
+        if self.det_model is None or self.rec_model is None:
+            return None, None
+        
+        try:
+            # InsightFace cần RGB (cùng quy ước với extract_embedding)
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            faces = [f for f in self.detect_faces(image_rgb, min_face_size) if f['kps'] is not None]
+            if len(faces) == 0:
+                return None, None
+            
+            face = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
+            embedding = self.embed_aligned(self.align_face(image_rgb, face['kps']))
+            return embedding, face
+            
+        except Exception as e:
+            pass
+            return None, None
+    
     def extract_embedding(self, face_image: np.ndarray) -> Optional[np.ndarray]:
         """
         Trích xuất embedding 512D
@@ -171,16 +326,17 @@ class ArcFaceEmbedding:
         try:
             # InsightFace cần RGB
             face_rgb = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
-            faces = self.app.get(face_rgb)
+            
+            # Giống FaceAnalysis.get nhưng chỉ chạy detection + recognition,
+            # detector dùng kích thước theo crop thay vì luôn 640x640
+            faces = [f for f in self.detect_faces(face_rgb) if f['kps'] is not None]
             
             if len(faces) == 0:
                 pass
                 return None
             
-            # Lấy embedding của khuôn mặt đầu tiên
-            embedding = faces[0].embedding
-            # Normalize embedding
-            embedding = embedding / np.linalg.norm(embedding)
+            # Lấy embedding của khuôn mặt đầu tiên (điểm cao nhất)
+            embedding = self.embed_aligned(self.align_face(face_rgb, faces[0]['kps']))
             
             # Removed log to reduce spam
             return embedding
@@ -199,112 +355,279 @@ class ArcFaceEmbedding:
         Returns:
             float: Độ tương đồng (0.0-1.0)
         """
-        similarity = cosine_similarity([emb1], [emb2])[0][0]
-        pass
-        return float(similarity)
+        return float(self.compare_many(emb1, np.asarray(emb2).reshape(1, -1))[0])
+    
+    def compare_many(self, probe: np.ndarray, stored: np.ndarray) -> np.ndarray:
+        """
+        Cosine giữa 1 probe và ma trận (M, 512) - vectorized, float32
+        
+        Vector vừa giải mã từ face_data chỉ dùng 1 lần nên không nén
+        (nén float16 / int8 chỉ áp dụng cho ma trận FaceGallery giữ lâu trong RAM).
+        
+        Returns:
+            np.ndarray (M,) float32
+        """
+        probe = face_scoring.l2_normalize(np.asarray(probe).reshape(-1))
+        return face_scoring.one_vs_many(probe, face_scoring.l2_normalize(stored))
 
 
 # ============================================================================
 # 3. FACE ENCRYPTION (AES-256)
 # ============================================================================
 
+# Định dạng ảnh khuôn mặt trước khi mã hóa ('raw' = pixel BGR thô, kiểu cũ)
+IMAGE_FORMATS = {'raw': None, 'png': '.png', 'webp': '.webp', 'jpeg': '.jpg'}
+
+
+class LazyFaceImage:
+    """
+    Ảnh khuôn mặt đã giải mã AES nhưng chưa giải nén
+    
+    Chỉ gọi cv2.imdecode khi thực sự cần pixel (decode());
+    hiển thị trên UI dùng thẳng bytes nén qua to_base64().
+    """
+    
+    def __init__(self, data: bytes, image_format: str, shape: Optional[tuple] = None):
+        self.data = data
+        self.format = image_format
+        self.shape = tuple(shape) if shape is not None else None
+        self._image = None
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def decode(self) -> Optional[np.ndarray]:
+        """Giải nén thành ảnh BGR (cache sau lần đầu)"""
+        if self._image is None:
+            if self.format == 'raw':
+                self._image = np.frombuffer(self.data, dtype=np.uint8).reshape(self.shape)
+            else:
+                self._image = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return self._image
+    
+    def to_base64(self) -> str:
+        """Base64 của ảnh nén (dùng cho ft.Image.src_base64, không cần decode)"""
+        if self.format == 'raw':
+            _, buffer = cv2.imencode('.png', self.decode())
+            return base64.b64encode(buffer).decode('utf-8')
+        return base64.b64encode(self.data).decode('utf-8')
+
+
 class FaceEncryption:
     """Mã hóa/giải mã ảnh khuôn mặt bằng AES-256"""
     
-    def __init__(self):
+    # Trường mã hóa trong face_data: (dữ liệu, salt - chỉ định dạng cũ, iv)
+    FACE_FIELDS = {
+        'image': ('encrypted_image', 'salt', 'iv'),
+        'embedding': ('embedding_encrypted', 'embedding_salt', 'embedding_iv'),
+        'templates': ('templates_encrypted', 'templates_salt', 'templates_iv')
+    }
+    # 1 = mỗi trường 1 salt + 1 lần PBKDF2; 2 = PBKDF2 1 lần mở DEK, các trường mã hóa bằng DEK
+    KEY_VERSION = 2
+    
+    def __init__(self, key_cache: Optional[DerivedKeyCache] = None):
+        """
+        Args:
+            key_cache: Cache khóa đã derive (mặc định: singleton dùng chung)
+        """
         self.key_length = 32  # AES-256
         self.salt_length = 16
         self.iterations = 100000  # PBKDF2 iterations
+        self.key_cache = key_cache if key_cache is not None else get_key_cache()
     
-    def encrypt_image(self, image: np.ndarray, password: str) -> Dict:
+    def _derive_key(self, password: str, salt: bytes) -> bytes:
+        """PBKDF2 qua cache - chỉ tốn 100k vòng ở lần đầu với mỗi (salt, password)"""
+        return self.key_cache.get_or_derive(
+            password, salt,
+            lambda: PBKDF2(password, salt, dkLen=self.key_length, count=self.iterations)
+        )
+    
+    @staticmethod
+    def encode_image(image: np.ndarray, image_format: str = 'raw', quality: int = 90) -> Tuple[bytes, str]:
         """
-        Mã hóa ảnh khuôn mặt
+        Nén ảnh trước khi mã hóa
         
         Args:
-            image: Ảnh (numpy array)
-            password: Mật khẩu user
+            image: Ảnh BGR
+            image_format: 'raw' | 'png' | 'webp' | 'jpeg'
+            quality: Chất lượng WebP / JPEG (0-100), mức nén PNG lấy theo quality / 10
             
         Returns:
-            Dict: {
-                'encrypted_data': str (Base64),
-                'salt': str (Base64),
-                'iv': str (Base64),
-                'shape': tuple
-            }
+            (bytes, định dạng thực tế) - quay về 'png' nếu OpenCV không có encoder WebP
         """
+        image_format = image_format if image_format in IMAGE_FORMATS else 'raw'
+        if image_format == 'raw' or image.ndim < 2:
+            return image.tobytes(), 'raw'
+        
+        params = {
+            'png': [int(cv2.IMWRITE_PNG_COMPRESSION), min(max(int(quality) // 10, 0), 9)],
+            'webp': [int(cv2.IMWRITE_WEBP_QUALITY), int(quality)],
+            'jpeg': [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+        }[image_format]
+        ok, buffer = cv2.imencode(IMAGE_FORMATS[image_format], image, params)
+        if not ok and image_format != 'png':
+            return FaceEncryption.encode_image(image, 'png', quality)
+        return buffer.tobytes(), image_format
+    
+    def encrypt_with_key(self, data: bytes, key: bytes) -> Dict:
+        """
+        Mã hóa bytes bằng khóa AES có sẵn (AES-CBC + PKCS7, IV ngẫu nhiên)
+        
+        Returns:
+            Dict: {'encrypted_data', 'iv'} (Base64)
+        """
+        # Tạo IV và cipher
+        iv = get_random_bytes(AES.block_size)
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        
+        # Padding
+        pad_length = AES.block_size - len(data) % AES.block_size
+        padded_data = data + bytes([pad_length] * pad_length)
+        
+        # Mã hóa
+        encrypted = cipher.encrypt(padded_data)
+        
+        return {
+            'encrypted_data': base64.b64encode(encrypted).decode('utf-8'),
+            'iv': base64.b64encode(iv).decode('utf-8')
+        }
+    
+    def decrypt_with_key(self, encrypted_data: str, iv: str, key: bytes) -> Optional[bytes]:
+        """Giải mã bytes bằng khóa AES có sẵn, None nếu sai khóa / dữ liệu hỏng"""
         try:
-            # Serialize ảnh
-            image_bytes = image.tobytes()
-            
-            # Tạo salt và derive key
-            salt = get_random_bytes(self.salt_length)
-            key = PBKDF2(password, salt, dkLen=self.key_length, count=self.iterations)
+            cipher = AES.new(key, AES.MODE_CBC, base64.b64decode(iv))
+            decrypted = cipher.decrypt(base64.b64decode(encrypted_data))
             
-            # Tạo IV và cipher
-            iv = get_random_bytes(AES.block_size)
-            cipher = AES.new(key, AES.MODE_CBC, iv)
-            
-            # Padding
-            pad_length = AES.block_size - len(image_bytes) % AES.block_size
-            padded_data = image_bytes + bytes([pad_length] * pad_length)
-            
-            # Mã hóa
-            encrypted = cipher.encrypt(padded_data)
-            
-            result = {
-                'encrypted_data': base64.b64encode(encrypted).decode('utf-8'),
-                'salt': base64.b64encode(salt).decode('utf-8'),
-                'iv': base64.b64encode(iv).decode('utf-8'),
-                'shape': image.shape
-            }
-            
-            return result
+            # Remove padding
+            pad_length = decrypted[-1]
+            if pad_length < 1 or pad_length > AES.block_size:
+                return None
+            return decrypted[:-pad_length]
             
         except Exception as e:
             pass
             return None
     
-    def decrypt_image(self, encrypted_data: str, salt: str, iv: str, 
-                     shape: tuple, password: str) -> Optional[np.ndarray]:
+    def encrypt_bytes(self, data: bytes, password: str) -> Optional[Dict]:
         """
-        Giải mã ảnh khuôn mặt
+        Mã hóa chuỗi bytes bằng khóa derive từ password (salt riêng - định dạng cũ)
         
-        Args:
-            encrypted_data: Dữ liệu mã hóa (Base64)
-            salt: Salt (Base64)
-            iv: IV (Base64)
-            shape: Kích thước ảnh gốc
-            password: Mật khẩu user
-            
         Returns:
-            np.ndarray: Ảnh đã giải mã hoặc None nếu sai password
+            Dict: {'encrypted_data', 'salt', 'iv'} (Base64) hoặc None nếu lỗi
         """
         try:
-            # Decode Base64
-            encrypted_bytes = base64.b64decode(encrypted_data)
-            salt_bytes = base64.b64decode(salt)
-            iv_bytes = base64.b64decode(iv)
-            
-            # Derive key
-            key = PBKDF2(password, salt_bytes, dkLen=self.key_length, count=self.iterations)
-            
-            # Decrypt
-            cipher = AES.new(key, AES.MODE_CBC, iv_bytes)
-            decrypted = cipher.decrypt(encrypted_bytes)
-            
-            # Remove padding
-            pad_length = decrypted[-1]
-            unpadded = decrypted[:-pad_length]
+            # Tạo salt và derive key
+            salt = get_random_bytes(self.salt_length)
+            key = self._derive_key(password, salt)
             
-            # Reshape
-            image = np.frombuffer(unpadded, dtype=np.uint8).reshape(shape)
+            result = self.encrypt_with_key(data, key)
+            result['salt'] = base64.b64encode(salt).decode('utf-8')
+            return result
             
+        except Exception as e:
             pass
-            return image
+            return None
+    
+    def decrypt_bytes(self, encrypted_data: str, salt: str, iv: str, password: str) -> Optional[bytes]:
+        """Giải mã chuỗi bytes đã mã hóa bằng encrypt_bytes, None nếu sai password"""
+        try:
+            key = self._derive_key(password, base64.b64decode(salt))
+            return self.decrypt_with_key(encrypted_data, iv, key)
             
         except Exception as e:
             pass
             return None
+    
+    # ========== KEY HIERARCHY (face_data key_version 2) ==========
+    
+    def new_data_key(self, password: str) -> Tuple[bytes, Dict]:
+        """
+        Tạo khóa dữ liệu (DEK) ngẫu nhiên cho 1 user và bọc nó bằng khóa
+        derive từ password (KEK) - đúng 1 lần PBKDF2
+        
+        Returns:
+            (dek, các trường key_version / kek_salt / dek_wrapped / dek_iv / dek_check cho face_data)
+        """
+        dek = get_random_bytes(self.key_length)
+        salt = get_random_bytes(self.salt_length)
+        kek = self._derive_key(password, salt)
+        wrapped = self.encrypt_with_key(dek, kek)
+        
+        return dek, {
+            'key_version': self.KEY_VERSION,
+            'kek_salt': base64.b64encode(salt).decode('utf-8'),
+            'dek_wrapped': wrapped['encrypted_data'],
+            'dek_iv': wrapped['iv'],
+            'dek_check': self._key_check(dek)
+        }
+    
+    def unwrap_data_key(self, face_data: Dict, password: str) -> Optional[bytes]:
+        """
+        Mở DEK của face_data (1 lần PBKDF2, qua key cache)
+        
+        Returns:
+            DEK hoặc None nếu sai password / face_data định dạng cũ
+        """
+        if 'dek_wrapped' not in face_data:
+            return None
+        try:
+            kek = self._derive_key(password, base64.b64decode(face_data['kek_salt']))
+            dek = self.decrypt_with_key(face_data['dek_wrapped'], face_data['dek_iv'], kek)
+            if dek is None or len(dek) != self.key_length:
+                return None
+            if face_data.get('dek_check') and face_data['dek_check'] != self._key_check(dek):
+                return None
+            return dek
+        except Exception as e:
+            pass
+            return None
+    
+    def encrypt_face_fields(self, fields: Dict[str, bytes], password: str) -> Dict:
+        """
+        Mã hóa các trường face_data ('image' / 'embedding' / 'templates')
+        dưới 1 DEK mới
+        
+        Returns:
+            Dict các trường đã mã hóa + thông tin bọc khóa (gộp thẳng vào face_data)
+        """
+        dek, entry = self.new_data_key(password)
+        for field, data in fields.items():
+            data_name, _, iv_name = self.FACE_FIELDS[field]
+            encrypted = self.encrypt_with_key(data, dek)
+            entry[data_name] = encrypted['encrypted_data']
+            entry[iv_name] = encrypted['iv']
+        return entry
+    
+    def decrypt_field(self, face_data: Dict, field: str, password: str,
+                      data_key: Optional[bytes] = None) -> Optional[bytes]:
+        """
+        Giải mã 1 trường face_data, hỗ trợ cả định dạng cũ (salt + PBKDF2 riêng mỗi trường)
+        
+        Args:
+            face_data: face_data trong accounts.json
+            field: 'image' | 'embedding' | 'templates'
+            password: Mật khẩu user
+            data_key: DEK đã mở sẵn (tránh mở lại khi giải mã nhiều trường)
+            
+        Returns:
+            bytes hoặc None nếu không có trường / sai password
+        """
+        data_name, salt_name, iv_name = self.FACE_FIELDS[field]
+        if data_name not in face_data:
+            return None
+        
+        if int(face_data.get('key_version', 1)) >= self.KEY_VERSION:
+            data_key = data_key or self.unwrap_data_key(face_data, password)
+            if data_key is None:
+                return None
+            return self.decrypt_with_key(face_data[data_name], face_data[iv_name], data_key)
+        
+        return self.decrypt_bytes(face_data[data_name], face_data[salt_name], face_data[iv_name], password)
+    
+    @staticmethod
+    def _key_check(key: bytes) -> str:
+        """Giá trị kiểm tra ngắn để phát hiện sai password khi mở DEK"""
+        return base64.b64encode(hashlib.sha256(b'face-dek-check' + key).digest()[:8]).decode('utf-8')
 
 
 # ============================================================================
@@ -314,7 +637,7 @@ class FaceEncryption:
 class ArcFaceModel(BaseFaceModel):
     """
     Hệ thống nhận diện khuôn mặt hoàn chỉnh
-    YOLOv8 → ArcFace → AES → Cosine Similarity
+    (SCRFD | YOLOv8) → ArcFace → AES → Cosine Similarity
     """
     
     def __init__(self, config: Dict):
@@ -328,27 +651,68 @@ class ArcFaceModel(BaseFaceModel):
         """
         super().__init__(config)
         
-        # Khởi tạo các components
-        self.yolo = YOLOv8FaceDetector(
-            self.confidence_threshold, 
-            self.min_face_size
+        # 'single_stage' (mặc định) hoặc 'two_stage' (YOLOv8 + FaceAnalysis.get như cũ)
+        self.pipeline = config.get(
+            'pipeline',
+            get_config_section("face_recognition").get('pipeline', 'single_stage')
         )
+        
+        # Khởi tạo các components - YOLOv8 chỉ load khi dùng pipeline 2 tầng
+        self.yolo = None
+        if self.pipeline == 'two_stage':
+            self.yolo = YOLOv8FaceDetector(
+                self.confidence_threshold, 
+                self.min_face_size
+            )
         self.arcface = ArcFaceEmbedding()
         self.encryption = FaceEncryption()
         
+        # Đăng ký nhiều frame: chấm chất lượng + giữ K frame tốt nhất
+        self.quality = FaceQualityScorer()
+        self.enrollment_config = get_config_section("face_recognition", "enrollment")
+        self.crop_storage = get_config_section("face_recognition", "crop_storage")
+        
         # Database path
         self.accounts_file = Path("src/GUI/data/accounts.json")
         
+        # Kho embedding memory-mapped (None nếu tắt trong model_config.json)
+        self.embedding_store = get_embedding_store()
+        
+        # Gallery niêm phong bằng khóa dịch vụ: không ghi embedding rõ ra đĩa,
+        # ma trận nằm trong vùng nhớ khóa (tắt ANN: centroid IVF - trung bình các
+        # embedding - sẽ nằm ngoài vùng nhớ khóa)
+        sealed_config = get_config_section("face_recognition", "sealed_gallery")
+        ann_config = get_config_section("face_recognition", "ann")
+        self.sealed: Optional[SealedGallery] = None
+        self.secure_arena: Optional[SecureArena] = None
+        if sealed_config.get('enabled', False):
+            self.sealed = SealedGallery(
+                Path(sealed_config.get('path', 'src/GUI/data/face_gallery.sealed')),
+                Path(sealed_config.get('key_file', 'src/GUI/data/face_service.key'))
+            )
+            self.secure_arena = SecureArena()
+            self.embedding_store = None
+            ann_config = {}
+            atexit.register(self.wipe_gallery)
+        
+        # Gallery 1:N cho face login (nạp lười ở lần đăng nhập đầu tiên / warm-up)
+        self.gallery = FaceGallery(
+            ann_config=ann_config,
+            precision=get_config_section("face_recognition").get('gallery_precision', 'float32'),
+            allocator=self.secure_arena
+        )
+        self._gallery_mtime = None
+        
         log_print("✅ [SYSTEM] Face Recognition System fully initialized")
     
-    def register_face(self, image_path: str, user_data: Dict) -> bool:
+    def register_face(self, image: ImageInput, user_data: Dict) -> bool:
         """
         Đăng ký khuôn mặt mới
         
         Luồng: Load Image → YOLO Detect → Crop → ArcFace Extract → AES Encrypt → Save JSON
         
         Args:
-            image_path: Đường dẫn ảnh khuôn mặt
+            image: Đường dẫn ảnh hoặc frame BGR từ camera
             user_data: {'username', 'password', 'name', etc.}
             
         Returns:
@@ -357,59 +721,29 @@ class ArcFaceModel(BaseFaceModel):
         pass
         
         try:
-            # 1. Load image
-            image = cv2.imread(image_path)
+            # 1. Load image (frame từ camera dùng trực tiếp, không qua đĩa)
+            image = self.load_image(image)
             if image is None:
                 pass
                 return False
             
-            # 2. Detect face
-            faces = self.yolo.detect_faces(image)
-            if len(faces) == 0:
+            # 2-3. Detect khuôn mặt lớn nhất → crop → extract embedding
+            face_crop, embedding = self._detect_and_embed(image)
+            if face_crop is None or embedding is None:
                 pass
                 return False
             
-            # Lấy khuôn mặt lớn nhất
-            face_data = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
-            face_crop = self.yolo.crop_face(image, face_data['bbox'])
-            
-            # 3. Extract embedding
-            embedding = self.arcface.extract_embedding(face_crop)
-            if embedding is None:
-                pass
-                return False
-            
-            # 4. Encrypt face image
-            encrypted = self.encryption.encrypt_image(face_crop, user_data['password'])
-            if encrypted is None:
+            # 4-6. Encrypt ảnh + embedding → Save JSON
+            face_entry = self._build_face_entry(face_crop, embedding, user_data['password'])
+            if face_entry is None:
                 pass
                 return False
             
-            # 5. Encrypt embedding
-            emb_bytes = embedding.tobytes()
-            emb_encrypted = self.encryption.encrypt_image(
-                np.frombuffer(emb_bytes, dtype=np.uint8).reshape(-1),
-                user_data['password']
-            )
-            
-            # 6. Save to JSON
-            face_entry = {
-                'encrypted_image': encrypted['encrypted_data'],
-                'salt': encrypted['salt'],
-                'iv': encrypted['iv'],
-                'shape': encrypted['shape'],
-                'embedding_encrypted': emb_encrypted['encrypted_data'],
-                'embedding_salt': emb_encrypted['salt'],
-                'embedding_iv': emb_encrypted['iv'],
-                'registered_at': datetime.now().isoformat(),
-                'model': 'ArcFace'
-            }
-            
             # Add to user_data
             user_data['face_data'] = face_entry
             
             # Save to accounts.json
-            if self._save_user_account(user_data):
+            if self._save_user_account(user_data, embedding):
                 pass
                 return True
             else:
@@ -420,7 +754,104 @@ class ArcFaceModel(BaseFaceModel):
             pass
             return False
     
-    def verify_face(self, image_path: str, username: str, password: str) -> Tuple[bool, float]:
+    def register_face_multi(self, frames: List[ImageInput], user_data: Dict,
+                            top_k: Optional[int] = None) -> bool:
+        """
+        Đăng ký khuôn mặt từ 1 loạt frame (burst)
+        
+        Luồng: Detect mỗi frame → chấm chất lượng (blur/sáng/kích thước/tư thế)
+               → chọn K frame tốt nhất → align → ArcFace 1 lần forward cho K ảnh
+               → lưu K template + centroid (centroid dùng cho gallery 1:N)
+        
+        Args:
+            frames: Danh sách frame BGR / đường dẫn ảnh
+            user_data: {'username', 'password', 'name', etc.}
+            top_k: Số frame giữ lại (None = face_recognition.enrollment.top_k)
+            
+        Returns:
+            bool: Thành công hay không
+        """
+        try:
+            enrollment = self.build_enrollment(frames, user_data['password'], top_k)
+            if enrollment is None:
+                return False
+            
+            face_entry, centroid, _ = enrollment
+            user_data['face_data'] = face_entry
+            return self._save_user_account(user_data, centroid)
+            
+        except Exception as e:
+            pass
+            return False
+    
+    def build_enrollment(self, frames: List[ImageInput], password: str,
+                         top_k: Optional[int] = None) -> Optional[Tuple[Dict, np.ndarray, List[int]]]:
+        """
+        Detect + chấm điểm + embedding + mã hóa 1 loạt ảnh, KHÔNG ghi accounts.json
+        (dùng chung cho register_face_multi và đăng ký hàng loạt)
+        
+        Args:
+            frames: Danh sách frame BGR / đường dẫn ảnh
+            password: Mật khẩu dùng để mã hóa
+            top_k: Số frame giữ lại (None = face_recognition.enrollment.top_k)
+            
+        Returns:
+            (face_data, centroid, chỉ số các frame đạt chất lượng) hoặc None
+        """
+        top_k = top_k or int(self.enrollment_config.get('top_k', 5))
+        
+        # 1. Detect + chấm điểm từng frame
+        candidates = []
+        for index, frame in enumerate(frames):
+            image = self.load_image(frame)
+            if image is None:
+                continue
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            faces = [f for f in self.arcface.detect_faces(image_rgb, self.min_face_size) if f['kps'] is not None]
+            if len(faces) == 0:
+                continue
+            face = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
+            quality = self.quality.score(image, face['bbox'], face['kps'])
+            if self.quality.is_acceptable(quality):
+                candidates.append((quality['score'], image, image_rgb, face, index))
+        
+        if len(candidates) == 0:
+            log_print(f"⚠️ [ENROLL] Không có frame nào đạt chất lượng ({len(frames)} frame)")
+            return None
+        
+        # 2. Chọn K frame tốt nhất
+        accepted = sorted(c[4] for c in candidates)
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        best = candidates[:top_k]
+        
+        # 3. Align + embedding 1 batch
+        aligned = [self.arcface.align_face(image_rgb, face['kps']) for _, _, image_rgb, face, _ in best]
+        templates = self.arcface.embed_aligned_batch(aligned)
+        if templates is None:
+            return None
+        
+        centroid = templates.mean(axis=0)
+        centroid = (centroid / np.linalg.norm(centroid)).astype(np.float32)
+        
+        # 4. Ảnh lưu trữ = crop của frame tốt nhất
+        _, image, _, face, _ = best[0]
+        x, y, w, h = face['bbox']
+        x, y = max(x, 0), max(y, 0)
+        face_crop = image[y:y+h, x:x+w]
+        
+        face_entry = self._build_face_entry(
+            face_crop, centroid, password,
+            templates=templates,
+            quality_scores=[round(c[0], 4) for c in best]
+        )
+        if face_entry is None:
+            return None
+        
+        log_print(f"✅ [ENROLL] {len(best)}/{len(frames)} frame được chọn "
+                  f"(quality {best[-1][0]:.2f}-{best[0][0]:.2f})")
+        return face_entry, centroid, accepted
+    
+    def verify_face(self, image: ImageInput, username: str, password: str) -> Tuple[bool, float]:
         """
         Xác thực khuôn mặt
         
@@ -428,7 +859,7 @@ class ArcFaceModel(BaseFaceModel):
                Decrypt → Cosine Similarity → Match?
         
         Args:
-            image_path: Ảnh hiện tại
+            image: Đường dẫn ảnh hoặc frame BGR hiện tại
             username: Tên đăng nhập
             password: Mật khẩu
             
@@ -438,20 +869,8 @@ class ArcFaceModel(BaseFaceModel):
         pass
         
         try:
-            # 1. Load image
-            image = cv2.imread(image_path)
-            if image is None:
-                pass
-                return False, 0.0
-            
-            # 2. Detect and extract embedding from current image
-            faces = self.yolo.detect_faces(image)
-            if len(faces) == 0:
-                pass
-                return False, 0.0
-            
-            face_crop = self.yolo.crop_face(image, faces[0]['bbox'])
-            current_embedding = self.arcface.extract_embedding(face_crop)
+            # 1-2. Load image, detect and extract embedding from current image
+            current_embedding = self._resolve_probe(image)
             
             if current_embedding is None:
                 pass
@@ -463,33 +882,14 @@ class ArcFaceModel(BaseFaceModel):
                 pass
                 return False, 0.0
             
-            face_data = user_data['face_data']
-            
-            # 4. Decrypt stored embedding
-            emb_encrypted_bytes = base64.b64decode(face_data['embedding_encrypted'])
-            emb_salt = face_data['embedding_salt']
-            emb_iv = face_data['embedding_iv']
-            
-            # Tạo shape cho embedding (512 floats = 2048 bytes)
-            emb_shape = (2048,)
-            
-            emb_decrypted = self.encryption.decrypt_image(
-                face_data['embedding_encrypted'],
-                emb_salt,
-                emb_iv,
-                emb_shape,
-                password
-            )
-            
-            if emb_decrypted is None:
+            # 4. Decrypt stored embedding (centroid + template đăng ký nhiều frame)
+            stored_vectors = self._decrypt_stored_vectors(user_data['face_data'], password)
+            if stored_vectors is None:
                 pass
                 return False, 0.0
             
-            # Convert back to float32 embedding
-            stored_embedding = np.frombuffer(emb_decrypted.tobytes(), dtype=np.float32)
-            
-            # 5. Compare embeddings
-            similarity = self.arcface.compare_embeddings(current_embedding, stored_embedding)
+            # 5. Compare embeddings - lấy template giống nhất
+            similarity = self._best_similarity(current_embedding, stored_vectors)
             
             # 6. Check threshold
             matched = similarity >= self.cosine_threshold
@@ -505,36 +905,366 @@ class ArcFaceModel(BaseFaceModel):
             pass
             return False, 0.0
     
-    def extract_embedding(self, image_path: str) -> Optional[np.ndarray]:
+    def extract_embedding(self, image: ImageInput) -> Optional[np.ndarray]:
         """
         Trích xuất embedding từ ảnh
         
         Args:
-            image_path: Đường dẫn ảnh
+            image: Đường dẫn ảnh hoặc frame BGR
             
         Returns:
             Embedding 512D hoặc None
         """
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                return None
+            return self._resolve_probe(image)
+            
+        except Exception as e:
+            pass
+            return None
+    
+    # ========== 1 PROBE → NHIỀU TÀI KHOẢN ==========
+    
+    def identify(self, probe: ImageInput, top_k: int = 5,
+                 threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        Nhận diện 1:N trên toàn bộ gallery
+        
+        Embedding của probe chỉ được trích xuất 1 lần, sau đó so với
+        mọi tài khoản bằng 1 phép nhân ma trận.
+        
+        Args:
+            probe: Đường dẫn ảnh, ảnh BGR (H, W, 3) hoặc embedding (512,)
+            top_k: Số ứng viên trả về
+            threshold: Chỉ trả về ứng viên có similarity >= threshold
+            
+        Returns:
+            List[(username, similarity)] sắp xếp giảm dần ([] nếu không có mặt)
+        """
+        try:
+            embedding = self._resolve_probe(probe)
+            if embedding is None:
+                return []
+            
+            return self.load_gallery().search(embedding, top_k=top_k, threshold=threshold)
+            
+        except Exception as e:
+            pass
+            return []
+    
+    def verify_many(self, probe: ImageInput, accounts: List[Dict]) -> List[Tuple[str, float]]:
+        """
+        So 1 probe với danh sách tài khoản ứng viên trong 1 batch
+        
+        Args:
+            probe: Đường dẫn ảnh, ảnh BGR (H, W, 3) hoặc embedding (512,)
+            accounts: [{'username', 'password', 'face_data'}, ...]
+            
+        Returns:
+            List[(username, similarity)] sắp xếp giảm dần
+        """
+        try:
+            embedding = self._resolve_probe(probe)
+            if embedding is None:
+                return []
+            
+            ranking = []
+            for account in accounts:
+                username = account.get('username')
+                if not username or not account.get('face_data'):
+                    continue
+                
+                stored = self._decrypt_stored_vectors(account['face_data'], account.get('password', ''))
+                if stored is not None:
+                    ranking.append((username, self._best_similarity(embedding, stored)))
+            
+            ranking.sort(key=lambda r: r[1], reverse=True)
+            return ranking
+            
+        except Exception as e:
+            pass
+            return []
+    
+    # ========== FACE GALLERY (1:N) ==========
+    
+    def load_gallery(self, force: bool = False) -> FaceGallery:
+        """
+        Nạp toàn bộ embedding đã đăng ký vào gallery
+        
+        Ưu tiên đọc thẳng từ EmbeddingStore (memmap, không parse accounts.json).
+        Nếu kho còn trống thì giải mã từ accounts.json 1 lần rồi ghi bù vào kho.
+        Chỉ nạp lại khi nguồn dữ liệu bị sửa từ bên ngoài.
+        
+        Args:
+            force: Bắt buộc nạp lại
+            
+        Returns:
+            FaceGallery
+        """
+        try:
+            source = self._gallery_source()
+            if not force and source == self._gallery_mtime:
+                return self.gallery
+            
+            if source[0] == 'sealed':
+                self._load_gallery_from_sealed()
+            elif source[0] == 'store':
+                usernames, matrix = self.embedding_store.load_all()
+                self.gallery.build_from_matrix(usernames, matrix)
+            else:
+                self._load_gallery_from_accounts()
+                self._reseal_gallery()
+            
+            self._gallery_mtime = self._gallery_source()
+            log_print(f"✅ [GALLERY] Loaded {len(self.gallery)} face templates ({self._gallery_mtime[0]})")
+            
+        except Exception as e:
+            pass
+        
+        return self.gallery
+    
+    def _load_gallery_from_accounts(self):
+        """Giải mã embedding từ accounts.json (mỗi tài khoản 1 lần) và đồng bộ lại kho"""
+        embeddings = {}
+        registered = {}
+        if self.accounts_file.exists():
+            with open(self.accounts_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
             
+            for user in data.get('user_accounts', []):
+                if not user.get('face_data'):
+                    continue
+                embedding = self._decrypt_embedding(user['face_data'], user.get('password', ''))
+                if embedding is not None:
+                    embeddings[user['username']] = embedding
+                    registered[user['username']] = user['face_data'].get('registered_at', '')
+        
+        self.gallery.build(embeddings)
+        
+        if self.embedding_store is not None:
+            self.embedding_store.put_many({
+                username: (embedding, registered[username])
+                for username, embedding in embeddings.items()
+            })
+            # Tài khoản đã bị xóa / mất face_data ngoài app (sửa tay, khôi phục .bak...)
+            self.embedding_store.retain(embeddings.keys())
+            # Từ giờ kho là nguồn chính, không cần parse accounts.json khi nạp gallery
+            self.embedding_store.set_meta('backfilled_from_accounts', True)
+    
+    def _load_gallery_from_sealed(self):
+        """Giải mã file niêm phong 1 lần (không cần mật khẩu từng tài khoản)"""
+        unsealed = self.sealed.unseal()
+        if unsealed is None:
+            # Sai khóa / file hỏng → dựng lại từ accounts.json rồi niêm phong lại
+            self._load_gallery_from_accounts()
+            self._reseal_gallery()
+            return
+        
+        usernames, matrix, buffer = unsealed
+        try:
+            self.gallery.build_from_matrix(usernames, matrix)
+        finally:
+            buffer.wipe()
+    
+    def _reseal_gallery(self):
+        """Ghi lại file niêm phong từ gallery hiện tại (chế độ sealed_gallery)"""
+        if self.sealed is None:
+            return
+        usernames, matrix = self.gallery.snapshot()
+        self.sealed.seal(usernames, matrix)
+    
+    def forget_user(self, username: str) -> bool:
+        """
+        Bỏ 1 username không còn trong accounts.json khỏi gallery, kho và file niêm phong
+        
+        Returns:
+            bool: Có trong gallery trước đó hay không
+        """
+        removed = self.gallery.remove(username)
+        if self.embedding_store is not None:
+            self.embedding_store.delete(username)
+        self._reseal_gallery()
+        self._gallery_mtime = self._gallery_source()
+        return removed
+    
+    def wipe_gallery(self):
+        """Ghi đè 0 gallery trong RAM (đăng xuất / thoát); lần login sau nạp lại"""
+        self.gallery.wipe()
+        if self.sealed is not None:
+            self.sealed.wipe_key()
+        self._gallery_mtime = None
+    
+    def _gallery_source(self) -> Tuple[str, Optional[float]]:
+        """Nguồn dữ liệu gallery hiện tại + mtime để phát hiện thay đổi"""
+        accounts_mtime = self.accounts_file.stat().st_mtime if self.accounts_file.exists() else None
+        
+        # accounts.json mới hơn bản sao nhanh (sửa tay, CLI migration, khôi phục .bak,
+        # bulk enroll...) → dựng lại từ accounts.json rồi ghi lại kho / niêm phong lại
+        def newest(kind: str, mtime: Optional[float]) -> Tuple[str, Optional[float]]:
+            if mtime is not None and (accounts_mtime is None or mtime >= accounts_mtime):
+                return kind, mtime
+            return 'accounts', accounts_mtime
+        
+        if self.sealed is not None:
+            return newest('sealed', self.sealed.mtime())
+        if self.embedding_store is not None and self.embedding_store.get_meta('backfilled_from_accounts'):
+            return newest('store', self.embedding_store.mtime())
+        return 'accounts', accounts_mtime
+    
+    # ========== HELPER FUNCTIONS ==========
+    
+    def _resolve_probe(self, probe: ImageInput) -> Optional[np.ndarray]:
+        """Chuyển probe (path / ảnh BGR / embedding) thành embedding 512D"""
+        if isinstance(probe, np.ndarray) and probe.ndim == 1:
+            return probe.astype(np.float32)
+        
+        image = self.load_image(probe)
+        if image is None:
+            return None
+        
+        _, embedding = self._detect_and_embed(image)
+        return embedding
+    
+    def _detect_and_embed(self, image: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Detect khuôn mặt lớn nhất và trích xuất embedding theo self.pipeline
+        
+        Returns:
+            (face_crop BGR, embedding) hoặc (None, None)
+        """
+        if self.pipeline == 'two_stage' and self.yolo is not None:
             faces = self.yolo.detect_faces(image)
             if len(faces) == 0:
-                return None
+                return None, None
+            face_data = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
+            face_crop = self.yolo.crop_face(image, face_data['bbox'])
+            return face_crop, self.arcface.extract_embedding(face_crop)
+        
+        embedding, face_data = self.arcface.extract_from_frame(image, self.min_face_size)
+        if embedding is None:
+            return None, None
+        
+        x, y, w, h = face_data['bbox']
+        x, y = max(x, 0), max(y, 0)
+        face_crop = image[y:y+h, x:x+w]
+        return face_crop, embedding
+    
+    def _decrypt_embedding(self, face_data: Dict, password: str,
+                           data_key: Optional[bytes] = None) -> Optional[np.ndarray]:
+        """Giải mã embedding 512D đã lưu trong face_data"""
+        decrypted = self.encryption.decrypt_field(face_data, 'embedding', password, data_key)
+        
+        # 512 floats = 2048 bytes
+        if decrypted is None or len(decrypted) != 2048:
+            return None
+        
+        # Convert back to float32 embedding
+        return np.frombuffer(decrypted, dtype=np.float32)
+    
+    def _decrypt_templates(self, face_data: Dict, password: str,
+                           data_key: Optional[bytes] = None) -> Optional[np.ndarray]:
+        """Giải mã K template (K, 512) của đăng ký nhiều frame, None nếu không có"""
+        count = int(face_data.get('template_count', 0) or 0)
+        if count == 0:
+            return None
+        
+        decrypted = self.encryption.decrypt_field(face_data, 'templates', password, data_key)
+        if decrypted is None or len(decrypted) != count * 2048:
+            return None
+        return np.frombuffer(decrypted, dtype=np.float32).reshape(count, -1)
+    
+    def _decrypt_stored_vectors(self, face_data: Dict, password: str) -> Optional[np.ndarray]:
+        """Embedding chính (centroid) + các template (nếu có) xếp thành ma trận (M, 512)"""
+        # Mở DEK 1 lần cho cả embedding + template (None với face_data định dạng cũ)
+        data_key = self.encryption.unwrap_data_key(face_data, password)
+        
+        stored = self._decrypt_embedding(face_data, password, data_key)
+        if stored is None:
+            return None
+        
+        templates = self._decrypt_templates(face_data, password, data_key)
+        if templates is None:
+            return stored.reshape(1, -1)
+        return np.vstack([stored.reshape(1, -1), templates])
+    
+    def decrypt_face_image(self, face_data: Dict, password: str,
+                           lazy: bool = True) -> Optional[Union[np.ndarray, LazyFaceImage]]:
+        """
+        Giải mã ảnh crop khuôn mặt đã lưu (chỉ khi thực sự cần xem / xử lý ảnh)
+        
+        Args:
+            face_data: face_data trong accounts.json
+            password: Mật khẩu user
+            lazy: True = LazyFaceImage (bytes nén, decode() khi cần pixel)
+            
+        Returns:
+            LazyFaceImage / ảnh BGR hoặc None nếu sai password
+        """
+        data = self.encryption.decrypt_field(face_data, 'image', password)
+        if data is None:
+            return None
+        
+        image = LazyFaceImage(data, face_data.get('image_format', 'raw'), face_data.get('shape'))
+        return image if lazy else image.decode()
+    
+    def _best_similarity(self, probe: np.ndarray, stored_vectors: np.ndarray) -> float:
+        """Cosine lớn nhất giữa probe và các vector đã lưu (1 phép nhân ma trận)"""
+        return float(np.max(self.arcface.compare_many(probe, stored_vectors)))
+    
+    def _build_face_entry(self, face_crop: np.ndarray, embedding: np.ndarray, password: str,
+                          templates: Optional[np.ndarray] = None,
+                          quality_scores: Optional[List[float]] = None) -> Optional[Dict]:
+        """
+        Mã hóa ảnh + embedding (+ template) thành face_data lưu trong accounts.json
+        
+        Tất cả trường dùng chung 1 DEK ngẫu nhiên, DEK được bọc bằng khóa
+        derive từ password → mỗi lần đăng ký chỉ chạy PBKDF2 đúng 1 lần.
+        
+        Returns:
+            Dict face_data hoặc None nếu mã hóa lỗi
+        """
+        try:
+            # Nén ảnh theo face_recognition.crop_storage trước khi mã hóa
+            image_bytes, image_format = self.encryption.encode_image(
+                face_crop,
+                self.crop_storage.get('format', 'webp'),
+                int(self.crop_storage.get('quality', 90))
+            )
             
-            face_crop = self.yolo.crop_face(image, faces[0]['bbox'])
-            return self.arcface.extract_embedding(face_crop)
+            fields = {
+                'image': image_bytes,
+                'embedding': np.asarray(embedding, dtype=np.float32).tobytes()
+            }
+            if templates is not None:
+                fields['templates'] = np.ascontiguousarray(templates, dtype=np.float32).tobytes()
+            
+            face_entry = self.encryption.encrypt_face_fields(fields, password)
+            face_entry.update({
+                'shape': face_crop.shape,
+                'image_format': image_format,
+                'registered_at': datetime.now().isoformat(),
+                'model': 'ArcFace'
+            })
+            
+            if templates is not None:
+                face_entry.update({
+                    'template_count': int(templates.shape[0]),
+                    'quality_scores': quality_scores or []
+                })
+            
+            return face_entry
             
         except Exception as e:
             pass
             return None
     
-    # ========== HELPER FUNCTIONS ==========
-    
-    def _save_user_account(self, user_data: Dict) -> bool:
-        """Lưu tài khoản vào accounts.json"""
+    def _save_user_account(self, user_data: Dict, embedding: Optional[np.ndarray] = None) -> bool:
+        """
+        Lưu tài khoản vào accounts.json
+        
+        Args:
+            user_data: Dữ liệu tài khoản (có thể kèm face_data)
+            embedding: Embedding vừa đăng ký - ghi tại chỗ vào EmbeddingStore
+        """
         try:
             # Load existing data
             if self.accounts_file.exists():
@@ -557,12 +1287,43 @@ class ArcFaceModel(BaseFaceModel):
             with open(self.accounts_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
             
+            if embedding is not None and self.embedding_store is not None:
+                registered_at = user_data.get('face_data', {}).get('registered_at', '')
+                self.embedding_store.put(user_data['username'], embedding, registered_at)
+            
+            self._sync_gallery(user_data, embedding)
+            
             return True
             
         except Exception as e:
             pass
             return False
     
+    def _sync_gallery(self, user_data: Dict, embedding: Optional[np.ndarray] = None):
+        """Cập nhật gallery tại chỗ sau khi lưu tài khoản (không nạp lại cả file)"""
+        try:
+            # Gallery chưa nạp lần nào → lần login tới sẽ nạp đầy đủ
+            # (chế độ niêm phong phải nạp ngay để ghi lại file niêm phong)
+            if self._gallery_mtime is None:
+                if self.sealed is None:
+                    return
+                self.load_gallery()
+            
+            face_data = user_data.get('face_data')
+            if embedding is None and face_data:
+                embedding = self._decrypt_embedding(face_data, user_data.get('password', ''))
+            
+            if embedding is not None:
+                self.gallery.add(user_data['username'], embedding)
+            else:
+                self.gallery.remove(user_data['username'])
+            
+            self._reseal_gallery()
+            self._gallery_mtime = self._gallery_source()
+            
+        except Exception as e:
+            pass
+    
     def _load_user_account(self, username: str) -> Optional[Dict]:
         """Load tài khoản từ accounts.json"""
         try:
@@ -588,20 +1349,32 @@ class ArcFaceModel(BaseFaceModel):
 # ============================================================================
 
 if __name__ == "__main__":
-    pass
-    pass
-    pass
-    
-    # Test configuration
-    config = {
-        'confidence_threshold': 0.75,
-        'min_face_size': 40,
-        'cosine_threshold': 0.75
-    }
+    # Smoke test: python -m src.BUS.ai_core.login_user.Arc_face [ảnh.jpg]
+    # Nạp model đúng như ứng dụng (model_config.json), nạp gallery, nhận diện ảnh nếu có
+    import sys
     
-    model = ArcFaceModel(config)
-    pass
-    pass
-    pass
-    pass
-
+    face_config = get_config_section("face_recognition")
+    start = time.perf_counter()
+    model = ArcFaceModel({
+        'confidence_threshold': face_config.get('confidence_threshold', 0.75),
+        'min_face_size': face_config.get('min_face_size', 40),
+        'cosine_threshold': face_config.get('cosine_threshold', 0.3)
+    })
+    if getattr(model.arcface, 'app', None) is None:
+        print("❌ [SMOKE] Không nạp được InsightFace (SCRFD + ArcFace)")
+        sys.exit(1)
+    print(f"✅ [SMOKE] Model sẵn sàng sau {time.perf_counter() - start:.2f}s "
+          f"(cosine_threshold {model.cosine_threshold})")
+    
+    gallery = model.load_gallery()
+    print(f"✅ [SMOKE] Gallery: {len(gallery)} tài khoản ({gallery.precision})")
+    
+    if len(sys.argv) > 1:
+        embedding = model.extract_embedding(sys.argv[1])
+        if embedding is None:
+            print(f"❌ [SMOKE] Không thấy khuôn mặt trong {sys.argv[1]}")
+            sys.exit(1)
+        print(f"✅ [SMOKE] Embedding {embedding.shape}, norm {np.linalg.norm(embedding):.3f}")
+        for username, similarity in model.identify(embedding, top_k=3):
+            status = "✅" if similarity >= model.cosine_threshold else "  "
+            print(f"   {status} {username}: {similarity:.3f}")
@@ -0,0 +1,222 @@
+"""
+ANN Index (IVF) cho Face Gallery
+================================
+Chỉ mục xấp xỉ láng giềng gần nhất (Inverted File) viết bằng NumPy:
+
+- Train: spherical k-means → nlist centroid
+- Search: chọn nprobe cụm gần probe nhất, chỉ tính cosine trên các cụm đó
+- Hỗ trợ thêm / xóa tăng dần, tự train lại khi gallery tăng gấp đôi
+
+Index KHÔNG giữ bản sao vector: chỉ có centroid + danh sách số hàng của
+FaceGallery trong từng cụm. Khi tìm kiếm, gallery đưa ma trận của nó
+(float32 / float16 / int8 + scale) và index chấm điểm đúng các hàng ứng viên
+→ tiết kiệm bộ nhớ của gallery_precision được giữ nguyên khi bật ANN.
+
+nprobe là núm vặn recall ↔ latency (nprobe = nlist ⇔ tìm kiếm chính xác).
+"""
+
+import threading
+import numpy as np
+from typing import List, Optional, Set, Tuple
+
+from src.BUS.ai_core.login_user import embedding_quant, face_scoring
+
+
+class IVFIndex:
+    """Inverted-file index trên số hàng của ma trận gallery (đã chuẩn hóa L2)"""
+
+    def __init__(self, embedding_dim: int = 512, nlist: int = 0, nprobe: int = 8,
+                 kmeans_iters: int = 10, max_train_size: int = 20000, seed: int = 0):
+        """
+        Args:
+            embedding_dim: Số chiều embedding
+            nlist: Số cụm (0 = tự chọn ~ sqrt(N))
+            nprobe: Số cụm quét mỗi lần tìm kiếm
+            kmeans_iters: Số vòng lặp k-means khi train
+            max_train_size: Số vector tối đa dùng để train centroid
+            seed: Seed cho việc lấy mẫu khởi tạo
+        """
+        self.embedding_dim = embedding_dim
+        self.nlist = nlist
+        self.nprobe = max(int(nprobe), 1)
+        self.kmeans_iters = kmeans_iters
+        self.max_train_size = max_train_size
+        self.seed = seed
+
+        self._lock = threading.RLock()
+        self._centroids: Optional[np.ndarray] = None
+        self._size = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists: List[Set[int]] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    # ========== TRAIN / REBUILD ==========
+
+    def rebuild(self, codes: np.ndarray, scales: Optional[np.ndarray] = None, precision: str = 'float32'):
+        """
+        Train centroid và gán lại toàn bộ hàng
+
+        Args:
+            codes: (N, D) ma trận của gallery (không bị sao chép / giữ lại)
+            scales: (N,) scale int8 (None với float32 / float16)
+            precision: 'float32' | 'float16' | 'int8'
+        """
+        with self._lock:
+            n = codes.shape[0]
+            nlist = self.nlist if self.nlist > 0 else int(np.sqrt(max(n, 1)))
+            nlist = int(min(max(nlist, 1), max(n, 1)))
+
+            self._centroids = self._train_centroids(codes, scales, precision, nlist)
+            self._assign = np.zeros(max(n, 1), dtype=np.int32)
+            self._assign[:n] = self._nearest_centroids(codes, scales, precision)
+            self._size = n
+            self._lists = [set() for _ in range(len(self._centroids))]
+            for row in range(n):
+                self._lists[self._assign[row]].add(row)
+            self._trained_size = n
+
+    def needs_retrain(self) -> bool:
+        """Gallery đã tăng gấp đôi (hoặc giảm một nửa) kể từ lần train cuối"""
+        if not self.is_trained:
+            return True
+        return self._size > 2 * max(self._trained_size, 1) or self._size * 2 < self._trained_size
+
+    # ========== THÊM / XÓA TĂNG DẦN ==========
+
+    def add(self, row: int, vector: np.ndarray):
+        """
+        Gán (lại) 1 hàng của gallery vào cụm gần nhất
+
+        Args:
+            row: Số hàng trong ma trận gallery (hàng mới = len(index))
+            vector: Embedding (D,) float32 đã chuẩn hóa của hàng đó
+        """
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if not self.is_trained:
+                return
+            cluster = int(np.argmax(self._centroids @ vector))
+
+            if row >= self._size:
+                if row >= self._assign.shape[0]:
+                    self._grow(max(row + 1, self._size * 2, 16))
+                self._size = row + 1
+            else:
+                self._lists[self._assign[row]].discard(row)
+
+            self._assign[row] = cluster
+            self._lists[cluster].add(row)
+
+    def remove(self, row: int, last: int):
+        """
+        Bỏ 1 hàng - theo đúng cách FaceGallery.remove chuyển hàng cuối vào chỗ trống
+
+        Args:
+            row: Hàng bị xóa
+            last: Hàng cuối trước khi xóa (được chuyển về row)
+        """
+        with self._lock:
+            if not self.is_trained or row >= self._size:
+                return
+            self._lists[self._assign[row]].discard(row)
+
+            if row != last:
+                self._lists[self._assign[last]].discard(last)
+                self._assign[row] = self._assign[last]
+                self._lists[self._assign[row]].add(row)
+
+            self._size -= 1
+
+    # ========== TÌM KIẾM ==========
+
+    def search(self, query: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray] = None,
+               precision: str = 'float32', top_k: int = 1, nprobe: Optional[int] = None,
+               threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tìm top-k gần đúng trên ma trận của gallery
+
+        Args:
+            query: Embedding (D,) đã chuẩn hóa
+            codes: (N, D) ma trận gallery (cùng thứ tự hàng đã add / rebuild)
+            scales: (N,) scale int8
+            precision: Biểu diễn của codes
+            top_k: Số kết quả
+            nprobe: Ghi đè số cụm quét cho lần gọi này
+            threshold: Bỏ kết quả có similarity < threshold
+
+        Returns:
+            (rows, scores) - số hàng trong gallery, sắp xếp giảm dần
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        with self._lock:
+            if not self.is_trained or self._size == 0:
+                return empty
+
+            probes = min(nprobe or self.nprobe, len(self._lists))
+            clusters, _ = face_scoring.search(query, self._centroids, probes)
+
+            candidates = [row for c in clusters for row in self._lists[c]]
+            if not candidates:
+                return empty
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            top, scores = face_scoring.search(
+                query, codes[rows], top_k, threshold,
+                scales=scales[rows] if scales is not None else None, precision=precision
+            )
+            return rows[top], scores
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _train_centroids(self, codes: np.ndarray, scales: Optional[np.ndarray],
+                         precision: str, nlist: int) -> np.ndarray:
+        """Spherical k-means (cosine) trên một mẫu con của gallery"""
+        n = codes.shape[0]
+        if n == 0:
+            return np.zeros((1, self.embedding_dim), dtype=np.float32)
+
+        rng = np.random.default_rng(self.seed)
+        picked = np.arange(n)
+        if n > self.max_train_size:
+            picked = np.sort(rng.choice(n, self.max_train_size, replace=False))
+        # Chỉ giải mã mẫu train (<= max_train_size hàng), không phải cả gallery
+        sample = embedding_quant.dequantize(codes[picked], scales[picked] if scales is not None else None,
+                                            precision)
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+
+            # Cụm rỗng: giữ centroid cũ
+            empty = counts == 0
+            sums[empty] = centroids[empty]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        return centroids
+
+    def _nearest_centroids(self, codes: np.ndarray, scales: Optional[np.ndarray],
+                           precision: str, chunk: int = 8192) -> np.ndarray:
+        """Gán cụm theo từng khối (giải mã từng khối) để giới hạn bộ nhớ tạm"""
+        assign = np.empty(codes.shape[0], dtype=np.int32)
+        for start in range(0, codes.shape[0], chunk):
+            stop = start + chunk
+            block = embedding_quant.dequantize(codes[start:stop],
+                                               scales[start:stop] if scales is not None else None, precision)
+            assign[start:stop] = np.argmax(block @ self._centroids.T, axis=1)
+        return assign
+
+    def _grow(self, capacity: int):
+        assign = np.zeros(capacity, dtype=np.int32)
+        assign[:self._size] = self._assign[:self._size]
+        self._assign = assign
@@ -3,11 +3,18 @@ Base Face Recognition Model Interface
 
 Tất cả các model nhận diện khuôn mặt (ArcFace, FaceNet, DeepFace) 
 phải kế thừa class này để đảm bảo tính nhất quán.
+
+Mọi hàm nhận ảnh đều chấp nhận đường dẫn file HOẶC frame BGR (np.ndarray)
+lấy thẳng từ camera - không cần ghi ảnh tạm ra đĩa.
 """
 
 from abc import ABC, abstractmethod
+import cv2
 import numpy as np
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
+
+# Ảnh đầu vào: đường dẫn file hoặc frame BGR (H, W, 3)
+ImageInput = Union[str, np.ndarray]
 
 class BaseFaceModel(ABC):
     """Interface chung cho tất cả face recognition models"""
@@ -34,12 +41,12 @@ class BaseFaceModel(ABC):
         print(f"   └─ Cosine Threshold: {self.cosine_threshold}")
     
     @abstractmethod
-    def register_face(self, image_path: str, user_data: Dict) -> bool:
+    def register_face(self, image: ImageInput, user_data: Dict) -> bool:
         """
         Đăng ký khuôn mặt mới vào hệ thống
         
         Args:
-            image_path: Đường dẫn ảnh khuôn mặt
+            image: Đường dẫn ảnh hoặc frame BGR
             user_data: Dict chứa username, password, name, etc.
             
         Returns:
@@ -48,12 +55,12 @@ class BaseFaceModel(ABC):
         pass
     
     @abstractmethod
-    def verify_face(self, image_path: str, username: str, password: str) -> Tuple[bool, float]:
+    def verify_face(self, image: ImageInput, username: str, password: str) -> Tuple[bool, float]:
         """
         Xác thực khuôn mặt với tài khoản đã đăng ký
         
         Args:
-            image_path: Đường dẫn ảnh hiện tại
+            image: Đường dẫn ảnh hoặc frame BGR hiện tại
             username: Tên đăng nhập
             password: Mật khẩu (để giải mã ảnh)
             
@@ -63,18 +70,39 @@ class BaseFaceModel(ABC):
         pass
     
     @abstractmethod
-    def extract_embedding(self, image_path: str) -> Optional[np.ndarray]:
+    def extract_embedding(self, image: ImageInput) -> Optional[np.ndarray]:
         """
         Trích xuất embedding vector từ ảnh khuôn mặt
         
         Args:
-            image_path: Đường dẫn ảnh
+            image: Đường dẫn ảnh hoặc frame BGR
             
         Returns:
             np.ndarray: Embedding vector hoặc None nếu thất bại
         """
         pass
     
+    @staticmethod
+    def load_image(image: ImageInput) -> Optional[np.ndarray]:
+        """
+        Chuẩn hóa ảnh đầu vào thành frame BGR
+        
+        Args:
+            image: Đường dẫn ảnh hoặc frame BGR (H, W, 3)
+            
+        Returns:
+            np.ndarray BGR hoặc None nếu không đọc được
+        """
+        if isinstance(image, np.ndarray):
+            if image.ndim == 2:
+                return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            if image.ndim == 3 and image.shape[2] in (3, 4):
+                return image if image.shape[2] == 3 else cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+            return None
+        if image is None:
+            return None
+        return cv2.imread(str(image))
+    
     def update_config(self, config: Dict):
         """
         Cập nhật cấu hình model (từ UI sliders)
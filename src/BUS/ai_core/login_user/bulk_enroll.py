@@ -0,0 +1,388 @@
+"""
+Bulk Face Enrollment
+====================
+Đăng ký khuôn mặt hàng loạt cho tài xế từ ảnh có sẵn (thay vì mở camera từng người).
+
+Nguồn ảnh:
+- Thư mục: <thư mục>/<username>.jpg          (1 ảnh / tài xế)
+           <thư mục>/<username>/*.jpg        (nhiều ảnh / tài xế)
+  → tài xế phải có sẵn trong accounts.json (mật khẩu dùng để mã hóa face_data)
+- CSV: cột username, password, name, driver_id, images
+  (nhiều ảnh cách nhau bằng ';', đường dẫn tương đối theo thư mục chứa CSV)
+  → tạo mới tài khoản nếu username chưa có; tài khoản đã có giữ nguyên mật khẩu
+    cũ (face_data được mã hóa bằng mật khẩu đó, mật khẩu trong CSV bị bỏ qua)
+
+Detect / embedding / mã hóa chạy trên ProcessPoolExecutor, mỗi tiến trình
+giữ 1 ArcFaceModel. Tiến trình chính gom kết quả rồi ghi accounts.json và
+EmbeddingStore như 1 giao dịch (ghi lỗi → khôi phục accounts.json cũ), cuối
+cùng in thông lượng và danh sách ảnh lỗi. Cấu hình: face_recognition.bulk_enroll.
+
+Chạy:
+    python -m src.BUS.ai_core.login_user.bulk_enroll <thư mục | file.csv> [--workers 4]
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.BUS.ai_core.model_config import get_config_section
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+ACCOUNTS_FILE = Path("src/GUI/data/accounts.json")
+
+
+# ========== THU THẬP CÔNG VIỆC ==========
+
+def load_accounts(accounts_file: Path = ACCOUNTS_FILE) -> Dict:
+    """Đọc accounts.json (trả về cấu trúc rỗng nếu chưa có)"""
+    if not Path(accounts_file).exists():
+        return {"admin_accounts": [], "user_accounts": []}
+    with open(accounts_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def collect_jobs_from_folder(folder: Path, users: Dict[str, Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Mỗi file ảnh / thư mục con là 1 tài xế (tên = username hoặc driver_id)
+
+    Returns:
+        (jobs, failures) - failures: tài xế không có trong accounts.json
+    """
+    by_driver_id = {str(u.get('driver_id', '')): u for u in users.values() if u.get('driver_id')}
+    grouped: Dict[str, List[str]] = {}
+    for path in sorted(Path(folder).iterdir()):
+        if path.is_dir():
+            images = [str(p) for p in sorted(path.iterdir()) if p.suffix.lower() in IMAGE_EXTENSIONS]
+            if images:
+                grouped.setdefault(path.name, []).extend(images)
+        elif path.suffix.lower() in IMAGE_EXTENSIONS:
+            grouped.setdefault(path.stem, []).append(str(path))
+
+    # <username>.jpg và <driver_id>/ của cùng 1 tài khoản gộp thành 1 job
+    by_username: Dict[str, Dict] = {}
+    failures = []
+    for key, images in grouped.items():
+        account = users.get(key) or by_driver_id.get(key)
+        if account is None:
+            failures.append({'username': key, 'image': images[0], 'error': "Không có tài khoản trong accounts.json"})
+            continue
+        job = by_username.setdefault(account['username'], {
+            'username': account['username'],
+            'password': account.get('password', ''),
+            'images': []
+        })
+        job['images'].extend(images)
+    return list(by_username.values()), failures
+
+
+def collect_jobs_from_csv(csv_path: Path, users: Dict[str, Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Mỗi dòng CSV là 1 tài xế - tài khoản đã có dùng mật khẩu + driver_id trong
+    accounts.json (không đổi qua CSV), tài khoản mới dùng mật khẩu trong CSV.
+    driver_id trong CSV đã có người dùng → bỏ qua, cấp ID mới khi ghi;
+    username lặp lại trong CSV → chỉ giữ dòng đầu, các dòng sau là lỗi.
+
+    Returns:
+        (jobs, failures)
+    """
+    base_dir = Path(csv_path).parent
+    jobs, failures = [], []
+    seen = set()
+    used_ids = {str(u.get('driver_id', '')) for u in users.values() if u.get('driver_id')}
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            username = (row.get('username') or '').strip()
+            images = [str(base_dir / p.strip()) for p in (row.get('images') or '').split(';') if p.strip()]
+            if not username or not images:
+                failures.append({'username': username, 'image': '', 'error': "Thiếu username hoặc images"})
+                continue
+            if username in seen:
+                failures.append({'username': username, 'image': images[0], 'error': "Username lặp lại trong CSV"})
+                continue
+
+            existing = users.get(username, {})
+            csv_password = (row.get('password') or '').strip()
+            password = existing.get('password') or csv_password
+            if existing.get('password') and csv_password and csv_password != password:
+                print(f"⚠️ [BULK] {username}: bỏ qua mật khẩu trong CSV, giữ mật khẩu tài khoản hiện có")
+            if not password:
+                failures.append({'username': username, 'image': images[0], 'error': "Thiếu mật khẩu"})
+                continue
+
+            driver_id = existing.get('driver_id', '')
+            if not existing:
+                driver_id = (row.get('driver_id') or '').strip()
+                if driver_id in used_ids:
+                    print(f"⚠️ [BULK] {username}: driver_id {driver_id} đã được dùng - sẽ cấp ID mới")
+                    driver_id = ''
+                elif driver_id:
+                    used_ids.add(driver_id)
+
+            seen.add(username)
+            jobs.append({
+                'username': username,
+                'password': password,
+                'name': (row.get('name') or '').strip() or existing.get('name', username),
+                'driver_id': driver_id,
+                'images': images
+            })
+    return jobs, failures
+
+
+def collect_jobs(source: Path, accounts_file: Path = ACCOUNTS_FILE) -> Tuple[List[Dict], List[Dict]]:
+    """Thư mục ảnh hoặc file CSV → (jobs, failures)"""
+    users = {u['username']: u for u in load_accounts(accounts_file).get('user_accounts', [])}
+    source = Path(source)
+    if source.is_dir():
+        return collect_jobs_from_folder(source, users)
+    if source.suffix.lower() == '.csv':
+        return collect_jobs_from_csv(source, users)
+    return [], [{'username': '', 'image': str(source), 'error': "Nguồn phải là thư mục hoặc file .csv"}]
+
+
+# ========== TIẾN TRÌNH CON ==========
+
+_worker_model = None
+
+
+def _init_worker(config: Dict):
+    """Khởi tạo 1 ArcFaceModel cho mỗi tiến trình (mỗi tiến trình dùng 1 luồng tính toán)"""
+    global _worker_model
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    import cv2
+    cv2.setNumThreads(1)
+
+    from src.BUS.ai_core.login_user import Arc_face
+    Arc_face.SILENT_MODE = True
+    _worker_model = Arc_face.ArcFaceModel(config)
+
+
+def _enroll_job(job: Dict) -> Dict:
+    """Detect + embedding + mã hóa ảnh của 1 tài xế (chạy trong tiến trình con)"""
+    start = time.perf_counter()
+    result = {'username': job['username'], 'ok': False, 'face_data': None, 'embedding': None,
+              'image_count': len(job['images']), 'failures': [], 'seconds': 0.0}
+    try:
+        images = []
+        for path in job['images']:
+            image = _worker_model.load_image(path)
+            if image is None:
+                result['failures'].append({'username': job['username'], 'image': path,
+                                           'error': "Không đọc được ảnh"})
+            else:
+                images.append((path, image))
+
+        enrollment = None
+        if images:
+            enrollment = _worker_model.build_enrollment([image for _, image in images], job['password'])
+
+        accepted = set(enrollment[2]) if enrollment is not None else set()
+        for index, (path, _) in enumerate(images):
+            if index not in accepted:
+                result['failures'].append({'username': job['username'], 'image': path,
+                                           'error': "Không thấy khuôn mặt / chất lượng thấp"})
+
+        if enrollment is not None:
+            face_data, centroid, _ = enrollment
+            result.update(ok=True, face_data=face_data, embedding=centroid)
+
+    except Exception as e:
+        result['failures'].append({'username': job['username'], 'image': '', 'error': str(e)})
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+# ========== GHI KẾT QUẢ ==========
+
+def save_enrollments(jobs: List[Dict], results: List[Dict], accounts_file: Path = ACCOUNTS_FILE) -> int:
+    """
+    Ghi tất cả face_data vào accounts.json + EmbeddingStore như 1 giao dịch
+
+    accounts.json được ghi ra file tạm rồi os.replace nên không bao giờ
+    ở trạng thái ghi dở; nếu sau đó ghi EmbeddingStore lỗi thì accounts.json
+    được khôi phục về bản cũ (kho lệch sẽ được ArcFaceModel nạp lại từ
+    accounts.json vì accounts.json mới hơn). Tài xế mới (từ CSV) được tạo
+    tài khoản, tài khoản đã có giữ nguyên mật khẩu.
+
+    Returns:
+        int: Số tài xế đã ghi (0 nếu giao dịch bị hủy)
+    """
+    ok_results = [r for r in results if r['ok']]
+    if not ok_results:
+        return 0
+
+    accounts_file = Path(accounts_file)
+    previous = accounts_file.read_bytes() if accounts_file.exists() else None
+    data = load_accounts(accounts_file)
+    users = data.setdefault('user_accounts', [])
+    index = {u['username']: u for u in users}
+    job_by_user = {job['username']: job for job in jobs}
+
+    for result in ok_results:
+        username = result['username']
+        account = index.get(username)
+        if account is None:
+            job = job_by_user[username]
+            # accounts.json có thể đã đổi kể từ lúc thu thập → kiểm tra trùng lại
+            driver_id = job.get('driver_id')
+            if not driver_id or any(str(u.get('driver_id', '')) == driver_id for u in users):
+                driver_id = next_driver_id(users)
+            account = {
+                "driver_id": driver_id,
+                "username": username,
+                "name": job.get('name', username),
+                "password": job['password']
+            }
+            users.append(account)
+            index[username] = account
+        account['face_data'] = result['face_data']
+
+    _write_accounts(accounts_file, json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
+
+    try:
+        from src.BUS.ai_core.login_user.embedding_store import get_embedding_store
+        store = get_embedding_store()
+        if store is not None:
+            entries = {
+                r['username']: (np.asarray(r['embedding'], dtype=np.float32), r['face_data'].get('registered_at', ''))
+                for r in ok_results
+            }
+            written = store.put_many(entries)
+            if written != len(entries):
+                raise IOError(f"chỉ ghi được {written}/{len(entries)} embedding")
+    except Exception as e:
+        print(f"❌ [BULK] Không ghi được EmbeddingStore: {e} - khôi phục accounts.json")
+        if previous is None:
+            accounts_file.unlink(missing_ok=True)
+        else:
+            _write_accounts(accounts_file, previous)
+        return 0
+
+    return len(ok_results)
+
+
+def next_driver_id(users: List[Dict]) -> str:
+    """driver_id kế tiếp dạng TXNNN - lấy số lớn nhất hiện có + 1 (không trùng sau khi xóa)"""
+    numbers = []
+    for user in users:
+        driver_id = str(user.get('driver_id', ''))
+        if driver_id.startswith("TX") and driver_id[2:].isdigit():
+            numbers.append(int(driver_id[2:]))
+    return f"TX{max(numbers, default=0) + 1:03d}"
+
+
+def _write_accounts(accounts_file: Path, payload: bytes):
+    """Ghi accounts.json ra file tạm rồi os.replace"""
+    accounts_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = accounts_file.with_suffix(accounts_file.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, accounts_file)
+
+
+# ========== CHẠY HÀNG LOẠT ==========
+
+def default_workers() -> int:
+    """Số tiến trình mặc định: face_recognition.bulk_enroll.workers, 0 = nửa số CPU"""
+    workers = int(get_config_section("face_recognition", "bulk_enroll").get('workers', 0))
+    return workers if workers > 0 else max((os.cpu_count() or 2) // 2, 1)
+
+
+def bulk_enroll(source, workers: Optional[int] = None, accounts_file: Path = ACCOUNTS_FILE,
+                progress: Optional[Callable[[int, int, Dict], None]] = None) -> Dict:
+    """
+    Đăng ký khuôn mặt hàng loạt
+
+    Args:
+        source: Thư mục ảnh hoặc file CSV
+        workers: Số tiến trình (None = default_workers())
+        accounts_file: accounts.json
+        progress: Gọi sau mỗi tài xế xong - (đã xong, tổng, kết quả)
+
+    Returns:
+        Dict báo cáo: {'drivers', 'enrolled', 'failed', 'images', 'seconds',
+                       'images_per_second', 'workers', 'failures'}
+    """
+    start = time.perf_counter()
+    jobs, failures = collect_jobs(source, accounts_file)
+    workers = max(int(workers or default_workers()), 1)
+
+    face_config = get_config_section("face_recognition")
+    config = {
+        'confidence_threshold': face_config.get('confidence_threshold', 0.75),
+        'min_face_size': face_config.get('min_face_size', 40),
+        'cosine_threshold': face_config.get('cosine_threshold', 0.3)
+    }
+
+    results = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                                 initializer=_init_worker, initargs=(config,)) as pool:
+            futures = [pool.submit(_enroll_job, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'username': '', 'ok': False, 'image_count': 0, 'seconds': 0.0,
+                              'failures': [{'username': '', 'image': '', 'error': str(e)}]}
+                results.append(result)
+                if progress:
+                    progress(done, len(jobs), result)
+
+    enrolled = save_enrollments(jobs, results, accounts_file)
+    # Lỗi lúc thu thập (thiếu tài khoản / mật khẩu / ảnh): mỗi mục là 1 tài xế bị loại
+    rejected = len(failures)
+    for result in results:
+        failures.extend(result['failures'])
+
+    seconds = time.perf_counter() - start
+    images = sum(r['image_count'] for r in results)
+    return {
+        'drivers': len(jobs) + rejected,
+        'enrolled': enrolled,
+        'failed': len(jobs) + rejected - enrolled,
+        'images': images,
+        'seconds': seconds,
+        'images_per_second': images / seconds if seconds > 0 else 0.0,
+        'workers': workers,
+        'failures': failures
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'='*70}")
+    print(f"📊 [BULK] {report['enrolled']}/{report['drivers']} tài xế đã đăng ký "
+          f"({report['images']} ảnh, {report['workers']} tiến trình)")
+    print(f"   ├─ Thời gian: {report['seconds']:.1f}s")
+    print(f"   └─ Thông lượng: {report['images_per_second']:.2f} ảnh/s")
+    if report['failures']:
+        print(f"\n❌ [BULK] {len(report['failures'])} lỗi:")
+        for failure in report['failures']:
+            print(f"   - {failure['username'] or '?'}: {failure['image'] or '-'} → {failure['error']}")
+    print(f"{'='*70}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đăng ký khuôn mặt tài xế hàng loạt từ thư mục ảnh / CSV")
+    parser.add_argument('source', help="Thư mục ảnh (<username>.jpg hoặc <username>/*.jpg) hoặc file CSV")
+    parser.add_argument('--workers', type=int, default=None, help="Số tiến trình (mặc định: nửa số CPU)")
+    parser.add_argument('--accounts', default=str(ACCOUNTS_FILE), help="Đường dẫn accounts.json")
+    args = parser.parse_args(argv)
+
+    def on_progress(done, total, result):
+        status = "✅" if result['ok'] else "❌"
+        print(f"{status} [{done}/{total}] {result['username']} ({result['seconds']:.2f}s)")
+
+    report = bulk_enroll(args.source, args.workers, Path(args.accounts), progress=on_progress)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
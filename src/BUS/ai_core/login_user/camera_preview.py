@@ -8,7 +8,9 @@ import numpy as np
 import base64
 import threading
 import time
-from typing import Callable, Optional
+from typing import Callable, List, Optional, Tuple
+
+from src.BUS.ai_core.login_user.face_quality import CaptureQualityGate, FaceQualityScorer
 
 # ========== SILENT MODE - TẮT TẤT CẢ LOG ==========
 SILENT_MODE = False  # Set to False để bật lại logging
@@ -34,14 +36,41 @@ class LiveCameraPreview:
         self.face_detected = False
         self.auto_captured = False
         
+        # Chế độ chụp liên tiếp (đăng ký nhiều frame)
+        self.on_burst_capture = None
+        self.burst_size = 1
+        self.burst_interval = 0.1
+        self._burst: Optional[List[np.ndarray]] = None
+        self._last_burst_time = 0.0
+        
+        # Cổng chất lượng: chỉ chụp frame đủ nét / đủ sáng / đủ lớn / đúng giữa oval
+        self.quality_gate = CaptureQualityGate()
+        self.quality_reason: Optional[str] = None
+        self.last_quality: dict = {}
+        
+        # Chế độ nhận diện liên tục (track-then-identify)
+        self.stream_identifier = None
+        self.tracker = None
+        self.quality_scorer = None
+        
     def start(self, on_frame_callback: Callable[[str], None], 
-             on_auto_capture: Optional[Callable[[np.ndarray], None]] = None):
+             on_auto_capture: Optional[Callable[[np.ndarray], None]] = None,
+             on_burst_capture: Optional[Callable[[List[np.ndarray]], None]] = None,
+             burst_size: int = 8, burst_interval: float = 0.1,
+             stream_identifier=None):
         """
         Bắt đầu camera preview
         
         Args:
             on_frame_callback: Function nhận base64 frame để hiển thị
             on_auto_capture: Function được gọi khi tự động chụp ảnh
+            on_burst_capture: Nếu có, khi phát hiện mặt sẽ chụp liên tiếp
+                burst_size frame (cách nhau burst_interval giây) rồi gọi hàm này
+            burst_size: Số frame mỗi loạt
+            burst_interval: Khoảng cách giữa 2 frame trong loạt (giây)
+            stream_identifier: StreamingIdentifier - nếu có, mỗi lần detect sẽ
+                đề xuất frame của track cho worker nhận diện thay vì chụp 1 lần
+                (có thể gắn sau bằng attach_stream)
         """
         log_print(f"📷 [CAMERA] Starting camera index {self.camera_index}...")
         self.cap = cv2.VideoCapture(self.camera_index)
@@ -57,7 +86,13 @@ class LiveCameraPreview:
         self.is_running = True
         self.on_frame_callback = on_frame_callback
         self.on_auto_capture = on_auto_capture
+        self.on_burst_capture = on_burst_capture
+        self.burst_size = max(int(burst_size), 1)
+        self.burst_interval = burst_interval
+        self._burst = None
         self.auto_captured = False
+        if stream_identifier is not None:
+            self.attach_stream(stream_identifier)
         
         # Start thread
         self.thread = threading.Thread(target=self._camera_loop, daemon=True)
@@ -78,18 +113,45 @@ class LiveCameraPreview:
         
         if self.cap:
             self.cap.release()
+        
+        if self.stream_identifier:
+            self.stream_identifier.stop()
         pass
     
+    def attach_stream(self, identifier):
+        """
+        Gắn StreamingIdentifier (gọi được khi camera đang chạy, vd: sau khi model nạp xong)
+        
+        Args:
+            identifier: StreamingIdentifier đã tạo sẵn
+        """
+        # Không để 2 worker cùng chạy khi gắn lại (vd: nhận diện lại sau khi nạp gallery)
+        if self.stream_identifier is not None and self.stream_identifier is not identifier:
+            self.detach_stream()
+        self.tracker = identifier.make_tracker()
+        if self.quality_scorer is None:
+            self.quality_scorer = FaceQualityScorer()
+        identifier.start()
+        self.stream_identifier = identifier
+    
+    def detach_stream(self):
+        """Gỡ và dừng StreamingIdentifier hiện tại (camera vẫn chạy)"""
+        identifier, self.stream_identifier = self.stream_identifier, None
+        if identifier is not None:
+            identifier.stop()
+    
     def reset_capture(self):
         """Reset trạng thái capture để cho phép chụp lại ngay lập tức"""
         self.auto_captured = False
+        self._burst = None
+        self.quality_reason = None
         pass
     
     def _camera_loop(self):
         """Loop chính để đọc frames - OPTIMIZED (Log tối thiểu)"""
         frame_count = 0
         last_detection_time = 0
-        detection_interval = 0.5  # Chỉ detect mỗi 500ms
+        detection_interval = 0.5  # Chỉ detect mỗi 500ms (streaming: theo cấu hình)
         
         # Load face cascade 1 lần duy nhất
         self.face_cascade = cv2.CascadeClassifier(
@@ -110,18 +172,41 @@ class LiveCameraPreview:
             frame = cv2.flip(frame, 1)
             self.current_frame = frame.copy()
             
+            # Đang chụp liên tiếp: gom frame theo burst_interval
+            if self._burst is not None:
+                self._collect_burst(frame, current_time)
+            
             # Tăng resolution lên 480x360 để rõ hơn
             display_frame = cv2.resize(frame, (480, 360))
             
             # Chỉ detect face theo interval thời gian
-            if current_time - last_detection_time > detection_interval:
+            stream = self.stream_identifier
+            interval = stream.detection_interval if stream is not None else detection_interval
+            if current_time - last_detection_time > interval:
                 small_frame = cv2.resize(frame, (320, 240))
-                self.face_detected = self._detect_face_in_oval(small_frame)
+                face_box = self._find_face_in_oval(small_frame)
+                self.face_detected = face_box is not None
                 last_detection_time = current_time
                 
-                # LOGIC GỐC: Chụp ngay khi phát hiện mặt
-                if self.face_detected and not self.auto_captured:
-                    if self.on_auto_capture:
+                # Cổng chất lượng trên frame nhỏ (vài trăm µs) trước khi chạy model nặng
+                frame_ok = False
+                if self.face_detected:
+                    frame_ok, self.quality_reason, self.last_quality = self.quality_gate.check(small_frame, face_box)
+                else:
+                    self.quality_reason = None
+                
+                # Streaming: giữ track và đề xuất frame cho worker (không chặn preview)
+                if stream is not None:
+                    self._offer_stream_frame(stream, frame, small_frame, face_box, frame_ok)
+                    frame_ok = False
+                
+                # LOGIC GỐC: Chụp ngay khi phát hiện mặt (và frame đạt chất lượng)
+                if frame_ok and not self.auto_captured:
+                    if self.on_burst_capture:
+                        self.auto_captured = True
+                        self._burst = [frame]
+                        self._last_burst_time = current_time
+                    elif self.on_auto_capture:
                         pass
                         self.auto_captured = True
                         self.on_auto_capture(frame)
@@ -141,6 +226,27 @@ class LiveCameraPreview:
             # Target 30 FPS
             time.sleep(0.033)
     
+    def _offer_stream_frame(self, stream, frame: np.ndarray, small_frame: np.ndarray,
+                            face_box: Optional[Tuple[int, int, int, int]], frame_ok: bool):
+        """Cập nhật tracker và gửi frame đạt chất lượng cho StreamingIdentifier"""
+        track = self.tracker.update(face_box)
+        if track is None or not frame_ok:
+            return
+        
+        quality = self.quality_scorer.score(small_frame, track.box)['score']
+        stream.offer(frame, track.track_id, quality)
+    
+    def _collect_burst(self, frame: np.ndarray, current_time: float):
+        """Thêm frame vào loạt đang chụp, gọi on_burst_capture khi đủ"""
+        if current_time - self._last_burst_time >= self.burst_interval:
+            self._burst.append(frame)
+            self._last_burst_time = current_time
+        
+        if len(self._burst) >= self.burst_size:
+            frames, self._burst = self._burst, None
+            log_print(f"📸 [CAMERA] Burst captured: {len(frames)} frames")
+            self.on_burst_capture(frames)
+    
     def _draw_oval_guide(self, frame: np.ndarray) -> np.ndarray:
         """Vẽ oval guide đơn giản"""
         h, w = frame.shape[:2]
@@ -161,8 +267,13 @@ class LiveCameraPreview:
         
         result = (frame.astype(np.float32) * mask_3ch + darkened.astype(np.float32) * mask_inv_3ch).astype(np.uint8)
         
-        # Vẽ viền oval
-        color = (0, 255, 0) if self.face_detected else (255, 255, 255)
+        # Vẽ viền oval (cam khi có mặt nhưng frame chưa đạt chất lượng)
+        if not self.face_detected:
+            color = (255, 255, 255)
+        elif self.quality_reason:
+            color = (0, 200, 255)
+        else:
+            color = (0, 255, 0)
         thickness = 3 if self.face_detected else 2
         cv2.ellipse(result, center, axes, 0, 0, 360, color, thickness)
         
@@ -170,6 +281,9 @@ class LiveCameraPreview:
         if not self.face_detected:
             text = "Dat mat vao khung oval"
             text_color = (255, 255, 255)
+        elif self.quality_reason:
+            text = CaptureQualityGate.HINTS.get(self.quality_reason, "Giu yen dau")
+            text_color = (0, 200, 255)
         else:
             text = "Dang xu ly..."
             text_color = (0, 255, 0)
@@ -257,6 +371,9 @@ class LiveCameraPreview:
             if not self.face_detected:
                 text = "Đưa mặt vào khung hình"
                 text_color = (255, 255, 255)
+            elif self.quality_reason:
+                text = CaptureQualityGate.HINTS.get(self.quality_reason, "Giu yen dau")
+                text_color = (0, 200, 255)
             else:
                 text = "Phát hiện khuôn mặt..."
                 text_color = (0, 255, 0)
@@ -283,6 +400,18 @@ class LiveCameraPreview:
         Returns:
             True nếu có mặt trong oval
         """
+        return self._find_face_in_oval(frame) is not None
+    
+    def _find_face_in_oval(self, frame: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Tìm khuôn mặt lớn nhất nằm trong vùng oval
+        
+        Args:
+            frame: Frame gốc (có thể là resolution nhỏ)
+            
+        Returns:
+            (x, y, w, h) hoặc None
+        """
         try:
             # Sử dụng cascade đã load sẵn
             if not hasattr(self, 'face_cascade'):
@@ -320,11 +449,11 @@ class LiveCameraPreview:
                 
                 # Tăng margin lên 1.5 để dễ detect hơn
                 if distance <= 1.5:
-                    return True
+                    return int(x), int(y), int(w_face), int(h_face)
             
-            return False
+            return None
             
         except Exception as e:
             pass
-            return False
+            return None
 
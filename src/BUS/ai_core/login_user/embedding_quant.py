@@ -0,0 +1,94 @@
+"""
+Embedding Quantization
+======================
+Biểu diễn gọn cho ma trận embedding đã chuẩn hóa L2:
+
+- 'float32': giữ nguyên (4 byte/chiều)
+- 'float16': 2 byte/chiều, sai số cosine ~1e-3
+- 'int8'   : 1 byte/chiều + 1 scale float32 mỗi vector (đối xứng, max-abs / 127)
+
+Kernel chấm điểm nâng từng khối hàng lên float32 rồi nhân ma trận-vector
+bằng BLAS, nên bộ nhớ tạm bị giới hạn bởi chunk_rows chứ không theo N.
+"""
+
+import numpy as np
+from typing import Optional, Tuple
+
+PRECISIONS = ('float32', 'float16', 'int8')
+INT8_MAX = 127.0
+
+
+def normalize_precision(precision: Optional[str]) -> str:
+    """Chuẩn hóa tên precision, mặc định float32 nếu không hợp lệ"""
+    precision = (precision or 'float32').lower()
+    return precision if precision in PRECISIONS else 'float32'
+
+
+def storage_dtype(precision: str) -> np.dtype:
+    """dtype của ma trận mã hóa"""
+    return np.dtype({'float32': np.float32, 'float16': np.float16, 'int8': np.int8}[precision])
+
+
+def quantize(vectors: np.ndarray, precision: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Mã hóa ma trận (N, D) hoặc vector (D,)
+
+    Returns:
+        (codes, scales) - scales (N,) float32 chỉ có với int8, None với loại khác
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if precision == 'float16':
+        return vectors.astype(np.float16), None
+    if precision == 'int8':
+        single = vectors.ndim == 1
+        matrix = vectors.reshape(1, -1) if single else vectors
+        scales = np.abs(matrix).max(axis=1) / INT8_MAX
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -INT8_MAX, INT8_MAX).astype(np.int8)
+        scales = scales.astype(np.float32)
+        return (codes[0], scales[:1]) if single else (codes, scales)
+    return vectors, None
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray], precision: str) -> np.ndarray:
+    """Giải mã về float32"""
+    values = np.asarray(codes, dtype=np.float32)
+    if precision == 'int8' and scales is not None:
+        if values.ndim == 1:
+            return values * scales[0]
+        return values * scales[:, None]
+    return values
+
+
+def score(codes: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray,
+          precision: str, chunk_rows: int = 4096) -> np.ndarray:
+    """
+    Tích vô hướng giữa ma trận đã mã hóa (N, D) và query float32 (D,)
+
+    Args:
+        codes: Ma trận đã mã hóa
+        scales: Scale mỗi hàng (int8) hoặc None
+        query: Vector float32 đã chuẩn hóa
+        precision: 'float32' | 'float16' | 'int8'
+        chunk_rows: Số hàng nâng lên float32 mỗi lần
+
+    Returns:
+        np.ndarray (N,) float32 - cosine nếu cả 2 phía đã chuẩn hóa
+    """
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    n = codes.shape[0]
+    if precision == 'float32':
+        return codes @ query
+
+    scores = np.empty(n, dtype=np.float32)
+    for start in range(0, n, chunk_rows):
+        block = codes[start:start + chunk_rows].astype(np.float32)
+        scores[start:start + chunk_rows] = block @ query
+    if precision == 'int8' and scales is not None:
+        scores *= scales[:n]
+    return scores
+
+
+def bytes_per_vector(dim: int, precision: str) -> int:
+    """Số byte lưu 1 vector (kể cả scale của int8)"""
+    return dim * storage_dtype(precision).itemsize + (4 if precision == 'int8' else 0)
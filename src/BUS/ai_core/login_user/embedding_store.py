@@ -0,0 +1,328 @@
+"""
+Embedding Store (memory-mapped)
+===============================
+Kho embedding nhị phân tách riêng khỏi accounts.json:
+
+- face_embeddings.bin  : ma trận (capacity, dim) float32/float16, stride cố định
+- face_embeddings.json : index nhỏ {username: {row, registered_at}} + metadata
+
+Ma trận được np.memmap khi mở → nạp gallery không phải parse JSON chứa
+ảnh/ciphertext base64; đăng ký khuôn mặt chỉ ghi đè đúng 1 hàng tại chỗ.
+
+⚠️ BẢO MẬT: face_embeddings.bin lưu embedding dạng float32 KHÔNG mã hóa
+(accounts.json chỉ giữ ciphertext AES theo mật khẩu từng tài xế). Ai đọc
+được file này có toàn bộ template khuôn mặt. Vì vậy kho TẮT mặc định
+(face_recognition.embedding_store.enabled = false); chỉ bật trên máy mà
+thư mục dữ liệu đã được bảo vệ (vd: BitLocker / ACL). Muốn nạp gallery
+nhanh mà không để bản rõ trên đĩa: dùng face_recognition.sealed_gallery.
+"""
+
+import json
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+STORE_VERSION = 1
+
+
+class EmbeddingStore:
+    """Kho embedding memory-mapped + index username → hàng"""
+
+    def __init__(self, matrix_path: Path, index_path: Path,
+                 embedding_dim: int = 512, dtype: str = 'float32',
+                 initial_capacity: int = 64):
+        """
+        Args:
+            matrix_path: File ma trận nhị phân
+            index_path: File index JSON
+            embedding_dim: Số chiều embedding
+            dtype: 'float32' hoặc 'float16' (chỉ dùng khi tạo kho mới)
+            initial_capacity: Số hàng cấp phát khi tạo kho mới
+        """
+        self.matrix_path = Path(matrix_path)
+        self.index_path = Path(index_path)
+        self.embedding_dim = embedding_dim
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = max(int(initial_capacity), 1)
+
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._capacity = 0
+        self._rows: Dict[str, Dict] = {}
+        self._free: List[int] = []
+        self._meta: Dict = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._rows
+
+    def exists(self) -> bool:
+        """Kho đã được tạo trên đĩa chưa"""
+        return self.matrix_path.exists() and self.index_path.exists()
+
+    def mtime(self) -> Optional[float]:
+        """Thời điểm index thay đổi lần cuối (dùng để phát hiện kho bị sửa)"""
+        try:
+            return self.index_path.stat().st_mtime
+        except OSError:
+            return None
+
+    # ========== MỞ / TẠO KHO ==========
+
+    def open(self) -> bool:
+        """
+        Mở kho có sẵn (memory-map ma trận), tạo mới nếu chưa có
+
+        Returns:
+            bool: Thành công hay không
+        """
+        with self._lock:
+            try:
+                if not self.exists():
+                    self._create()
+                    return True
+
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+
+                self.embedding_dim = int(index['embedding_dim'])
+                self.dtype = np.dtype(index['dtype'])
+                self._capacity = int(index['capacity'])
+                self._rows = index.get('rows', {})
+                self._free = index.get('free', [])
+                self._meta = index.get('meta', {})
+                self._map()
+                return True
+
+            except Exception as e:
+                self._matrix = None
+                return False
+
+    def close(self):
+        """Flush và bỏ memory-map"""
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+                self._matrix = None
+
+    # ========== METADATA ==========
+
+    def get_meta(self, key: str, default=None):
+        """Đọc 1 giá trị metadata lưu trong index"""
+        return self._meta.get(key, default)
+
+    def set_meta(self, key: str, value):
+        """Ghi 1 giá trị metadata (vd: cờ đã migrate từ accounts.json)"""
+        with self._lock:
+            self._meta[key] = value
+            self._write_index()
+
+    # ========== ĐỌC / GHI ==========
+
+    def put(self, username: str, embedding: np.ndarray, registered_at: str = "") -> bool:
+        """
+        Ghi (hoặc ghi đè) embedding của 1 tài khoản - tại chỗ, không ghi lại cả file
+
+        Args:
+            username: Tên đăng nhập
+            embedding: Vector (dim,)
+            registered_at: Thời điểm đăng ký (ISO)
+
+        Returns:
+            bool: Thành công hay không
+        """
+        return self.put_many({username: (embedding, registered_at)}) == 1
+
+    def put_many(self, entries: Dict[str, Tuple[np.ndarray, str]]) -> int:
+        """
+        Ghi nhiều embedding rồi flush + ghi index đúng 1 lần
+
+        Args:
+            entries: {username: (embedding, registered_at)}
+
+        Returns:
+            int: Số embedding đã ghi
+        """
+        with self._lock:
+            if self._matrix is None and not self.open():
+                return 0
+
+            written = 0
+            for username, (embedding, registered_at) in entries.items():
+                vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+                if vector.shape[0] != self.embedding_dim:
+                    continue
+
+                entry = self._rows.get(username)
+                if entry is None:
+                    if not self._free:
+                        self._grow(self._capacity * 2)
+                    row = self._free.pop(0)
+                else:
+                    row = entry['row']
+
+                self._matrix[row] = vector.astype(self.dtype)
+                self._rows[username] = {'row': row, 'registered_at': registered_at or ""}
+                written += 1
+
+            if written:
+                self._matrix.flush()
+                self._write_index()
+        return written
+
+    def delete(self, username: str) -> bool:
+        """Xóa 1 tài khoản khỏi kho (hàng được tái sử dụng về sau)"""
+        with self._lock:
+            if self._matrix is None and not self.open():
+                return False
+
+            entry = self._rows.pop(username, None)
+            if entry is None:
+                return False
+
+            self._matrix[entry['row']] = 0
+            self._matrix.flush()
+            self._free.append(entry['row'])
+            self._free.sort()
+            self._write_index()
+        return True
+
+    def retain(self, usernames) -> int:
+        """
+        Xóa mọi tài khoản không có trong usernames (ghi index 1 lần)
+
+        Returns:
+            int: Số tài khoản đã xóa
+        """
+        keep = set(usernames)
+        with self._lock:
+            if self._matrix is None and not self.open():
+                return 0
+
+            stale = [u for u in self._rows if u not in keep]
+            for username in stale:
+                row = self._rows.pop(username)['row']
+                self._matrix[row] = 0
+                self._free.append(row)
+            if stale:
+                self._free.sort()
+                self._matrix.flush()
+                self._write_index()
+        return len(stale)
+
+    def get(self, username: str) -> Optional[np.ndarray]:
+        """Đọc embedding float32 của 1 tài khoản"""
+        with self._lock:
+            entry = self._rows.get(username)
+            if entry is None or self._matrix is None:
+                return None
+            # Copy để không giữ tham chiếu tới memmap (cần khi _grow trên Windows)
+            return np.array(self._matrix[entry['row']], dtype=np.float32)
+
+    def registered_at(self, username: str) -> Optional[str]:
+        entry = self._rows.get(username)
+        return entry.get('registered_at') if entry else None
+
+    def load_all(self) -> Tuple[List[str], np.ndarray]:
+        """
+        Toàn bộ embedding đang dùng
+
+        Returns:
+            (usernames, matrix (N, dim) float32) - đọc thẳng từ memmap
+        """
+        with self._lock:
+            if self._matrix is None or not self._rows:
+                return [], np.zeros((0, self.embedding_dim), dtype=np.float32)
+
+            usernames = list(self._rows.keys())
+            rows = np.fromiter((self._rows[u]['row'] for u in usernames), dtype=np.int64, count=len(usernames))
+            return usernames, np.asarray(self._matrix[rows], dtype=np.float32)
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _create(self):
+        """Tạo file ma trận rỗng + index"""
+        self.matrix_path.parent.mkdir(parents=True, exist_ok=True)
+        self._capacity = self.initial_capacity
+        with open(self.matrix_path, 'wb') as f:
+            f.truncate(self._row_bytes() * self._capacity)
+        self._rows = {}
+        self._free = list(range(self._capacity))
+        self._meta = {}
+        self._map()
+        self._write_index()
+
+    def _grow(self, new_capacity: int):
+        """Mở rộng file ma trận (truncate lên) rồi map lại - dữ liệu cũ giữ nguyên"""
+        new_capacity = max(new_capacity, self._capacity + 1)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.matrix_path, 'r+b') as f:
+            f.truncate(self._row_bytes() * new_capacity)
+        self._free.extend(range(self._capacity, new_capacity))
+        self._capacity = new_capacity
+        self._map()
+
+    def _map(self):
+        self._matrix = np.memmap(
+            self.matrix_path, dtype=self.dtype, mode='r+',
+            shape=(self._capacity, self.embedding_dim)
+        )
+
+    def _row_bytes(self) -> int:
+        return self.embedding_dim * self.dtype.itemsize
+
+    def _write_index(self):
+        """Ghi index ra file tạm rồi os.replace (không bao giờ để index dở dang)"""
+        index = {
+            'version': STORE_VERSION,
+            'embedding_dim': self.embedding_dim,
+            'dtype': self.dtype.name,
+            'capacity': self._capacity,
+            'rows': self._rows,
+            'free': self._free,
+            'meta': self._meta
+        }
+        tmp_path = self.index_path.with_suffix(self.index_path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+
+# Singleton dùng chung (ArcFaceModel + trang quản lý tài xế cùng ghi 1 kho)
+DEFAULT_MATRIX_PATH = Path("src/GUI/data/face_embeddings.bin")
+DEFAULT_INDEX_PATH = Path("src/GUI/data/face_embeddings.json")
+
+_store_instance = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """
+    Lấy singleton EmbeddingStore đã mở (cấu hình: face_recognition.embedding_store)
+
+    Returns:
+        EmbeddingStore hoặc None nếu bị tắt trong cấu hình (mặc định - xem cảnh báo
+        bảo mật đầu file) / không mở được
+    """
+    global _store_instance
+    from src.BUS.ai_core.model_config import get_config_section
+
+    config = get_config_section("face_recognition", "embedding_store")
+    if not config.get('enabled', False):
+        return None
+
+    with _store_lock:
+        if _store_instance is None:
+            store = EmbeddingStore(
+                DEFAULT_MATRIX_PATH, DEFAULT_INDEX_PATH,
+                dtype=config.get('dtype', 'float32')
+            )
+            if store.open():
+                _store_instance = store
+    return _store_instance
@@ -0,0 +1,528 @@
+"""
+Face Pipeline Benchmark
+=======================
+Đo thời gian từng tầng của pipeline nhận diện khuôn mặt trên CPU.
+
+Chạy:
+    python -m src.BUS.ai_core.login_user.face_benchmark pipeline --images <thư mục ảnh>
+    python -m src.BUS.ai_core.login_user.face_benchmark pipeline --camera 0 --frames 30
+    python -m src.BUS.ai_core.login_user.face_benchmark init [--images <thư mục crop>]
+    python -m src.BUS.ai_core.login_user.face_benchmark quantization [--synthetic 10000]
+    python -m src.BUS.ai_core.login_user.face_benchmark scoring [--sizes 100 1000 10000]
+
+Lệnh 'pipeline' so sánh:
+- two_stage   : YOLOv8 detect → crop → FaceAnalysis.get (detect lại + landmark + gender/age + rec)
+- single_stage: SCRFD detect 1 lần → align 5 điểm → ArcFace recognition
+
+Lệnh 'init' nạp từng cấu hình InsightFace trong 1 tiến trình con riêng
+và so sánh thời gian khởi tạo, RSS và thời gian extract_embedding trên crop.
+
+Lệnh 'quantization' so cosine của gallery float16 / int8 với float32 trên
+các tài xế đã đăng ký (EmbeddingStore) hoặc gallery tổng hợp.
+
+Lệnh 'scoring' là micro-benchmark face_scoring so với
+sklearn.metrics.pairwise.cosine_similarity gọi từng cặp (cách cũ).
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+# Cấu hình face_recognition.insightface để so sánh (None = đọc model_config.json)
+INIT_PROFILES = {
+    'buffalo_l_all_640': {'allowed_modules': [], 'det_size': 640},
+    'configured': None
+}
+
+
+# ============================================================================
+# ĐO THỜI GIAN
+# ============================================================================
+
+class StageTimer:
+    """Gom thời gian (ms) theo từng tầng qua nhiều lần chạy"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def measure(self, stage: str, func, *args, **kwargs):
+        """Chạy func và ghi lại thời gian vào stage"""
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def add(self, stage: str, elapsed_ms: float):
+        self.samples.setdefault(stage, []).append(elapsed_ms)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """{stage: {'mean', 'p50', 'p95', 'n'}} (ms)"""
+        result = {}
+        for stage, values in self.samples.items():
+            arr = np.asarray(values, dtype=np.float64)
+            result[stage] = {
+                'mean': float(arr.mean()),
+                'p50': float(np.percentile(arr, 50)),
+                'p95': float(np.percentile(arr, 95)),
+                'n': int(arr.size)
+            }
+        return result
+
+
+def print_summary(title: str, summary: Dict[str, Dict[str, float]]):
+    """In bảng thời gian từng tầng"""
+    print(f"\n📊 {title}")
+    print(f"   {'stage':<22}{'mean':>10}{'p50':>10}{'p95':>10}{'n':>6}")
+    for stage, stats in summary.items():
+        print(f"   {stage:<22}{stats['mean']:>9.2f}ms{stats['p50']:>8.2f}ms{stats['p95']:>8.2f}ms{stats['n']:>6}")
+
+
+def current_rss_mb() -> Optional[float]:
+    """RSS hiện tại của tiến trình (MB) - psutil nếu có, không thì resource (Unix)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        import resource
+        # ru_maxrss: KB trên Linux, byte trên macOS - là đỉnh, không phải hiện tại
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return None
+
+
+# ============================================================================
+# NGUỒN ẢNH
+# ============================================================================
+
+def load_frames(images_dir: str = None, camera_index: int = None, frames: int = 30) -> List[np.ndarray]:
+    """
+    Lấy danh sách frame BGR từ thư mục ảnh hoặc camera
+
+    Returns:
+        List[np.ndarray]: Các frame đọc được
+    """
+    result = []
+    if images_dir:
+        for path in sorted(Path(images_dir).iterdir()):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                image = cv2.imread(str(path))
+                if image is not None:
+                    result.append(image)
+        return result
+
+    cap = cv2.VideoCapture(camera_index if camera_index is not None else 0)
+    try:
+        while len(result) < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            result.append(cv2.flip(frame, 1))
+    finally:
+        cap.release()
+    return result
+
+
+# ============================================================================
+# BENCHMARK PIPELINE
+# ============================================================================
+
+def benchmark_pipeline(frames: List[np.ndarray], repeat: int = 3, warmup: int = 2,
+                       min_face_size: int = 40, confidence_threshold: float = 0.5) -> Dict:
+    """
+    So sánh thời gian từng tầng giữa two_stage và single_stage
+
+    Args:
+        frames: Frame BGR có khuôn mặt
+        repeat: Số lần lặp qua toàn bộ frame
+        warmup: Số frame chạy trước để làm nóng ONNX Runtime (không tính)
+        min_face_size: Kích thước khuôn mặt tối thiểu
+        confidence_threshold: Ngưỡng YOLOv8
+
+    Returns:
+        Dict: {'two_stage': summary, 'single_stage': summary, 'cosine_agreement': float}
+    """
+    from src.BUS.ai_core.login_user.Arc_face import ArcFaceEmbedding, YOLOv8FaceDetector
+
+    arcface = ArcFaceEmbedding()
+    # two_stage đo đúng như trước: buffalo_l đủ module, det_size cố định 640
+    legacy = ArcFaceEmbedding(INIT_PROFILES['buffalo_l_all_640'])
+    yolo = YOLOv8FaceDetector(confidence_threshold, min_face_size)
+    if arcface.app is None or legacy.app is None or yolo.model is None:
+        print("❌ [BENCHMARK] Không load được InsightFace / YOLOv8")
+        return {}
+
+    for frame in frames[:warmup]:
+        yolo.detect_faces(frame)
+        legacy.app.get(frame)
+        arcface.extract_from_frame(frame, min_face_size)
+
+    two_stage = StageTimer()
+    single_stage = StageTimer()
+    agreements = []
+
+    for _ in range(repeat):
+        for frame in frames:
+            # --- two_stage (cách cũ) ---
+            start = time.perf_counter()
+            faces = two_stage.measure('yolo_detect', yolo.detect_faces, frame)
+            legacy_embedding = None
+            if faces:
+                face = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
+                crop = yolo.crop_face(frame, face['bbox'])
+                rgb = two_stage.measure('bgr2rgb', cv2.cvtColor, crop, cv2.COLOR_BGR2RGB)
+                found = two_stage.measure('insightface_get', legacy.app.get, rgb)
+                if found:
+                    legacy_embedding = found[0].embedding / np.linalg.norm(found[0].embedding)
+            two_stage.add('total', (time.perf_counter() - start) * 1000.0)
+
+            # --- single_stage ---
+            start = time.perf_counter()
+            rgb = single_stage.measure('bgr2rgb', cv2.cvtColor, frame, cv2.COLOR_BGR2RGB)
+            faces = single_stage.measure('scrfd_detect', arcface.detect_faces, rgb, min_face_size)
+            embedding = None
+            faces = [f for f in faces if f['kps'] is not None]
+            if faces:
+                face = max(faces, key=lambda f: f['bbox'][2] * f['bbox'][3])
+                aligned = single_stage.measure('align', arcface.align_face, rgb, face['kps'])
+                embedding = single_stage.measure('recognition', arcface.embed_aligned, aligned)
+            single_stage.add('total', (time.perf_counter() - start) * 1000.0)
+
+            # Embedding 2 cách phải gần như trùng (template cũ vẫn dùng được)
+            if legacy_embedding is not None and embedding is not None:
+                agreements.append(float(np.dot(legacy_embedding, embedding)))
+
+    return {
+        'two_stage': two_stage.summary(),
+        'single_stage': single_stage.summary(),
+        'cosine_agreement': float(np.mean(agreements)) if agreements else 0.0
+    }
+
+
+def _run_pipeline(args):
+    frames = load_frames(args.images, args.camera, args.frames)
+    if not frames:
+        print("❌ [BENCHMARK] Không có frame nào")
+        return
+
+    print(f"🔍 [BENCHMARK] {len(frames)} frame x {args.repeat} lần")
+    result = benchmark_pipeline(frames, repeat=args.repeat, min_face_size=args.min_face_size)
+    if not result:
+        return
+
+    print_summary("two_stage (YOLOv8 + FaceAnalysis.get)", result['two_stage'])
+    print_summary("single_stage (SCRFD + align + ArcFace)", result['single_stage'])
+
+    before = result['two_stage'].get('total', {}).get('mean', 0.0)
+    after = result['single_stage'].get('total', {}).get('mean', 0.0)
+    if after > 0:
+        print(f"\n⚡ Tăng tốc: {before / after:.2f}x ({before:.1f}ms → {after:.1f}ms)")
+    print(f"🔗 Cosine trung bình giữa 2 pipeline: {result['cosine_agreement']:.4f}")
+
+
+# ============================================================================
+# BENCHMARK KHỞI TẠO INSIGHTFACE
+# ============================================================================
+
+def probe_init(profile: Optional[Dict], images_dir: str = None, repeat: int = 3) -> Dict:
+    """
+    Đo trong tiến trình hiện tại: RSS trước/sau khi nạp model + thời gian extract
+
+    Args:
+        profile: Cấu hình face_recognition.insightface (None = đọc model_config.json)
+        images_dir: Thư mục crop khuôn mặt để đo extract_embedding
+        repeat: Số lần lặp qua các crop
+    """
+    from src.BUS.ai_core.login_user.Arc_face import ArcFaceEmbedding
+
+    rss_before = current_rss_mb()
+    arcface = ArcFaceEmbedding(profile)
+    rss_after = current_rss_mb()
+
+    result = {
+        'loaded': arcface.app is not None,
+        'modules': list(arcface.app.models.keys()) if arcface.app is not None else [],
+        'init_seconds': arcface.init_seconds,
+        'rss_before_mb': rss_before,
+        'rss_after_mb': rss_after
+    }
+
+    crops = load_frames(images_dir) if images_dir else []
+    if crops and arcface.app is not None:
+        for crop in crops[:2]:
+            arcface.extract_embedding(crop)
+        timer = StageTimer()
+        for _ in range(repeat):
+            for crop in crops:
+                timer.measure('extract_embedding', arcface.extract_embedding, crop)
+        result['extract'] = timer.summary().get('extract_embedding')
+    return result
+
+
+def _run_init(args):
+    results = {}
+    for name, profile in INIT_PROFILES.items():
+        # Mỗi cấu hình 1 tiến trình mới để RSS / thời gian nạp không bị lẫn
+        command = [sys.executable, '-m', __spec__.name if __spec__ else 'src.BUS.ai_core.login_user.face_benchmark',
+                   'init-probe', '--profile', json.dumps(profile), '--repeat', str(args.repeat)]
+        if args.images:
+            command += ['--images', args.images]
+        output = subprocess.run(command, capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith('{')]
+        if not lines:
+            print(f"❌ [BENCHMARK] {name}: {output.stderr.strip()[-300:]}")
+            continue
+        results[name] = json.loads(lines[-1])
+
+    print(f"\n📊 Khởi tạo InsightFace")
+    print(f"   {'profile':<20}{'init':>9}{'ΔRSS':>11}{'extract':>11}  modules")
+    for name, r in results.items():
+        delta = (r['rss_after_mb'] - r['rss_before_mb']) if r['rss_after_mb'] is not None else float('nan')
+        extract = r.get('extract', {}).get('mean', float('nan')) if r.get('extract') else float('nan')
+        print(f"   {name:<20}{r['init_seconds']:>8.2f}s{delta:>9.1f}MB{extract:>9.2f}ms  {', '.join(r['modules'])}")
+
+
+def _run_init_probe(args):
+    profile = json.loads(args.profile)
+    print(json.dumps(probe_init(profile, args.images, args.repeat)))
+
+
+# ============================================================================
+# BENCHMARK LƯỢNG TỬ HÓA GALLERY
+# ============================================================================
+
+def load_enrolled_matrix() -> Tuple[List[str], np.ndarray]:
+    """
+    Embedding float32 của tài xế đã đăng ký
+
+    Cùng nguồn với face_calibration: gallery đã giải mã sẵn (model đang chạy /
+    niêm phong / EmbeddingStore), nếu không có thì giải mã template từ accounts.json
+    (mỗi template 1 hàng - usernames có thể lặp lại).
+    """
+    from src.BUS.ai_core.login_user import face_calibration
+
+    loaded = face_calibration.load_gallery_vectors()
+    if loaded is None:
+        if not face_calibration.ACCOUNTS_FILE.exists():
+            return [], np.zeros((0, 512), dtype=np.float32)
+        loaded = face_calibration.load_labeled_templates()
+    usernames, labels, vectors = loaded
+    return [usernames[i] for i in labels], vectors
+
+
+def synthetic_matrix(n: int, dim: int = 512, seed: int = 0) -> np.ndarray:
+    """Gallery giả lập (vector ngẫu nhiên đã chuẩn hóa) khi chưa đủ tài xế thật"""
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def benchmark_quantization(matrix: np.ndarray, threshold: float = 0.35, max_probes: int = 500,
+                           noise: float = 0.6, repeat: int = 20, seed: int = 0) -> Dict:
+    """
+    So sánh điểm cosine float16 / int8 với float32
+
+    Probe = embedding đã đăng ký + nhiễu Gauss (mô phỏng lần đăng nhập khác),
+    nên vừa có cặp cùng người (điểm cao) vừa có cặp khác người.
+
+    Args:
+        matrix: (N, D) embedding float32 đã đăng ký
+        threshold: cosine_threshold dùng để so quyết định chấp nhận / từ chối
+        max_probes: Số probe tối đa
+        noise: Độ lệch chuẩn nhiễu (tương đối so với norm 1)
+        repeat: Số lần đo thời gian search
+
+    Returns:
+        Dict: {precision: {'max_abs_error', 'mean_abs_error', 'top1_agreement',
+                           'decision_agreement', 'bytes', 'search_ms'}}
+    """
+    from src.BUS.ai_core.login_user import face_scoring
+    from src.BUS.ai_core.login_user.face_gallery import FaceGallery
+
+    n, dim = matrix.shape
+    rng = np.random.default_rng(seed)
+    probe_rows = rng.choice(n, min(n, max_probes), replace=False)
+    probes = matrix[probe_rows] + rng.standard_normal((len(probe_rows), dim)).astype(np.float32) * noise / np.sqrt(dim)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+
+    names = [str(i) for i in range(n)]
+    galleries = {}
+    for precision in ('float32', 'float16', 'int8'):
+        gallery = FaceGallery(dim, precision=precision)
+        gallery.build_from_matrix(names, matrix)
+        galleries[precision] = gallery
+
+    reference = probes @ galleries['float32'].matrix.T
+    reference_top1 = reference.argmax(axis=1)
+
+    report = {}
+    for precision, gallery in galleries.items():
+        codes, scales = gallery._matrix[:n], gallery._scales[:n]
+        scores = face_scoring.many_vs_many(probes, codes, scales, precision)
+        error = np.abs(scores - reference)
+
+        timer = StageTimer()
+        for _ in range(repeat):
+            timer.measure('search', gallery.search, probes[0], 5)
+
+        report[precision] = {
+            'max_abs_error': float(error.max()),
+            'mean_abs_error': float(error.mean()),
+            'top1_agreement': float(np.mean(scores.argmax(axis=1) == reference_top1)),
+            'decision_agreement': float(np.mean((scores >= threshold) == (reference >= threshold))),
+            'bytes': gallery.nbytes,
+            'search_ms': timer.summary()['search']['p50']
+        }
+    return report
+
+
+def _run_quantization(args):
+    from src.BUS.ai_core.model_config import get_config_section
+
+    if args.synthetic:
+        source = f"synthetic x{args.synthetic}"
+        matrix = synthetic_matrix(args.synthetic)
+    else:
+        usernames, matrix = load_enrolled_matrix()
+        source = f"{len(set(usernames))} tài xế đã đăng ký ({matrix.shape[0]} vector)"
+    if matrix.shape[0] == 0:
+        print("❌ [BENCHMARK] Gallery rỗng - dùng --synthetic N")
+        return
+
+    threshold = get_config_section("face_recognition").get('cosine_threshold', 0.35)
+    report = benchmark_quantization(matrix, threshold=threshold)
+
+    print(f"\n📊 Lượng tử hóa gallery ({source}, ngưỡng {threshold})")
+    print(f"   {'precision':<10}{'max|Δ|':>10}{'mean|Δ|':>10}{'top-1':>9}{'quyết định':>12}{'bộ nhớ':>12}{'search p50':>12}")
+    for precision, r in report.items():
+        print(f"   {precision:<10}{r['max_abs_error']:>10.5f}{r['mean_abs_error']:>10.5f}"
+              f"{r['top1_agreement']:>8.1%}{r['decision_agreement']:>11.2%}"
+              f"{r['bytes'] / 1024:>10.1f}KB{r['search_ms']:>10.3f}ms")
+
+
+# ============================================================================
+# MICRO-BENCHMARK CHẤM ĐIỂM
+# ============================================================================
+
+def _time_call(func, repeat: int) -> float:
+    """Thời gian trung vị (µs) của func() qua repeat lần"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.median(samples))
+
+
+def benchmark_scoring(sizes: List[int], dim: int = 512, probes: int = 32, repeat: int = 20) -> Dict:
+    """
+    So sánh face_scoring với sklearn cosine_similarity từng cặp
+
+    Returns:
+        Dict: {case: {'sklearn_us', 'kernel_us', 'speedup'}}
+    """
+    from src.BUS.ai_core.login_user import face_scoring
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        cosine_similarity = None
+
+    matrix = synthetic_matrix(max(sizes), dim)
+    probe_set = synthetic_matrix(probes, dim, seed=1)
+    probe = probe_set[0]
+    results = {}
+
+    def record(case, legacy, kernel, legacy_repeat=repeat):
+        legacy_us = _time_call(legacy, legacy_repeat) if cosine_similarity is not None else float('nan')
+        kernel_us = _time_call(kernel, repeat)
+        results[case] = {'sklearn_us': legacy_us, 'kernel_us': kernel_us,
+                         'speedup': legacy_us / kernel_us if kernel_us else float('nan')}
+
+    # 1 cặp (compare_embeddings cũ)
+    other = matrix[0]
+    record('1 vs 1',
+           lambda: cosine_similarity([probe], [other])[0][0],
+           lambda: face_scoring.one_vs_many(probe, other.reshape(1, -1))[0])
+
+    # 1 probe vs N: vòng lặp từng cặp (cách cũ) vs 1 GEMV + top-k
+    for n in sizes:
+        gallery = matrix[:n]
+        record(f'1 vs {n} (top-5)',
+               lambda: [cosine_similarity([probe], [row])[0][0] for row in gallery],
+               lambda: face_scoring.search(probe, gallery, 5, threshold=0.35),
+               legacy_repeat=max(1, min(repeat, 2000 // n)))
+
+    # P probe vs N (nhiều frame / đăng ký nhiều template)
+    n = sizes[-1]
+    gallery = matrix[:n]
+    record(f'{probes} vs {n}',
+           lambda: cosine_similarity(probe_set, gallery),
+           lambda: face_scoring.many_vs_many(probe_set, gallery))
+    return results
+
+
+def _run_scoring(args):
+    results = benchmark_scoring(args.sizes, repeat=args.repeat)
+    print(f"\n📊 Chấm điểm cosine: sklearn vs face_scoring")
+    print(f"   {'case':<22}{'sklearn':>14}{'kernel':>14}{'speedup':>10}")
+    for case, r in results.items():
+        print(f"   {case:<22}{r['sklearn_us']:>12.1f}µs{r['kernel_us']:>12.1f}µs{r['speedup']:>9.1f}x")
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark pipeline nhận diện khuôn mặt (CPU)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    pipeline = commands.add_parser('pipeline', help="So sánh two_stage và single_stage theo từng tầng")
+    pipeline.add_argument('--images', help="Thư mục ảnh khuôn mặt")
+    pipeline.add_argument('--camera', type=int, default=None, help="Chụp từ camera thay vì thư mục")
+    pipeline.add_argument('--frames', type=int, default=30, help="Số frame lấy từ camera")
+    pipeline.add_argument('--repeat', type=int, default=3)
+    pipeline.add_argument('--min-face-size', type=int, default=40)
+    pipeline.set_defaults(func=_run_pipeline)
+
+    init = commands.add_parser('init', help="So sánh thời gian nạp / RSS: toàn bộ buffalo_l vs cấu hình hiện tại")
+    init.add_argument('--images', help="Thư mục crop khuôn mặt để đo extract_embedding")
+    init.add_argument('--repeat', type=int, default=3)
+    init.set_defaults(func=_run_init)
+
+    quantization = commands.add_parser('quantization', help="Độ chính xác cosine float16/int8 so với float32")
+    quantization.add_argument('--synthetic', type=int, default=0, help="Dùng N embedding giả lập thay vì tài xế thật")
+    quantization.set_defaults(func=_run_quantization)
+
+    scoring = commands.add_parser('scoring', help="Micro-benchmark face_scoring vs sklearn cosine_similarity")
+    scoring.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    scoring.add_argument('--repeat', type=int, default=20)
+    scoring.set_defaults(func=_run_scoring)
+
+    # Lệnh nội bộ - chạy trong tiến trình con của 'init'
+    init_probe = commands.add_parser('init-probe')
+    init_probe.add_argument('--profile', default='null')
+    init_probe.add_argument('--images')
+    init_probe.add_argument('--repeat', type=int, default=3)
+    init_probe.set_defaults(func=_run_init_probe)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Face Threshold Calibration
+==========================
+Hiệu chỉnh cosine_threshold từ chính các tài xế đã đăng ký:
+
+1. Lấy vector đã giải mã sẵn (gallery của ArcFaceModel đang chạy, gallery niêm
+   phong, EmbeddingStore) - 1 centroid / tài xế, chỉ đo được FAR; hoặc với
+   --templates: giải mã template đăng ký của từng tài xế (PBKDF2 mỗi người,
+   chậm) để có thêm cặp genuine → FRR
+2. Chấm điểm mọi cặp template trong 1 lượt vectorized theo khối hàng
+   (GEMM (B, D) x (D, M)), cặp cùng người = genuine, khác người = impostor
+3. Cộng dồn histogram điểm → FAR / FRR tại mọi ngưỡng bằng cumsum
+4. Đề xuất ngưỡng cho các FAR mục tiêu, vẽ ROC / DET, ghi ngưỡng đã chọn
+   vào model_config.json
+
+Bộ nhớ tạm chỉ là 1 khối (block_rows, M) nên gallery hàng nghìn tài xế
+(vài chục nghìn template) vẫn chấm xong trong vài giây.
+
+Chạy:
+    python -m src.BUS.ai_core.login_user.face_calibration [--templates] [--plot roc.png] [--far 1e-3 1e-4] [--apply 1e-4]
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.BUS.ai_core.model_config import MODEL_CONFIG_PATH, get_config_section
+
+# Vẽ biểu đồ (tùy chọn)
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+ACCOUNTS_FILE = Path("src/GUI/data/accounts.json")
+DEFAULT_TARGET_FARS = (1e-2, 1e-3, 1e-4, 1e-5)
+
+
+# ========== NẠP TEMPLATE ==========
+
+def load_gallery_vectors(model=None, accounts_file: Path = ACCOUNTS_FILE
+                         ) -> Optional[Tuple[List[str], np.ndarray, np.ndarray]]:
+    """
+    Vector gallery đã giải mã sẵn - không mở khóa mật khẩu từng tài xế
+
+    Thứ tự: gallery của model (hoặc ArcFaceModel đã warm-up) → gallery niêm phong
+    → EmbeddingStore; bản sao trên đĩa cũ hơn accounts.json bị bỏ qua.
+
+    Returns:
+        (usernames, labels, vectors) như load_labeled_templates (1 vector / tài xế)
+        hoặc None nếu không có nguồn nào
+    """
+    from src.BUS.ai_core.login_user import face_scoring
+
+    usernames, matrix = _gallery_snapshot(model, accounts_file)
+    if not usernames:
+        return None
+    labels = np.arange(len(usernames), dtype=np.int32)
+    return usernames, labels, face_scoring.l2_normalize(np.asarray(matrix, dtype=np.float32))
+
+
+def load_labeled_templates(accounts_file: Path = ACCOUNTS_FILE) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Giải mã embedding của tất cả tài xế thành ma trận có nhãn
+
+    Returns:
+        (usernames, labels (M,) int32 chỉ số vào usernames, vectors (M, D) float32 đã chuẩn hóa)
+    """
+    from src.BUS.ai_core.login_user.Arc_face import FaceEncryption
+    from src.BUS.ai_core.login_user import face_scoring
+
+    with open(accounts_file, 'r', encoding='utf-8') as f:
+        users = json.load(f).get('user_accounts', [])
+
+    encryption = FaceEncryption()
+    usernames, labels, blocks = [], [], []
+    for user in users:
+        face_data = user.get('face_data')
+        if not face_data:
+            continue
+        vectors = decrypt_vectors(encryption, face_data, user.get('password', ''))
+        if vectors is None:
+            continue
+        labels.append(np.full(vectors.shape[0], len(usernames), dtype=np.int32))
+        usernames.append(user['username'])
+        blocks.append(vectors)
+
+    if not blocks:
+        return [], np.zeros(0, dtype=np.int32), np.zeros((0, 512), dtype=np.float32)
+    return usernames, np.concatenate(labels), face_scoring.l2_normalize(np.vstack(blocks))
+
+
+def decrypt_vectors(encryption, face_data: Dict, password: str) -> Optional[np.ndarray]:
+    """
+    Template đăng ký nhiều frame (K, D); chỉ có centroid thì trả về (1, D)
+
+    Centroid là trung bình của chính các template nên không đưa vào cùng
+    (sẽ làm điểm genuine cao giả tạo).
+    """
+    data_key = encryption.unwrap_data_key(face_data, password)
+    count = int(face_data.get('template_count', 0) or 0)
+    if count > 0:
+        data = encryption.decrypt_field(face_data, 'templates', password, data_key)
+        if data is not None and len(data) == count * 2048:
+            return np.frombuffer(data, dtype=np.float32).reshape(count, -1)
+
+    data = encryption.decrypt_field(face_data, 'embedding', password, data_key)
+    if data is None or len(data) != 2048:
+        return None
+    return np.frombuffer(data, dtype=np.float32).reshape(1, -1)
+
+
+def _gallery_snapshot(model, accounts_file: Path) -> Tuple[List[str], Optional[np.ndarray]]:
+    """(usernames, ma trận) từ nguồn nhanh đầu tiên có dữ liệu"""
+    if model is None:
+        from src.BUS.ai_core.model_warmup import get_warmup_service
+        service = get_warmup_service()
+        if service.is_ready('arcface'):
+            model = service.get('arcface')
+    if model is not None:
+        usernames, matrix = model.load_gallery().snapshot()
+        if usernames:
+            return usernames, matrix
+
+    accounts_mtime = Path(accounts_file).stat().st_mtime if Path(accounts_file).exists() else 0.0
+
+    sealed_config = get_config_section("face_recognition", "sealed_gallery")
+    if sealed_config.get('enabled', False):
+        from src.BUS.ai_core.login_user.sealed_gallery import SealedGallery
+        sealed = SealedGallery(
+            Path(sealed_config.get('path', 'src/GUI/data/face_gallery.sealed')),
+            Path(sealed_config.get('key_file', 'src/GUI/data/face_service.key'))
+        )
+        if (sealed.mtime() or 0.0) >= accounts_mtime:
+            unsealed = sealed.unseal()
+            if unsealed is not None:
+                usernames, matrix, buffer = unsealed
+                try:
+                    return usernames, np.array(matrix, dtype=np.float32)
+                finally:
+                    buffer.wipe()
+                    sealed.wipe_key()
+
+    from src.BUS.ai_core.login_user.embedding_store import get_embedding_store
+    store = get_embedding_store()
+    if store is not None and (store.mtime() or 0.0) >= accounts_mtime:
+        usernames, matrix = store.load_all()
+        if usernames:
+            return usernames, matrix
+
+    return [], None
+
+
+# ========== CHẤM ĐIỂM ==========
+
+def score_histograms(labels: np.ndarray, vectors: np.ndarray, bins: int = 2000,
+                     block_rows: int = 256) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Histogram điểm genuine / impostor trên mọi cặp (i < j)
+
+    Args:
+        labels: (M,) nhãn tài xế
+        vectors: (M, D) đã chuẩn hóa
+        bins: Số bin trên [-1, 1]
+        block_rows: Số hàng mỗi khối GEMM
+
+    Returns:
+        (edges (bins + 1,), genuine_hist (bins,), impostor_hist (bins,)) - hist kiểu int64
+    """
+    edges = np.linspace(-1.0, 1.0, bins + 1)
+    genuine = np.zeros(bins, dtype=np.int64)
+    impostor = np.zeros(bins, dtype=np.int64)
+    m = vectors.shape[0]
+
+    for start in range(0, m - 1, block_rows):
+        stop = min(start + block_rows, m)
+        # Chỉ lấy cột j > i: khối (stop - start, m - start - 1)
+        scores = vectors[start:stop] @ vectors[start + 1:].T
+        rows = np.arange(start, stop)[:, None]
+        cols = np.arange(start + 1, m)[None, :]
+        upper = cols > rows
+        same = labels[start:stop, None] == labels[None, start + 1:]
+
+        idx = np.clip(((scores + 1.0) * (bins / 2.0)).astype(np.int64), 0, bins - 1)
+        genuine += np.bincount(idx[upper & same], minlength=bins)
+        impostor += np.bincount(idx[upper & ~same], minlength=bins)
+
+    return edges, genuine, impostor
+
+
+def error_rates(edges: np.ndarray, genuine: np.ndarray,
+                impostor: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    FAR / FRR khi chấp nhận điểm >= ngưỡng, tại mỗi cạnh trái của bin
+
+    Returns:
+        (thresholds (bins,), far (bins,), frr (bins,))
+    """
+    thresholds = edges[:-1]
+    n_gen = max(int(genuine.sum()), 1)
+    n_imp = max(int(impostor.sum()), 1)
+    # Số điểm >= thresholds[k] = tổng hậu tố từ bin k
+    far = np.cumsum(impostor[::-1])[::-1] / n_imp
+    frr = 1.0 - np.cumsum(genuine[::-1])[::-1] / n_gen
+    return thresholds, far, frr
+
+
+def suggest_threshold(thresholds: np.ndarray, far: np.ndarray, target_far: float) -> float:
+    """Ngưỡng nhỏ nhất (FRR thấp nhất) mà FAR <= target_far"""
+    ok = np.flatnonzero(far <= target_far)
+    return float(thresholds[ok[0]]) if ok.size else 1.0
+
+
+def equal_error_rate(thresholds: np.ndarray, far: np.ndarray, frr: np.ndarray) -> Tuple[float, float]:
+    """(EER, ngưỡng tại EER)"""
+    k = int(np.argmin(np.abs(far - frr)))
+    return float((far[k] + frr[k]) / 2.0), float(thresholds[k])
+
+
+def calibrate(labels: np.ndarray, vectors: np.ndarray,
+              target_fars: Sequence[float] = DEFAULT_TARGET_FARS, bins: int = 2000) -> Dict:
+    """
+    Hiệu chỉnh ngưỡng trên ma trận template có nhãn
+
+    Returns:
+        Dict: {'templates', 'drivers', 'genuine_pairs', 'impostor_pairs', 'seconds',
+               'thresholds', 'far', 'frr', 'eer', 'eer_threshold',
+               'suggestions': [{'target_far', 'threshold', 'far', 'frr'}]}
+    """
+    start = time.perf_counter()
+    edges, genuine, impostor = score_histograms(labels, vectors, bins)
+    thresholds, far, frr = error_rates(edges, genuine, impostor)
+    eer, eer_threshold = equal_error_rate(thresholds, far, frr)
+
+    suggestions = []
+    for target in target_fars:
+        threshold = suggest_threshold(thresholds, far, target)
+        k = min(int(np.searchsorted(thresholds, threshold)), len(thresholds) - 1)
+        suggestions.append({'target_far': float(target), 'threshold': threshold,
+                            'far': float(far[k]), 'frr': float(frr[k])})
+
+    return {
+        'templates': int(vectors.shape[0]),
+        'drivers': int(np.unique(labels).size),
+        'genuine_pairs': int(genuine.sum()),
+        'impostor_pairs': int(impostor.sum()),
+        'seconds': time.perf_counter() - start,
+        'thresholds': thresholds,
+        'far': far,
+        'frr': frr,
+        'eer': eer,
+        'eer_threshold': eer_threshold,
+        'suggestions': suggestions
+    }
+
+
+def rates_at(result: Dict, threshold: float) -> Tuple[float, float]:
+    """(FAR, FRR) tại 1 ngưỡng bất kỳ (vd: cosine_threshold hiện tại)"""
+    k = int(np.clip(np.searchsorted(result['thresholds'], threshold), 0, len(result['thresholds']) - 1))
+    return float(result['far'][k]), float(result['frr'][k])
+
+
+# ========== BIỂU ĐỒ + GHI CẤU HÌNH ==========
+
+def plot_curves(result: Dict, output_path: str, current_threshold: Optional[float] = None) -> bool:
+    """
+    Vẽ ROC (TAR theo FAR) và DET (FRR theo FAR) ra file ảnh
+
+    Returns:
+        bool: False nếu chưa cài matplotlib
+    """
+    if not MATPLOTLIB_AVAILABLE:
+        return False
+
+    far = np.maximum(result['far'], 1e-7)
+    frr = np.maximum(result['frr'], 1e-7)
+    fig, (roc, det) = plt.subplots(1, 2, figsize=(11, 4.5))
+
+    roc.semilogx(far, 1.0 - result['frr'])
+    roc.set_xlabel("FAR")
+    roc.set_ylabel("TAR (1 - FRR)")
+    roc.set_title("ROC")
+    roc.grid(True, which='both', alpha=0.3)
+
+    det.loglog(far, frr)
+    det.set_xlabel("FAR")
+    det.set_ylabel("FRR")
+    det.set_title(f"DET (EER {result['eer']:.2%} @ {result['eer_threshold']:.3f})")
+    det.grid(True, which='both', alpha=0.3)
+
+    for s in result['suggestions']:
+        det.plot(max(s['far'], 1e-7), max(s['frr'], 1e-7), 'o', label=f"FAR≤{s['target_far']:g}: {s['threshold']:.3f}")
+    if current_threshold is not None:
+        cur_far, cur_frr = rates_at(result, current_threshold)
+        det.plot(max(cur_far, 1e-7), max(cur_frr, 1e-7), 'x', markersize=10, color='red',
+                 label=f"Hiện tại: {current_threshold:.3f}")
+    det.legend(fontsize=8)
+
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=110)
+    plt.close(fig)
+    return True
+
+
+def write_threshold(threshold: float, config_path: str = MODEL_CONFIG_PATH):
+    """Ghi face_recognition.cosine_threshold vào model_config.json (file tạm + os.replace)"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        config_data = json.load(f)
+    config_data.setdefault("face_recognition", {})["cosine_threshold"] = round(float(threshold), 4)
+    tmp_path = f"{config_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config_data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, config_path)
+
+
+def run_calibration(accounts_file: Path = ACCOUNTS_FILE,
+                    target_fars: Sequence[float] = DEFAULT_TARGET_FARS,
+                    templates: bool = False, model=None) -> Dict:
+    """
+    Nạp vector rồi hiệu chỉnh (thêm 'source', 'load_seconds' vào kết quả)
+
+    Args:
+        templates: True = giải mã template đăng ký từng tài xế (có cặp genuine → FRR);
+                   False = dùng gallery đã giải mã sẵn nếu có, không thì giải mã template
+        model: ArcFaceModel đang chạy (None = lấy từ ModelWarmupService nếu đã sẵn sàng)
+    """
+    start = time.perf_counter()
+    loaded = None if templates else load_gallery_vectors(model, accounts_file)
+    source = 'gallery'
+    if loaded is None:
+        loaded = load_labeled_templates(accounts_file)
+        source = 'templates'
+    usernames, labels, vectors = loaded
+    load_seconds = time.perf_counter() - start
+
+    result = calibrate(labels, vectors, target_fars)
+    result['source'] = source
+    result['load_seconds'] = load_seconds
+    return result
+
+
+def print_report(result: Dict, current_threshold: Optional[float] = None):
+    print(f"\n{'='*70}")
+    print(f"📊 [CALIBRATION] {result['drivers']} tài xế, {result['templates']} template")
+    print(f"   ├─ Cặp genuine: {result['genuine_pairs']:,} | impostor: {result['impostor_pairs']:,}")
+    print(f"   ├─ Nguồn: {result.get('source', 'templates')} | Nạp: {result.get('load_seconds', 0.0):.2f}s"
+          f" | Chấm điểm: {result['seconds']:.2f}s")
+    print(f"   └─ EER: {result['eer']:.2%} tại ngưỡng {result['eer_threshold']:.3f}")
+    if result['genuine_pairs'] == 0:
+        if result.get('source') == 'gallery':
+            print("⚠️ [CALIBRATION] Gallery chỉ có 1 vector / tài xế → chỉ đo FAR; chạy --templates để có FRR")
+        else:
+            print("⚠️ [CALIBRATION] Không có cặp genuine (cần tài xế đăng ký nhiều frame) - FRR không đáng tin")
+    else:
+        print("⚠️ [CALIBRATION] Cặp genuine đều lấy từ cùng 1 lần đăng ký (cùng ánh sáng / tư thế / thời điểm)"
+              " - FRR ở đây lạc quan, FRR thực tế khi đăng nhập sẽ cao hơn")
+    print(f"\n{'FAR mục tiêu':>14} {'Ngưỡng':>8} {'FAR':>10} {'FRR':>8}")
+    for s in result['suggestions']:
+        print(f"{s['target_far']:>14g} {s['threshold']:>8.3f} {s['far']:>10.2e} {s['frr']:>8.2%}")
+    if current_threshold is not None:
+        cur_far, cur_frr = rates_at(result, current_threshold)
+        print(f"{'Hiện tại':>14} {current_threshold:>8.3f} {cur_far:>10.2e} {cur_frr:>8.2%}")
+    print(f"{'='*70}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hiệu chỉnh cosine_threshold (FAR / FRR / ROC) trên gallery đã đăng ký")
+    parser.add_argument('--accounts', default=str(ACCOUNTS_FILE), help="Đường dẫn accounts.json")
+    parser.add_argument('--templates', action='store_true',
+                        help="Giải mã template từng tài xế (chậm, cần để đo FRR) thay vì dùng gallery")
+    parser.add_argument('--far', type=float, nargs='+', default=list(DEFAULT_TARGET_FARS), help="Các FAR mục tiêu")
+    parser.add_argument('--plot', default=None, help="Lưu biểu đồ ROC / DET ra file ảnh")
+    parser.add_argument('--apply', type=float, default=None,
+                        help="Ghi ngưỡng đề xuất cho FAR mục tiêu này vào model_config.json")
+    args = parser.parse_args(argv)
+
+    current = get_config_section("face_recognition").get('cosine_threshold')
+    target_fars = sorted(set(args.far + ([args.apply] if args.apply else [])), reverse=True)
+    result = run_calibration(Path(args.accounts), target_fars, templates=args.templates)
+    print_report(result, current)
+
+    if args.plot:
+        if plot_curves(result, args.plot, current):
+            print(f"🖼️ [CALIBRATION] Đã lưu biểu đồ: {args.plot}")
+        else:
+            print("⚠️ [CALIBRATION] Chưa cài matplotlib, bỏ qua biểu đồ")
+
+    if args.apply:
+        threshold = suggest_threshold(result['thresholds'], result['far'], args.apply)
+        write_threshold(threshold)
+        print(f"✅ [CALIBRATION] cosine_threshold = {threshold:.3f} (FAR ≤ {args.apply:g})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Face Gallery Index
+==================
+Chỉ mục 1:N cho face login: giữ toàn bộ embedding ArcFace đã đăng ký
+trong MỘT ma trận float32 đã chuẩn hóa L2.
+
+Nhận diện "đây là ai" = 1 phép nhân ma trận-vector + top-k,
+không còn giải mã / chạy model lại cho từng tài khoản.
+Gallery lớn (>= ann.min_gallery_size) có thể dùng IVFIndex thay cho quét toàn bộ
+(index chỉ giữ số hàng theo cụm, chấm điểm trên chính ma trận của gallery).
+Ma trận có thể lưu gọn dạng float16 / int8 (xem embedding_quant).
+Có thể truyền allocator (vd: SecureArena) để ma trận nằm trong vùng nhớ khóa.
+"""
+
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from src.BUS.ai_core.login_user.ann_index import IVFIndex
+from src.BUS.ai_core.login_user import embedding_quant, face_scoring
+
+
+class FaceGallery:
+    """Gallery embedding trong bộ nhớ (thread-safe)"""
+
+    def __init__(self, embedding_dim: int = 512, initial_capacity: int = 64,
+                 ann_config: Optional[Dict] = None, precision: str = 'float32',
+                 allocator=None):
+        """
+        Args:
+            embedding_dim: Số chiều embedding (ArcFace = 512)
+            initial_capacity: Số hàng cấp phát sẵn (tự nhân đôi khi đầy)
+            precision: 'float32' | 'float16' | 'int8' (biểu diễn ma trận trong RAM)
+            allocator: Đối tượng có zeros(shape, dtype) / release(array) / wipe()
+                (vd: SecureArena); None = np.zeros
+            ann_config: Cấu hình face_recognition.ann {
+                'enabled': bool,
+                'min_gallery_size': int (dưới ngưỡng này luôn tìm chính xác),
+                'nlist': int (0 = tự chọn),
+                'nprobe': int (recall ↔ latency)
+            }
+        """
+        self.embedding_dim = embedding_dim
+        self.precision = embedding_quant.normalize_precision(precision)
+        self._dtype = embedding_quant.storage_dtype(self.precision)
+        self._lock = threading.RLock()
+        self._allocator = allocator
+        self._matrix = self._zeros((initial_capacity, embedding_dim))
+        self._scales = np.ones(initial_capacity, dtype=np.float32)
+        self._size = 0
+        self._usernames: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+        ann_config = ann_config or {}
+        self.ann_enabled = bool(ann_config.get('enabled', False))
+        self.ann_min_size = int(ann_config.get('min_gallery_size', 5000))
+        self._ann: Optional[IVFIndex] = None
+        if self.ann_enabled:
+            self._ann = IVFIndex(
+                embedding_dim,
+                nlist=int(ann_config.get('nlist', 0)),
+                nprobe=int(ann_config.get('nprobe', 8))
+            )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._rows
+
+    @property
+    def usernames(self) -> List[str]:
+        """Danh sách username theo thứ tự hàng trong ma trận"""
+        with self._lock:
+            return list(self._usernames)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """(N, D) float32 các embedding đang dùng - view nếu float32, bản giải mã nếu nén"""
+        if self.precision == 'float32':
+            return self._matrix[:self._size]
+        return embedding_quant.dequantize(self._matrix[:self._size], self._scales[:self._size], self.precision)
+    
+    def snapshot(self) -> Tuple[List[str], np.ndarray]:
+        """(usernames, ma trận float32) nhất quán với nhau - dùng khi ghi ra đĩa"""
+        with self._lock:
+            return list(self._usernames), self.matrix
+
+    @property
+    def nbytes(self) -> int:
+        """Bộ nhớ của phần ma trận đang dùng (kể cả scale int8)"""
+        return self._size * embedding_quant.bytes_per_vector(self.embedding_dim, self.precision)
+
+    # ========== CẬP NHẬT GALLERY ==========
+
+    def add(self, username: str, embedding: np.ndarray) -> bool:
+        """
+        Thêm hoặc ghi đè embedding của một tài khoản
+
+        Args:
+            username: Tên đăng nhập
+            embedding: Vector (D,) - sẽ được chuẩn hóa L2
+
+        Returns:
+            bool: False nếu embedding không hợp lệ
+        """
+        vector = self._normalize(embedding)
+        if vector is None:
+            return False
+
+        with self._lock:
+            row = self._rows.get(username)
+            if row is None:
+                self._ensure_capacity(self._size + 1)
+                row = self._size
+                self._rows[username] = row
+                self._usernames.append(username)
+                self._size += 1
+            codes, scales = embedding_quant.quantize(vector, self.precision)
+            self._matrix[row] = codes
+            if scales is not None:
+                self._scales[row] = scales[0]
+            if self._ann is not None:
+                self._ann.add(row, vector)
+        return True
+
+    def remove(self, username: str) -> bool:
+        """
+        Xóa một tài khoản khỏi gallery (swap với hàng cuối - O(D))
+
+        Returns:
+            bool: True nếu đã xóa
+        """
+        with self._lock:
+            row = self._rows.pop(username, None)
+            if row is None:
+                return False
+
+            last = self._size - 1
+            if row != last:
+                last_name = self._usernames[last]
+                self._matrix[row] = self._matrix[last]
+                self._scales[row] = self._scales[last]
+                self._usernames[row] = last_name
+                self._rows[last_name] = row
+
+            self._usernames.pop()
+            self._size -= 1
+            if self._ann is not None:
+                self._ann.remove(row, last)
+        return True
+
+    def build(self, embeddings: Dict[str, np.ndarray]) -> int:
+        """
+        Dựng lại toàn bộ gallery trong 1 lần (vectorized)
+
+        Args:
+            embeddings: {username: embedding}
+
+        Returns:
+            int: Số tài khoản nạp thành công
+        """
+        names = []
+        vectors = []
+        for username, embedding in embeddings.items():
+            vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+            if vector.shape[0] != self.embedding_dim:
+                continue
+            names.append(username)
+            vectors.append(vector)
+
+        with self._lock:
+            capacity = max(len(names), 1)
+            self._replace_matrix(self._zeros((capacity, self.embedding_dim)))
+            self._scales = np.ones(capacity, dtype=np.float32)
+            if names and self.precision == 'float32':
+                # Chép + chuẩn hóa tại chỗ: không tạo bản sao tạm ngoài allocator
+                target = self._matrix[:len(names)]
+                for row, vector in enumerate(vectors):
+                    target[row] = vector
+                norms = np.linalg.norm(target, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                target /= norms
+            elif names:
+                stacked = np.stack(vectors)
+                norms = np.linalg.norm(stacked, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                codes, scales = embedding_quant.quantize(stacked / norms, self.precision)
+                self._matrix[:len(names)] = codes
+                if scales is not None:
+                    self._scales[:len(names)] = scales
+            self._usernames = names
+            self._rows = {name: i for i, name in enumerate(names)}
+            self._size = len(names)
+            # Index ANN được train lại lười ở lần tìm kiếm đầu tiên
+            if self._ann is not None:
+                self._ann = IVFIndex(self.embedding_dim, nlist=self._ann.nlist, nprobe=self._ann.nprobe)
+        return self._size
+
+    def build_from_matrix(self, usernames: List[str], matrix: np.ndarray) -> int:
+        """
+        Dựng gallery từ ma trận có sẵn (vd: đọc từ EmbeddingStore)
+
+        Args:
+            usernames: Danh sách username theo thứ tự hàng
+            matrix: (N, D) embedding
+
+        Returns:
+            int: Số tài khoản đã nạp
+        """
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(len(usernames), self.embedding_dim)
+        return self.build(dict(zip(usernames, matrix)))
+
+    def clear(self):
+        """Xóa toàn bộ gallery"""
+        self.build({})
+
+    def wipe(self):
+        """Ghi đè 0 toàn bộ ma trận (kể cả vùng allocator) rồi xóa gallery"""
+        with self._lock:
+            self._matrix[:] = 0
+            self.clear()
+            if self._allocator is not None:
+                self._allocator.wipe()
+
+    # ========== TÌM KIẾM ==========
+
+    def search(self, probe: np.ndarray, top_k: int = 1,
+               threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        Tìm top-k tài khoản giống probe nhất
+
+        Args:
+            probe: Embedding (D,) của khuôn mặt hiện tại
+            top_k: Số kết quả trả về
+            threshold: Chỉ trả về kết quả có similarity >= threshold
+
+        Returns:
+            List[(username, similarity)] sắp xếp giảm dần
+        """
+        query = self._normalize(probe)
+        if query is None:
+            return []
+
+        with self._lock:
+            if self._size == 0:
+                return []
+
+            if self._use_ann():
+                rows, scores = self._ann.search(
+                    query, self._matrix[:self._size], self._scales[:self._size], self.precision,
+                    top_k, threshold=threshold
+                )
+            else:
+                rows, scores = face_scoring.search(
+                    query, self._matrix[:self._size], top_k, threshold,
+                    scales=self._scales[:self._size], precision=self.precision
+                )
+            return [(self._usernames[i], float(score)) for i, score in zip(rows, scores)]
+
+    def best_match(self, probe: np.ndarray) -> Tuple[Optional[str], float]:
+        """
+        Tài khoản giống nhất
+
+        Returns:
+            (username, similarity) hoặc (None, 0.0) nếu gallery rỗng
+        """
+        results = self.search(probe, top_k=1)
+        if not results:
+            return None, 0.0
+        return results[0]
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _use_ann(self) -> bool:
+        """Dùng IVF khi được bật và gallery đủ lớn; train (lại) khi cần"""
+        if self._ann is None or self._size < self.ann_min_size:
+            return False
+        if self._ann.needs_retrain():
+            self._ann.rebuild(self._matrix[:self._size], self._scales[:self._size], self.precision)
+        return True
+
+    def _ensure_capacity(self, needed: int):
+        """Nhân đôi dung lượng ma trận khi cần (amortized O(1) khi thêm)"""
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        grown = self._zeros((new_capacity, self.embedding_dim))
+        grown[:self._size] = self._matrix[:self._size]
+        self._replace_matrix(grown)
+        scales = np.ones(new_capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        self._scales = scales
+
+    def _zeros(self, shape: Tuple[int, int]) -> np.ndarray:
+        if self._allocator is not None:
+            return self._allocator.zeros(shape, self._dtype)
+        return np.zeros(shape, dtype=self._dtype)
+
+    def _replace_matrix(self, matrix: np.ndarray):
+        """Đổi ma trận, trả vùng nhớ cũ cho allocator (được ghi đè 0)"""
+        old = getattr(self, '_matrix', None)
+        self._matrix = matrix
+        if old is not None and self._allocator is not None:
+            self._allocator.release(old)
+
+    def _normalize(self, embedding: np.ndarray) -> Optional[np.ndarray]:
+        """Chuẩn hóa L2 về float32, None nếu sai kích thước / vector 0"""
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.embedding_dim:
+            return None
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
@@ -0,0 +1,222 @@
+"""
+Face Data Migrations
+====================
+Chuyển face_data cũ trong accounts.json sang định dạng lưu trữ mới.
+
+- crop-storage  : ảnh crop lưu dạng pixel BGR thô → nén PNG / WebP / JPEG
+                  trước khi mã hóa (face_data['image_format'])
+- key-hierarchy : mỗi trường 1 salt + 1 lần PBKDF2 → 1 DEK ngẫu nhiên mỗi user,
+                  bọc bằng khóa derive từ password (face_data['key_version'] = 2)
+
+Mỗi lệnh sao lưu accounts.json thành accounts.json.bak, ghi kết quả ra
+file tạm rồi os.replace; --dry-run chỉ báo cáo, không ghi file.
+
+Chạy:
+    python -m src.BUS.ai_core.login_user.face_migrations crop-storage [--format webp] [--quality 90] [--dry-run]
+    python -m src.BUS.ai_core.login_user.face_migrations key-hierarchy [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.BUS.ai_core.model_config import get_config_section
+
+ACCOUNTS_FILE = Path("src/GUI/data/accounts.json")
+
+
+# ========== HELPER FUNCTIONS ==========
+
+def _load(accounts_file: Path) -> Dict:
+    with open(accounts_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save(accounts_file: Path, data: Dict):
+    """Sao lưu file cũ rồi ghi file mới nguyên tử"""
+    shutil.copy2(accounts_file, accounts_file.with_suffix(accounts_file.suffix + '.bak'))
+    tmp_path = accounts_file.with_suffix(accounts_file.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, accounts_file)
+
+
+# ========== MIGRATION: ẢNH CROP NÉN ==========
+
+def migrate_crop_storage(accounts_file: Path = ACCOUNTS_FILE, image_format: Optional[str] = None,
+                         quality: Optional[int] = None, dry_run: bool = False) -> Dict:
+    """
+    Nén lại ảnh crop của các face_data đang lưu pixel thô
+
+    Args:
+        accounts_file: accounts.json
+        image_format: 'png' | 'webp' | 'jpeg' (None = face_recognition.crop_storage.format)
+        quality: Chất lượng nén (None = face_recognition.crop_storage.quality)
+        dry_run: Chỉ tính toán, không ghi file
+
+    Returns:
+        Dict: {'migrated', 'skipped', 'failed', 'bytes_before', 'bytes_after', 'failures'}
+    """
+    from src.BUS.ai_core.login_user.Arc_face import FaceEncryption, LazyFaceImage
+
+    config = get_config_section("face_recognition", "crop_storage")
+    image_format = image_format or config.get('format', 'webp')
+    quality = int(quality if quality is not None else config.get('quality', 90))
+
+    accounts_file = Path(accounts_file)
+    data = _load(accounts_file)
+    encryption = FaceEncryption()
+    report = {'migrated': 0, 'skipped': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0, 'failures': []}
+
+    for user in data.get('user_accounts', []):
+        face_data = user.get('face_data')
+        if not face_data or 'encrypted_image' not in face_data:
+            continue
+        if face_data.get('image_format', 'raw') != 'raw':
+            report['skipped'] += 1
+            continue
+
+        password = user.get('password', '')
+        data_key = encryption.unwrap_data_key(face_data, password)
+        raw = encryption.decrypt_field(face_data, 'image', password, data_key)
+        if raw is None:
+            report['failed'] += 1
+            report['failures'].append(user.get('username', '?'))
+            continue
+
+        image = LazyFaceImage(raw, 'raw', face_data.get('shape')).decode()
+        encoded, encoded_format = encryption.encode_image(image, image_format, quality)
+
+        # Giữ nguyên cách mã hóa của entry: DEK (key_version 2) hoặc salt riêng (cũ)
+        if data_key is not None:
+            encrypted = encryption.encrypt_with_key(encoded, data_key)
+        else:
+            encrypted = encryption.encrypt_bytes(encoded, password)
+        if encrypted is None:
+            report['failed'] += 1
+            report['failures'].append(user.get('username', '?'))
+            continue
+
+        report['bytes_before'] += len(face_data['encrypted_image'])
+        report['bytes_after'] += len(encrypted['encrypted_data'])
+        report['migrated'] += 1
+        face_data.update({
+            'encrypted_image': encrypted['encrypted_data'],
+            'iv': encrypted['iv'],
+            'image_format': encoded_format
+        })
+        if 'salt' in encrypted:
+            face_data['salt'] = encrypted['salt']
+
+    if report['migrated'] and not dry_run:
+        _save(accounts_file, data)
+    return report
+
+
+# ========== MIGRATION: KEY HIERARCHY ==========
+
+def migrate_key_hierarchy(accounts_file: Path = ACCOUNTS_FILE, dry_run: bool = False) -> Dict:
+    """
+    Chuyển face_data định dạng cũ (mỗi trường 1 salt + PBKDF2 riêng) sang
+    1 DEK mỗi user bọc bằng khóa derive từ password
+
+    Args:
+        accounts_file: accounts.json
+        dry_run: Chỉ kiểm tra giải mã được, không ghi file
+
+    Returns:
+        Dict: {'migrated', 'skipped', 'failed', 'kdf_before', 'kdf_after', 'failures'}
+              kdf_*: số lần PBKDF2 cần để mở toàn bộ face_data trước / sau
+    """
+    from src.BUS.ai_core.login_user.Arc_face import FaceEncryption
+
+    accounts_file = Path(accounts_file)
+    data = _load(accounts_file)
+    encryption = FaceEncryption()
+    report = {'migrated': 0, 'skipped': 0, 'failed': 0, 'kdf_before': 0, 'kdf_after': 0, 'failures': []}
+
+    for user in data.get('user_accounts', []):
+        face_data = user.get('face_data')
+        if not face_data:
+            continue
+        if int(face_data.get('key_version', 1)) >= FaceEncryption.KEY_VERSION:
+            report['skipped'] += 1
+            continue
+
+        password = user.get('password', '')
+        fields = {}
+        for field, (data_name, _, _) in FaceEncryption.FACE_FIELDS.items():
+            if data_name in face_data:
+                fields[field] = encryption.decrypt_field(face_data, field, password)
+        if not fields or any(value is None for value in fields.values()):
+            report['failed'] += 1
+            report['failures'].append(user.get('username', '?'))
+            continue
+
+        entry = encryption.encrypt_face_fields(fields, password)
+        for _, salt_name, _ in FaceEncryption.FACE_FIELDS.values():
+            face_data.pop(salt_name, None)
+        face_data.update(entry)
+
+        report['kdf_before'] += len(fields)
+        report['kdf_after'] += 1
+        report['migrated'] += 1
+
+    if report['migrated'] and not dry_run:
+        _save(accounts_file, data)
+    return report
+
+
+# ========== CLI ==========
+
+def _run_crop_storage(args):
+    report = migrate_crop_storage(Path(args.accounts), args.format, args.quality, args.dry_run)
+    saved = report['bytes_before'] - report['bytes_after']
+    ratio = report['bytes_after'] / report['bytes_before'] if report['bytes_before'] else 0.0
+
+    print(f"{'🔍 [DRY RUN]' if args.dry_run else '✅ [MIGRATE]'} crop-storage")
+    print(f"   ├─ Đã chuyển: {report['migrated']} | Bỏ qua (đã nén): {report['skipped']} | Lỗi: {report['failed']}")
+    print(f"   └─ Ảnh mã hóa: {report['bytes_before'] / 1024:.1f} KB → {report['bytes_after'] / 1024:.1f} KB "
+          f"(tiết kiệm {saved / 1024:.1f} KB, còn {ratio:.0%})")
+    for username in report['failures']:
+        print(f"   ❌ {username}: không giải mã / mã hóa lại được")
+
+
+def _run_key_hierarchy(args):
+    report = migrate_key_hierarchy(Path(args.accounts), args.dry_run)
+
+    print(f"{'🔍 [DRY RUN]' if args.dry_run else '✅ [MIGRATE]'} key-hierarchy")
+    print(f"   ├─ Đã chuyển: {report['migrated']} | Bỏ qua (đã dùng DEK): {report['skipped']} | Lỗi: {report['failed']}")
+    print(f"   └─ PBKDF2 để mở toàn bộ face_data: {report['kdf_before']} → {report['kdf_after']}")
+    for username in report['failures']:
+        print(f"   ❌ {username}: không giải mã được (sai mật khẩu / dữ liệu hỏng)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Migration face_data trong accounts.json")
+    parser.add_argument('--accounts', default=str(ACCOUNTS_FILE), help="Đường dẫn accounts.json")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    crop = commands.add_parser('crop-storage', help="Nén ảnh crop pixel thô trước khi mã hóa")
+    crop.add_argument('--format', choices=['png', 'webp', 'jpeg'], default=None)
+    crop.add_argument('--quality', type=int, default=None)
+    crop.add_argument('--dry-run', action='store_true')
+    crop.set_defaults(func=_run_crop_storage)
+
+    keys = commands.add_parser('key-hierarchy', help="Chuyển sang 1 DEK mỗi user (1 lần PBKDF2)")
+    keys.add_argument('--dry-run', action='store_true')
+    keys.set_defaults(func=_run_key_hierarchy)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Face Quality Scoring
+====================
+Chấm điểm chất lượng 1 khuôn mặt trong frame (không cần model phụ):
+
+- blur       : phương sai Laplacian trên crop xám 112x112
+- brightness : độ sáng trung bình, phạt khi quá tối / cháy sáng
+- size       : cạnh ngắn của bbox so với kích thước mục tiêu
+- pose       : yaw / roll / pitch ước lượng từ 5 landmark (nếu có)
+
+Mỗi tiêu chí ∈ [0, 1]; điểm tổng là trung bình nhân nên 1 tiêu chí
+kém sẽ kéo cả frame xuống. Cấu hình: face_recognition.quality.
+
+CaptureQualityGate là bản rẻ hơn chạy trên frame đã thu nhỏ của camera
+preview, quyết định frame có đáng gửi vào model hay không.
+Cấu hình: face_recognition.capture_gate.
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from src.BUS.ai_core.model_config import get_config_section
+
+
+class FaceQualityScorer:
+    """Chấm điểm chất lượng khuôn mặt cho đăng ký / auto-capture"""
+
+    DEFAULTS = {
+        'blur_reference': 120.0,     # Phương sai Laplacian coi là "đủ nét"
+        'target_face_size': 112,     # Cạnh ngắn bbox coi là "đủ lớn" (px)
+        'brightness_tolerance': 0.15,  # Lệch khỏi 0.5 trong khoảng này không bị phạt
+        'max_yaw': 0.45,             # |lệch mũi| / khoảng cách 2 mắt
+        'max_roll': 25.0,            # Độ nghiêng đường nối 2 mắt
+        'min_score': 0.35
+    }
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: Ghi đè DEFAULTS (None = đọc face_recognition.quality)
+        """
+        if config is None:
+            config = get_config_section("face_recognition", "quality")
+        self.config = {**self.DEFAULTS, **config}
+        self.min_score = float(self.config['min_score'])
+
+    # ========== CHẤM ĐIỂM ==========
+
+    def score(self, image: np.ndarray, bbox: List[int], kps: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """
+        Chấm điểm 1 khuôn mặt
+
+        Args:
+            image: Frame BGR
+            bbox: [x, y, w, h]
+            kps: 5 landmark (mắt trái, mắt phải, mũi, miệng trái, miệng phải) hoặc None
+
+        Returns:
+            Dict: {'blur', 'brightness', 'size', 'pose', 'score', 'blur_variance', 'mean_brightness'}
+        """
+        x, y, w, h = [int(v) for v in bbox]
+        x, y = max(x, 0), max(y, 0)
+        crop = image[y:y+h, x:x+w]
+        if crop.size == 0:
+            return {'blur': 0.0, 'brightness': 0.0, 'size': 0.0, 'pose': 0.0, 'score': 0.0,
+                    'blur_variance': 0.0, 'mean_brightness': 0.0}
+
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        gray = cv2.resize(gray, (112, 112))
+
+        blur_variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        mean_brightness = float(gray.mean()) / 255.0
+
+        blur = self._clip(blur_variance / self.config['blur_reference'])
+        brightness = self._clip(
+            1.0 - max(0.0, abs(mean_brightness - 0.5) - self.config['brightness_tolerance'])
+            / (0.5 - self.config['brightness_tolerance'])
+        )
+        size = self._clip(min(w, h) / self.config['target_face_size'])
+        pose = self.pose_score(kps) if kps is not None else 1.0
+
+        parts = np.array([blur, brightness, size, pose], dtype=np.float64)
+        total = float(np.prod(np.maximum(parts, 1e-6)) ** (1.0 / len(parts)))
+
+        return {
+            'blur': blur,
+            'brightness': brightness,
+            'size': size,
+            'pose': pose,
+            'score': total,
+            'blur_variance': blur_variance,
+            'mean_brightness': mean_brightness
+        }
+
+    def pose_score(self, kps: np.ndarray) -> float:
+        """Điểm tư thế từ 5 landmark: 1.0 = nhìn thẳng"""
+        kps = np.asarray(kps, dtype=np.float64).reshape(5, 2)
+        left_eye, right_eye, nose, left_mouth, right_mouth = kps
+
+        eye_vec = right_eye - left_eye
+        eye_dist = float(np.linalg.norm(eye_vec))
+        if eye_dist < 1e-6:
+            return 0.0
+
+        eye_mid = (left_eye + right_eye) / 2.0
+        mouth_mid = (left_mouth + right_mouth) / 2.0
+
+        roll = abs(np.degrees(np.arctan2(eye_vec[1], eye_vec[0])))
+        yaw = abs(nose[0] - eye_mid[0]) / eye_dist
+
+        # Mũi nằm khoảng giữa mắt và miệng khi nhìn thẳng
+        face_height = mouth_mid[1] - eye_mid[1]
+        pitch = abs((nose[1] - eye_mid[1]) / face_height - 0.5) if face_height > 1e-6 else 1.0
+
+        return (self._clip(1.0 - yaw / self.config['max_yaw'])
+                * self._clip(1.0 - roll / self.config['max_roll'])
+                * self._clip(1.0 - pitch / 0.35))
+
+    def is_acceptable(self, quality: Dict[str, float]) -> bool:
+        """Frame có đạt ngưỡng min_score không"""
+        return quality.get('score', 0.0) >= self.min_score
+
+    # ========== HELPER FUNCTIONS ==========
+
+    @staticmethod
+    def _clip(value: float) -> float:
+        return float(min(max(value, 0.0), 1.0))
+
+
+class CaptureQualityGate:
+    """Cổng chất lượng trước khi auto-capture (chạy trên frame 320x240)"""
+
+    DEFAULTS = {
+        'enabled': True,
+        'min_blur_variance': 60.0,     # Laplacian trên vùng mặt (frame thu nhỏ)
+        'min_brightness': 0.25,        # Độ sáng trung bình vùng mặt (0-1)
+        'max_brightness': 0.85,
+        'max_clipped_fraction': 0.25,  # Tỉ lệ pixel cháy sáng / đen kịt trong vùng mặt
+        'min_backlight_ratio': 0.55,   # Sáng vùng mặt / sáng cả frame (ngược sáng)
+        'min_face_ratio': 0.22,        # Chiều cao mặt / chiều cao frame
+        'max_center_offset': 0.8       # Khoảng cách tâm mặt tới tâm oval (chuẩn hóa theo trục oval)
+    }
+
+    # Thông báo hướng dẫn theo lý do bị loại (không dấu - font Hershey của cv2.putText)
+    HINTS = {
+        'blur': "Giu yen dau",
+        'dark': "Thieu sang",
+        'bright': "Qua sang",
+        'clipped': "Anh bi chay sang",
+        'backlight': "Nguoc sang - quay mat ve phia den",
+        'small': "Lai gan camera hon",
+        'offcenter': "Dua mat vao giua khung"
+    }
+
+    def __init__(self, config: Optional[Dict] = None):
+        """
+        Args:
+            config: Ghi đè DEFAULTS (None = đọc face_recognition.capture_gate)
+        """
+        if config is None:
+            config = get_config_section("face_recognition", "capture_gate")
+        self.config = {**self.DEFAULTS, **config}
+        self.enabled = bool(self.config['enabled'])
+
+    def measure(self, frame: np.ndarray, bbox: Tuple[int, int, int, int],
+                oval_axes: Optional[Tuple[float, float]] = None) -> Dict[str, float]:
+        """
+        Đo các chỉ số rẻ trên frame thu nhỏ
+
+        Args:
+            frame: Frame BGR (đã thu nhỏ)
+            bbox: (x, y, w, h) khuôn mặt trong frame
+            oval_axes: Bán trục oval (px) - mặc định (0.35w, 0.50h) như overlay
+
+        Returns:
+            Dict: {'blur_variance', 'brightness', 'clipped_fraction',
+                   'backlight_ratio', 'face_ratio', 'center_offset'}
+        """
+        h, w = frame.shape[:2]
+        x, y, fw, fh = [int(v) for v in bbox]
+        x, y = max(x, 0), max(y, 0)
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        face = gray[y:y+fh, x:x+fw]
+        if face.size == 0:
+            return {'blur_variance': 0.0, 'brightness': 0.0, 'clipped_fraction': 1.0,
+                    'backlight_ratio': 0.0, 'face_ratio': 0.0, 'center_offset': 9.9}
+
+        face_mean = float(face.mean())
+        frame_mean = float(gray.mean()) or 1.0
+        clipped = float(np.count_nonzero((face <= 10) | (face >= 245))) / face.size
+
+        axes = oval_axes or (w * 0.35, h * 0.50)
+        dx = (x + fw / 2.0 - w / 2.0) / axes[0]
+        dy = (y + fh / 2.0 - h / 2.0) / axes[1]
+
+        return {
+            'blur_variance': float(cv2.Laplacian(face, cv2.CV_64F).var()),
+            'brightness': face_mean / 255.0,
+            'clipped_fraction': clipped,
+            'backlight_ratio': face_mean / frame_mean,
+            'face_ratio': fh / float(h),
+            'center_offset': float(np.hypot(dx, dy))
+        }
+
+    def check(self, frame: np.ndarray, bbox: Tuple[int, int, int, int],
+              oval_axes: Optional[Tuple[float, float]] = None) -> Tuple[bool, Optional[str], Dict[str, float]]:
+        """
+        Quyết định frame có đủ tốt để chạy model
+
+        Returns:
+            (ok, lý do bị loại hoặc None, chỉ số đo được)
+        """
+        metrics = self.measure(frame, bbox, oval_axes)
+        if not self.enabled:
+            return True, None, metrics
+
+        c = self.config
+        if metrics['face_ratio'] < c['min_face_ratio']:
+            return False, 'small', metrics
+        if metrics['center_offset'] > c['max_center_offset']:
+            return False, 'offcenter', metrics
+        if metrics['brightness'] < c['min_brightness']:
+            return False, 'dark', metrics
+        if metrics['brightness'] > c['max_brightness']:
+            return False, 'bright', metrics
+        if metrics['clipped_fraction'] > c['max_clipped_fraction']:
+            return False, 'clipped', metrics
+        if metrics['backlight_ratio'] < c['min_backlight_ratio']:
+            return False, 'backlight', metrics
+        if metrics['blur_variance'] < c['min_blur_variance']:
+            return False, 'blur', metrics
+        return True, None, metrics
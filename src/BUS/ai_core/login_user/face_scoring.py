@@ -0,0 +1,118 @@
+"""
+Face Scoring Kernels
+====================
+Chấm điểm cosine trên embedding ĐÃ chuẩn hóa L2 (cosine = tích vô hướng):
+
+- one_vs_many  : 1 probe (D,) với ma trận (N, D)        → (N,)
+- many_vs_many : P probe (P, D) với ma trận (N, D)      → (P, N)
+- search / search_many: chấm điểm + lọc ngưỡng + top-k trong 1 lần gọi
+
+Không kiểm tra / copy đầu vào như sklearn.cosine_similarity: float32 contiguous
+được dùng thẳng cho BLAS. Ma trận nén float16 / int8 đi qua embedding_quant.
+"""
+
+import numpy as np
+from typing import List, Optional, Tuple
+
+from src.BUS.ai_core.login_user import embedding_quant
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """Chuẩn hóa L2 theo hàng (hoặc 1 vector), vector 0 giữ nguyên"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# ========== CHẤM ĐIỂM ==========
+
+def one_vs_many(probe: np.ndarray, matrix: np.ndarray, scales: Optional[np.ndarray] = None,
+                precision: str = 'float32') -> np.ndarray:
+    """
+    Cosine giữa 1 probe và N vector
+
+    Args:
+        probe: (D,) float32 đã chuẩn hóa
+        matrix: (N, D) đã chuẩn hóa (float32, hoặc mã hóa theo precision)
+        scales: Scale mỗi hàng khi precision = 'int8'
+        precision: 'float32' | 'float16' | 'int8'
+
+    Returns:
+        np.ndarray (N,) float32
+    """
+    if precision != 'float32':
+        return embedding_quant.score(matrix, scales, probe, precision)
+    return matrix @ np.asarray(probe, dtype=np.float32).reshape(-1)
+
+
+def many_vs_many(probes: np.ndarray, matrix: np.ndarray, scales: Optional[np.ndarray] = None,
+                 precision: str = 'float32') -> np.ndarray:
+    """
+    Cosine giữa P probe và N vector (1 phép GEMM với float32)
+
+    Returns:
+        np.ndarray (P, N) float32
+    """
+    probes = np.asarray(probes, dtype=np.float32)
+    if probes.ndim == 1:
+        probes = probes.reshape(1, -1)
+    if precision != 'float32':
+        return np.stack([embedding_quant.score(matrix, scales, p, precision) for p in probes])
+    return probes @ matrix.T
+
+
+# ========== TOP-K + NGƯỠNG ==========
+
+def top_k(scores: np.ndarray, k: int, threshold: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Chọn top-k trên vector điểm (argpartition + sort k phần tử)
+
+    Args:
+        scores: (N,) điểm
+        k: Số kết quả tối đa
+        threshold: Bỏ các điểm < threshold (None = không lọc)
+
+    Returns:
+        (indices, scores) sắp xếp giảm dần
+    """
+    n = scores.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    candidates = np.arange(n)
+    if threshold is not None:
+        candidates = np.flatnonzero(scores >= threshold)
+        if candidates.size == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+
+    k = min(max(int(k), 1), candidates.size)
+    subset = scores[candidates]
+    if k < candidates.size:
+        part = np.argpartition(-subset, k - 1)[:k]
+    else:
+        part = np.arange(candidates.size)
+    part = part[np.argsort(-subset[part], kind='stable')]
+    return candidates[part], subset[part]
+
+
+def search(probe: np.ndarray, matrix: np.ndarray, k: int = 1, threshold: Optional[float] = None,
+           scales: Optional[np.ndarray] = None, precision: str = 'float32') -> Tuple[np.ndarray, np.ndarray]:
+    """1 probe → (indices, scores) top-k vượt ngưỡng"""
+    return top_k(one_vs_many(probe, matrix, scales, precision), k, threshold)
+
+
+def search_many(probes: np.ndarray, matrix: np.ndarray, k: int = 1, threshold: Optional[float] = None,
+                scales: Optional[np.ndarray] = None,
+                precision: str = 'float32') -> List[Tuple[np.ndarray, np.ndarray]]:
+    """P probe → danh sách (indices, scores) top-k vượt ngưỡng cho từng probe"""
+    scores = many_vs_many(probes, matrix, scales, precision)
+    return [top_k(row, k, threshold) for row in scores]
+
+
+def best_score(probe: np.ndarray, matrix: np.ndarray, scales: Optional[np.ndarray] = None,
+               precision: str = 'float32') -> float:
+    """Điểm cao nhất giữa probe và các vector (vd: centroid + template của 1 user)"""
+    if matrix.shape[0] == 0:
+        return 0.0
+    return float(np.max(one_vs_many(probe, matrix, scales, precision)))
@@ -0,0 +1,283 @@
+"""
+Streaming Face Identification
+=============================
+Đăng nhập khuôn mặt theo kiểu track-then-identify:
+
+- FaceTracker          : giữ bbox khuôn mặt qua các frame (ghép theo IoU, làm mượt)
+- StreamingIdentifier  : worker nền nhận frame tốt nhất của mỗi track, trích xuất
+                         embedding + tìm trong gallery ngay khi có, dừng ở lần
+                         khớp chắc chắn đầu tiên
+
+Camera preview chỉ gọi offer() (không chặn) nên vẫn chạy đủ FPS trong khi
+model xử lý. Hàng đợi chỉ có 1 ô: frame mới tốt hơn thay frame cũ chưa xử lý.
+Cấu hình: face_recognition.streaming.
+"""
+
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+
+from src.BUS.ai_core.model_config import get_config_section
+
+
+Box = Tuple[int, int, int, int]
+
+
+def box_iou(a: Box, b: Box) -> float:
+    """IoU giữa 2 bbox (x, y, w, h)"""
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return float(inter) / union if union > 0 else 0.0
+
+
+# ============================================================================
+# TRACKER
+# ============================================================================
+
+class FaceTrack:
+    """1 track khuôn mặt: id, bbox đã làm mượt, số lần thấy / mất"""
+
+    def __init__(self, track_id: int, box: Box):
+        self.track_id = track_id
+        self.box = box
+        self.hits = 1
+        self.missed = 0
+        self.started_at = time.time()
+
+
+class FaceTracker:
+    """Tracker IoU nhẹ cho khuôn mặt chính trong khung oval"""
+
+    def __init__(self, iou_threshold: float = 0.3, max_missed: int = 3, smoothing: float = 0.5):
+        """
+        Args:
+            iou_threshold: IoU tối thiểu để coi detection mới là cùng 1 người
+            max_missed: Số lần detect liên tiếp không thấy mặt trước khi bỏ track
+            smoothing: Trọng số bbox cũ khi làm mượt (0 = dùng luôn bbox mới)
+        """
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.track: Optional[FaceTrack] = None
+        self._next_id = 1
+
+    def update(self, box: Optional[Box]) -> Optional[FaceTrack]:
+        """
+        Cập nhật tracker với kết quả detect mới nhất
+
+        Args:
+            box: (x, y, w, h) hoặc None nếu frame không có mặt
+
+        Returns:
+            Track hiện tại (None nếu đã mất mặt)
+        """
+        if box is None:
+            if self.track is not None:
+                self.track.missed += 1
+                if self.track.missed > self.max_missed:
+                    self.track = None
+            return None
+
+        if self.track is not None and box_iou(self.track.box, box) >= self.iou_threshold:
+            a = self.smoothing
+            self.track.box = tuple(int(round(a * o + (1 - a) * n)) for o, n in zip(self.track.box, box))
+            self.track.hits += 1
+            self.track.missed = 0
+        else:
+            self.track = FaceTrack(self._next_id, tuple(int(v) for v in box))
+            self._next_id += 1
+        return self.track
+
+    def reset(self):
+        self.track = None
+
+
+# ============================================================================
+# STREAMING IDENTIFIER
+# ============================================================================
+
+class StreamingIdentifier:
+    """Worker nhận diện bất đồng bộ trên các frame tốt nhất của track"""
+
+    DEFAULTS = {
+        'enabled': True,
+        'detection_interval': 0.15,   # Chu kỳ detect Haar trong preview khi streaming (giây)
+        'max_attempts_per_track': 5,  # Số lần chạy model tối đa cho 1 track
+        'min_quality_gain': 0.05,     # Frame sau phải tốt hơn frame đã gửi ít nhất chừng này
+        'resubmit_interval': 0.4,     # Hoặc đã qua chừng này giây kể từ lần gửi trước
+        'confirmations': 1,           # Số lần khớp cùng 1 user liên tiếp để chấp nhận
+        'tracker_iou': 0.3,
+        'tracker_max_missed': 3
+    }
+
+    def __init__(self, model, on_match: Callable[[str, float, np.ndarray], None],
+                 on_attempt: Optional[Callable[[int, Optional[str], float], None]] = None,
+                 on_exhausted: Optional[Callable[[int], None]] = None,
+                 threshold: Optional[float] = None, config: Optional[Dict] = None):
+        """
+        Args:
+            model: ArcFaceModel (đã nạp gallery)
+            on_match: Gọi 1 lần khi khớp - (username, similarity, frame)
+            on_attempt: Gọi sau mỗi lần nhận diện - (track_id, username hoặc None, similarity)
+            on_exhausted: Gọi khi 1 track đã hết số lần thử mà không khớp - (track_id)
+            threshold: Ngưỡng cosine (None = model.cosine_threshold)
+            config: Ghi đè DEFAULTS (None = đọc face_recognition.streaming)
+        """
+        if config is None:
+            config = get_config_section("face_recognition", "streaming")
+        self.config = {**self.DEFAULTS, **config}
+        self.model = model
+        self.threshold = threshold if threshold is not None else model.cosine_threshold
+        self.on_match = on_match
+        self.on_attempt = on_attempt
+        self.on_exhausted = on_exhausted
+
+        self.detection_interval = float(self.config['detection_interval'])
+        self.max_attempts = max(int(self.config['max_attempts_per_track']), 1)
+        self.confirmations = max(int(self.config['confirmations']), 1)
+
+        self.matched = False
+        self.result: Optional[Tuple[str, float]] = None
+        self.attempts = 0
+
+        self._cond = threading.Condition()
+        self._pending: Optional[Tuple[np.ndarray, int, float]] = None
+        self._running = False
+        self._thread = None
+
+        # Trạng thái theo track hiện tại
+        self._track_id = None
+        self._track_attempts = 0
+        self._submitted_quality = -1.0
+        self._submitted_at = 0.0
+        self._streak: Tuple[Optional[str], int] = (None, 0)
+
+    def make_tracker(self) -> FaceTracker:
+        """Tracker theo cấu hình streaming"""
+        return FaceTracker(float(self.config['tracker_iou']), int(self.config['tracker_max_missed']))
+
+    # ========== VÒNG ĐỜI ==========
+
+    def start(self):
+        """Khởi động worker (gọi lại không sao)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._worker, daemon=True, name="face-stream")
+        self._thread.start()
+
+    def stop(self):
+        """Dừng worker, bỏ frame đang chờ"""
+        with self._cond:
+            self._running = False
+            self._pending = None
+            self._cond.notify_all()
+        if self._thread and threading.current_thread() != self._thread:
+            self._thread.join(timeout=2)
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    # ========== NHẬN FRAME TỪ PREVIEW ==========
+
+    def offer(self, frame: np.ndarray, track_id: int, quality: float) -> bool:
+        """
+        Đề xuất 1 frame của track (không chặn)
+
+        Frame chỉ được nhận khi tốt hơn rõ rệt frame đã gửi của track,
+        hoặc đã đủ resubmit_interval kể từ lần gửi trước.
+
+        Args:
+            frame: Frame BGR độ phân giải gốc
+            track_id: Id track của FaceTracker
+            quality: Điểm chất lượng frame (càng cao càng tốt)
+
+        Returns:
+            True nếu frame được đưa vào hàng đợi
+        """
+        now = time.time()
+        with self._cond:
+            if not self._running or self.matched:
+                return False
+
+            if track_id != self._track_id:
+                self._track_id = track_id
+                self._track_attempts = 0
+                self._submitted_quality = -1.0
+                self._submitted_at = 0.0
+                self._streak = (None, 0)
+
+            if self._track_attempts >= self.max_attempts:
+                return False
+
+            pending = self._pending
+            if pending is not None and pending[1] == track_id:
+                # Ô chờ còn frame chưa xử lý: chỉ thay nếu frame mới tốt hơn
+                if quality <= pending[2]:
+                    return False
+            else:
+                better = quality >= self._submitted_quality + self.config['min_quality_gain']
+                stale = now - self._submitted_at >= self.config['resubmit_interval']
+                if not (better or stale):
+                    return False
+
+            self._pending = (frame, track_id, quality)
+            self._cond.notify()
+            return True
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, track_id, quality = self._pending
+                self._pending = None
+                self._track_attempts += 1
+                self._submitted_quality = max(self._submitted_quality, quality)
+                self._submitted_at = time.time()
+
+            try:
+                ranking = self.model.identify(frame, top_k=1)
+            except Exception as e:
+                print(f"⚠️ [STREAM] Nhận diện lỗi: {e}")
+                ranking = []
+
+            username, similarity = ranking[0] if ranking else (None, 0.0)
+            self.attempts += 1
+            if self.on_attempt:
+                self.on_attempt(track_id, username, similarity)
+
+            if self._accept(track_id, username, similarity):
+                with self._cond:
+                    self.matched = True
+                    self.result = (username, similarity)
+                    self._running = False
+                self.on_match(username, similarity, frame)
+                return
+
+            if self.on_exhausted and self._track_attempts >= self.max_attempts and track_id == self._track_id:
+                self.on_exhausted(track_id)
+
+    def _accept(self, track_id: int, username: Optional[str], similarity: float) -> bool:
+        """Đếm số lần khớp liên tiếp cùng user trong track"""
+        with self._cond:
+            if track_id != self._track_id:
+                return False
+            if username is None or similarity < self.threshold:
+                self._streak = (None, 0)
+                return False
+            last, count = self._streak
+            count = count + 1 if last == username else 1
+            self._streak = (username, count)
+            return count >= self.confirmations
@@ -0,0 +1,155 @@
+"""
+Derived Key Cache
+=================
+Cache khóa AES đã derive bằng PBKDF2 (100k vòng) cho FaceEncryption.
+
+- Key cache: (salt, HMAC(password)) → khóa 32 byte
+- LRU eviction + TTL cấu hình trong model_config.json
+- Thread-safe, có bộ đếm hit/miss
+- wipe()/invalidate_password() ghi đè 0 lên khóa khi đăng xuất
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+from src.BUS.ai_core.model_config import get_config_section
+
+
+class DerivedKeyCache:
+    """Cache khóa đã derive, giới hạn kích thước (LRU) và thời gian sống (TTL)"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 900.0):
+        """
+        Args:
+            max_entries: Số khóa tối đa giữ trong bộ nhớ
+            ttl_seconds: Thời gian sống của mỗi khóa (<= 0: không hết hạn)
+        """
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl_seconds = float(ttl_seconds)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[bytes, bytes], Tuple[bytearray, float]]" = OrderedDict()
+        # Pepper ngẫu nhiên theo tiến trình - digest trong cache không dùng để dò mật khẩu được
+        self._pepper = os.urandom(32)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_derive(self, password: str, salt: bytes, derive: Callable[[], bytes]) -> bytes:
+        """
+        Lấy khóa từ cache, derive nếu chưa có / đã hết hạn
+
+        Args:
+            password: Mật khẩu user
+            salt: Salt của bản mã
+            derive: Hàm derive khóa thật (PBKDF2), chỉ gọi khi miss
+
+        Returns:
+            bytes: Bản sao khóa AES (an toàn khi cache bị wipe giữa chừng)
+        """
+        cache_key = (bytes(salt), self._digest(password))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                key, created_at = entry
+                if self.ttl_seconds <= 0 or now - created_at < self.ttl_seconds:
+                    self._entries.move_to_end(cache_key)
+                    self.hits += 1
+                    return bytes(key)
+                self._drop(cache_key)
+                self.expirations += 1
+            self.misses += 1
+
+        # Derive ngoài lock để không chặn các luồng khác trong ~vài chục ms
+        key = bytearray(derive())
+
+        with self._lock:
+            if cache_key in self._entries:
+                self._drop(cache_key)
+            self._entries[cache_key] = (key, now)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+        return bytes(key)
+
+    def invalidate_password(self, password: str) -> int:
+        """
+        Xóa mọi khóa derive từ một mật khẩu (đổi mật khẩu / đăng xuất user)
+
+        Returns:
+            int: Số khóa đã xóa
+        """
+        digest = self._digest(password)
+        with self._lock:
+            targets = [k for k in self._entries if k[1] == digest]
+            for cache_key in targets:
+                self._drop(cache_key)
+        return len(targets)
+
+    def wipe(self):
+        """Ghi đè 0 và xóa toàn bộ khóa (gọi khi đăng xuất)"""
+        with self._lock:
+            for cache_key in list(self._entries):
+                self._drop(cache_key)
+
+    def stats(self) -> Dict:
+        """Thống kê cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _digest(self, password: str) -> bytes:
+        return hmac.new(self._pepper, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def _drop(self, cache_key: Tuple[bytes, bytes]):
+        """Xóa 1 entry và ghi đè 0 lên khóa (gọi khi đang giữ lock)"""
+        key, _ = self._entries.pop(cache_key)
+        for i in range(len(key)):
+            key[i] = 0
+
+
+# Singleton dùng chung cho toàn ứng dụng
+_key_cache_instance = None
+_key_cache_lock = threading.Lock()
+
+
+def get_key_cache() -> DerivedKeyCache:
+    """Lấy singleton DerivedKeyCache (cấu hình: face_recognition.key_cache)"""
+    global _key_cache_instance
+    with _key_cache_lock:
+        if _key_cache_instance is None:
+            config = get_config_section("face_recognition", "key_cache")
+            _key_cache_instance = DerivedKeyCache(
+                max_entries=config.get('max_entries', 256),
+                ttl_seconds=config.get('ttl_seconds', 900)
+            )
+    return _key_cache_instance
+
+
+def wipe_key_cache():
+    """Xóa sạch khóa đã cache (đăng xuất) - không tạo cache nếu chưa dùng"""
+    if _key_cache_instance is not None:
+        _key_cache_instance.wipe()
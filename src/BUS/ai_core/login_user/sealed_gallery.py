@@ -0,0 +1,309 @@
+"""
+Sealed Face Gallery
+===================
+Chế độ gallery niêm phong bằng khóa dịch vụ (face_recognition.sealed_gallery):
+
+- Khóa dịch vụ 32 byte của thiết bị: biến môi trường FACE_SERVICE_KEY (Base64)
+  hoặc file khóa (bảo vệ bằng Windows DPAPI nếu có pywin32)
+- face_gallery.sealed: toàn bộ username + ma trận embedding mã hóa AES-256-GCM
+  (có tag chống sửa file) → face login không cần mật khẩu từng tài xế
+- Giải mã 1 lần khi khởi động (warm-up) thẳng vào SecureBuffer: vùng nhớ
+  được mlock / VirtualLock (không bị swap) và ghi đè 0 khi wipe()
+
+Gallery trong RAM cấp phát qua SecureArena nên ma trận dùng để nhận diện cũng
+nằm trong vùng nhớ khóa; mỗi lần đăng nhập chỉ còn 1 phép nhân ma trận,
+không còn PBKDF2 / AES.
+"""
+
+import base64
+import ctypes
+import ctypes.util
+import json
+import os
+import struct
+import threading
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from Crypto.Cipher import AES
+from Crypto.Random import get_random_bytes
+
+# Windows DPAPI (tùy chọn) để bảo vệ file khóa dịch vụ
+try:
+    import win32crypt
+    DPAPI_AVAILABLE = True
+except ImportError:
+    DPAPI_AVAILABLE = False
+
+SEALED_MAGIC = b'FGS1'
+SERVICE_KEY_ENV = 'FACE_SERVICE_KEY'
+DEFAULT_SEALED_PATH = Path("src/GUI/data/face_gallery.sealed")
+DEFAULT_KEY_FILE = Path("src/GUI/data/face_service.key")
+
+
+# ============================================================================
+# VÙNG NHỚ KHÓA + XÓA ĐƯỢC
+# ============================================================================
+
+def _libc():
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    except Exception:
+        return None
+
+
+_LIBC = None if os.name == 'nt' else _libc()
+
+
+class SecureBuffer:
+    """bytearray được khóa trong RAM (best-effort) và ghi đè 0 khi wipe()"""
+
+    def __init__(self, size: int):
+        self.size = max(int(size), 1)
+        self.data = bytearray(self.size)
+        # Giữ 1 export ctypes → bytearray không thể bị resize / dời địa chỉ
+        self._view = (ctypes.c_char * self.size).from_buffer(self.data)
+        self.address = ctypes.addressof(self._view)
+        self.locked = self._lock()
+
+    def array(self, shape: Tuple[int, ...], dtype=np.float32, offset: int = 0) -> np.ndarray:
+        """View numpy (ghi được) lên vùng nhớ, không copy"""
+        count = int(np.prod(shape))
+        return np.frombuffer(self.data, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def wipe(self):
+        """Ghi đè 0 rồi mở khóa trang nhớ"""
+        if self.address:
+            ctypes.memset(self.address, 0, self.size)
+            if self.locked:
+                self._unlock()
+                self.locked = False
+
+    def _lock(self) -> bool:
+        try:
+            if os.name == 'nt':
+                return bool(ctypes.windll.kernel32.VirtualLock(ctypes.c_void_p(self.address),
+                                                               ctypes.c_size_t(self.size)))
+            return _LIBC is not None and _LIBC.mlock(ctypes.c_void_p(self.address),
+                                                     ctypes.c_size_t(self.size)) == 0
+        except Exception:
+            return False
+
+    def _unlock(self):
+        try:
+            if os.name == 'nt':
+                ctypes.windll.kernel32.VirtualUnlock(ctypes.c_void_p(self.address), ctypes.c_size_t(self.size))
+            elif _LIBC is not None:
+                _LIBC.munlock(ctypes.c_void_p(self.address), ctypes.c_size_t(self.size))
+        except Exception:
+            pass
+
+
+class SecureArena:
+    """Cấp phát mảng numpy trên SecureBuffer - dùng làm allocator cho FaceGallery"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    def zeros(self, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        buffer = SecureBuffer(int(np.prod(shape)) * dtype.itemsize)
+        array = buffer.array(shape, dtype)
+        with self._lock:
+            self._buffers[id(array)] = buffer
+        return array
+
+    def release(self, array: np.ndarray):
+        """Ghi đè 0 vùng nhớ của 1 mảng đã cấp phát (khi gallery cấp phát lại)"""
+        with self._lock:
+            buffer = self._buffers.pop(id(array), None)
+        if buffer is not None:
+            buffer.wipe()
+
+    def wipe(self):
+        """Ghi đè 0 toàn bộ vùng nhớ đã cấp phát"""
+        with self._lock:
+            buffers, self._buffers = list(self._buffers.values()), {}
+        for buffer in buffers:
+            buffer.wipe()
+
+    @property
+    def locked_bytes(self) -> int:
+        with self._lock:
+            return sum(b.size for b in self._buffers.values() if b.locked)
+
+
+# ============================================================================
+# KHÓA DỊCH VỤ
+# ============================================================================
+
+def load_service_key(key_file: Path = DEFAULT_KEY_FILE, create: bool = True) -> Optional[bytearray]:
+    """
+    Đọc khóa dịch vụ 32 byte
+
+    Thứ tự: biến môi trường FACE_SERVICE_KEY (Base64) → file khóa → tạo mới
+    (file khóa được bọc DPAPI theo tài khoản Windows nếu có pywin32).
+
+    Returns:
+        bytearray 32 byte (xóa được) hoặc None nếu không đọc / tạo được
+    """
+    try:
+        env_value = os.environ.get(SERVICE_KEY_ENV)
+        if env_value:
+            key = bytearray(base64.b64decode(env_value))
+            return key if len(key) == 32 else None
+
+        key_file = Path(key_file)
+        if key_file.exists():
+            with open(key_file, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            blob = base64.b64decode(stored['key'])
+            if stored.get('protection') == 'dpapi':
+                blob = win32crypt.CryptUnprotectData(blob, None, None, None, 0)[1]
+            key = bytearray(blob)
+            return key if len(key) == 32 else None
+
+        if not create:
+            return None
+
+        key = bytearray(get_random_bytes(32))
+        protection, blob = 'none', bytes(key)
+        if DPAPI_AVAILABLE:
+            protection = 'dpapi'
+            blob = win32crypt.CryptProtectData(bytes(key), "face-gallery-service-key", None, None, None, 0)
+
+        key_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(key_file), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'protection': protection, 'key': base64.b64encode(blob).decode('utf-8')}, f)
+        return key
+
+    except Exception as e:
+        print(f"❌ [SEALED] Không đọc được khóa dịch vụ: {e}")
+        return None
+
+
+# ============================================================================
+# FILE GALLERY NIÊM PHONG
+# ============================================================================
+
+class SealedGallery:
+    """
+    File gallery mã hóa AES-256-GCM bằng khóa dịch vụ
+
+    Định dạng: MAGIC | nonce (12) | tag (16) | ciphertext
+    Plaintext: độ dài header (4) | header JSON {usernames, dim} đệm tới bội 16 | ma trận float32
+    """
+
+    def __init__(self, path: Path = DEFAULT_SEALED_PATH, key_file: Path = DEFAULT_KEY_FILE):
+        self.path = Path(path)
+        self.key_file = Path(key_file)
+        self._key: Optional[bytearray] = None
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def mtime(self) -> Optional[float]:
+        return self.path.stat().st_mtime if self.path.exists() else None
+
+    def seal(self, usernames: List[str], matrix: np.ndarray) -> bool:
+        """
+        Ghi toàn bộ gallery (file tạm + os.replace)
+
+        Args:
+            usernames: Username theo thứ tự hàng
+            matrix: (N, D) embedding float32
+
+        Returns:
+            bool: Thành công hay không
+        """
+        key = self._service_key()
+        if key is None:
+            return False
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        header = json.dumps({'usernames': list(usernames), 'dim': int(matrix.shape[1]) if matrix.ndim == 2 else 512},
+                            ensure_ascii=False).encode('utf-8')
+        header_size = 4 + len(header)
+        padding = (-header_size) % 16
+
+        # Dựng plaintext trong SecureBuffer để bản rõ không nằm lại trên heap thường
+        plain = SecureBuffer(header_size + padding + matrix.nbytes)
+        try:
+            plain.data[:4] = struct.pack('<I', len(header))
+            plain.data[4:header_size] = header
+            if matrix.nbytes:
+                plain.array(matrix.shape, np.float32, header_size + padding)[:] = matrix
+
+            nonce = get_random_bytes(12)
+            cipher = AES.new(bytes(key), AES.MODE_GCM, nonce=nonce)
+            ciphertext, tag = cipher.encrypt_and_digest(plain.data)
+
+            with self._lock:
+                tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    f.write(SEALED_MAGIC + nonce + tag + ciphertext)
+                os.replace(tmp_path, self.path)
+            return True
+
+        except Exception as e:
+            print(f"❌ [SEALED] Không niêm phong được gallery: {e}")
+            return False
+        finally:
+            plain.wipe()
+
+    def unseal(self) -> Optional[Tuple[List[str], np.ndarray, SecureBuffer]]:
+        """
+        Giải mã gallery thẳng vào SecureBuffer
+
+        Returns:
+            (usernames, view ma trận (N, D), buffer - gọi buffer.wipe() khi dùng xong)
+            hoặc None nếu thiếu khóa / file bị sửa
+        """
+        key = self._service_key()
+        if key is None or not self.path.exists():
+            return None
+
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                blob = f.read()
+        if blob[:4] != SEALED_MAGIC:
+            return None
+
+        nonce, tag, ciphertext = blob[4:16], blob[16:32], blob[32:]
+        buffer = SecureBuffer(len(ciphertext))
+        try:
+            cipher = AES.new(bytes(key), AES.MODE_GCM, nonce=nonce)
+            cipher.decrypt(ciphertext, output=buffer.data)
+            cipher.verify(tag)
+
+            header_len = struct.unpack('<I', bytes(buffer.data[:4]))[0]
+            header = json.loads(bytes(buffer.data[4:4 + header_len]).decode('utf-8'))
+            offset = 4 + header_len + (-(4 + header_len)) % 16
+            usernames = header['usernames']
+            matrix = buffer.array((len(usernames), int(header['dim'])), np.float32, offset)
+            return usernames, matrix, buffer
+
+        except Exception as e:
+            buffer.wipe()
+            print(f"❌ [SEALED] Gallery niêm phong không hợp lệ (sai khóa / file bị sửa): {e}")
+            return None
+
+    def wipe_key(self):
+        """Ghi đè 0 khóa dịch vụ đang giữ trong RAM"""
+        with self._lock:
+            if self._key is not None:
+                self._key[:] = bytes(len(self._key))
+                self._key = None
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _service_key(self) -> Optional[bytearray]:
+        with self._lock:
+            if self._key is None:
+                self._key = load_service_key(self.key_file)
+            return self._key
@@ -0,0 +1,43 @@
+"""
+Model Config Loader
+===================
+Đọc file cấu hình tập trung src/GUI/data/model_config.json cho tầng BUS
+(GUI vẫn tự đọc/ghi file này như trước).
+"""
+
+import json
+import os
+from typing import Dict
+
+MODEL_CONFIG_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "GUI", "data", "model_config.json"
+))
+
+
+def load_model_config() -> Dict:
+    """
+    Đọc toàn bộ model_config.json
+
+    Returns:
+        Dict cấu hình, {} nếu file không tồn tại / lỗi
+    """
+    try:
+        with open(MODEL_CONFIG_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def get_config_section(*keys: str) -> Dict:
+    """
+    Lấy một nhánh cấu hình lồng nhau
+
+    Ví dụ: get_config_section("face_recognition", "key_cache")
+
+    Returns:
+        Dict của nhánh đó, {} nếu không có
+    """
+    section = load_model_config()
+    for key in keys:
+        section = section.get(key, {}) if isinstance(section, dict) else {}
+    return section if isinstance(section, dict) else {}
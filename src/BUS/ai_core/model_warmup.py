@@ -0,0 +1,211 @@
+"""
+Model Warm-up Service
+=====================
+Nạp trước các model AI trong background ngay khi ứng dụng khởi động:
+
+- 'arcface'    : ArcFaceModel (face login / đăng ký khuôn mặt)
+- 'drowsiness' : SleepDetector (giám sát ngủ gật trong PhienLaiPage)
+
+Mỗi model được nạp 1 lần rồi chạy 1 lần suy luận giả (frame đen) để
+ONNX Runtime / PyTorch cấp phát bộ nhớ trước. UI có thể:
+
+- poll:  get_warmup_service().is_ready('arcface')
+- chờ:   get_warmup_service().get('arcface', timeout=10)
+- nhận callback: get_warmup_service().future('drowsiness').add_done_callback(...)
+"""
+
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from src.BUS.ai_core.model_config import get_config_section
+
+DROWSINESS_MODEL_PATH = "models/trained_modek_Run/best.pt"
+
+
+# ========== LOADER MẶC ĐỊNH ==========
+
+def _load_arcface():
+    from src.BUS.ai_core.login_user.Arc_face import ArcFaceModel
+
+    face_config = get_config_section("face_recognition")
+    return ArcFaceModel({
+        'confidence_threshold': face_config.get('confidence_threshold', 0.75),
+        'min_face_size': face_config.get('min_face_size', 40),
+        'cosine_threshold': face_config.get('cosine_threshold', 0.3)
+    })
+
+
+def _warmup_arcface(model):
+    # Frame không có mặt: chạy detector; ảnh 112x112: chạy recognition
+    model.extract_embedding(np.zeros((480, 640, 3), dtype=np.uint8))
+    if model.arcface.rec_model is not None:
+        model.arcface.embed_aligned(np.zeros((112, 112, 3), dtype=np.uint8))
+    # Giải mã gallery 1 lần lúc khởi động (chế độ niêm phong: không cần mật khẩu user)
+    model.load_gallery()
+
+
+def _load_drowsiness():
+    from src.BUS.ai_core.laucher_user.sleep_detector import SleepDetector
+    return SleepDetector(os.path.abspath(DROWSINESS_MODEL_PATH))
+
+
+def _warmup_drowsiness(detector):
+    if detector.is_loaded:
+        detector.predict(np.zeros((480, 640, 3), dtype=np.uint8))
+        # Kích thước input khi chạy trên crop mặt (drowsiness_detection.roi)
+        roi_config = get_config_section("drowsiness_detection", "roi")
+        if roi_config.get('enabled', True):
+            detector.predict(np.zeros((240, 240, 3), dtype=np.uint8), annotate=False,
+                             imgsz=int(roi_config.get('imgsz', 320)))
+
+
+# ============================================================================
+# WARM-UP SERVICE
+# ============================================================================
+
+class ModelWarmupService:
+    """Nạp model nền, báo sẵn sàng qua Future / Event, ghi lại thời gian nạp"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders: Dict[str, Callable] = {}
+        self._warmups: Dict[str, Optional[Callable]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, loader: Callable, warmup: Optional[Callable] = None):
+        """
+        Đăng ký 1 model
+
+        Args:
+            name: Tên model ('arcface', 'drowsiness', ...)
+            loader: Hàm tạo model, trả về instance
+            warmup: Hàm chạy suy luận giả trên instance (tùy chọn)
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._warmups[name] = warmup
+            self._futures.setdefault(name, Future())
+            self._events.setdefault(name, threading.Event())
+
+    # ========== KHỞI ĐỘNG ==========
+
+    def start(self, names: Optional[list] = None):
+        """
+        Nạp các model trong background (mỗi model 1 thread daemon, gọi lại không sao)
+
+        Args:
+            names: Danh sách model cần nạp (None = tất cả đã đăng ký)
+        """
+        for name in names or list(self._loaders.keys()):
+            if self._claim(name):
+                threading.Thread(target=self._load, args=(name,), daemon=True,
+                                 name=f"warmup-{name}").start()
+
+    # ========== TRẠNG THÁI ==========
+
+    def is_ready(self, name: str) -> bool:
+        """Model đã nạp + warm-up xong (kể cả khi lỗi)"""
+        event = self._events.get(name)
+        return event is not None and event.is_set()
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Chờ model sẵn sàng, trả về False nếu hết thời gian"""
+        event = self._events.get(name)
+        return event.wait(timeout) if event is not None else False
+
+    def future(self, name: str) -> Future:
+        """Future trả về instance model (add_done_callback để nhận khi xong)"""
+        return self._futures[name]
+
+    def get(self, name: str, timeout: Optional[float] = None):
+        """
+        Lấy instance model - nạp đồng bộ nếu warm-up chưa được khởi động
+
+        Returns:
+            Instance model hoặc None nếu nạp lỗi / hết thời gian chờ
+        """
+        if name not in self._loaders:
+            return None
+        if self._claim(name):
+            self._load(name)
+        try:
+            return self._futures[name].result(timeout)
+        except Exception as e:
+            return None
+
+    def load_times(self) -> Dict[str, Dict[str, float]]:
+        """{name: {'load_seconds', 'warmup_seconds'}}"""
+        with self._lock:
+            return {name: dict(t) for name, t in self._timings.items()}
+
+    def status(self) -> Dict[str, str]:
+        """{name: 'pending' | 'loading' | 'ready' | 'error'}"""
+        result = {}
+        for name, future in self._futures.items():
+            if future.done():
+                result[name] = 'error' if future.exception() is not None else 'ready'
+            else:
+                result[name] = 'loading' if future.running() else 'pending'
+        return result
+
+    # ========== HELPER FUNCTIONS ==========
+
+    def _claim(self, name: str) -> bool:
+        """Đánh dấu model đang được nạp - chỉ 1 luồng được nạp mỗi model"""
+        with self._lock:
+            future = self._futures.get(name)
+            if future is None or future.running() or future.done():
+                return False
+            return future.set_running_or_notify_cancel()
+
+    def _load(self, name: str):
+        future = self._futures[name]
+        try:
+            start = time.perf_counter()
+            instance = self._loaders[name]()
+            loaded = time.perf_counter()
+
+            warmup = self._warmups.get(name)
+            if warmup is not None and instance is not None:
+                try:
+                    warmup(instance)
+                except Exception as e:
+                    print(f"⚠️ [WARMUP] {name}: dummy inference lỗi: {e}")
+            done = time.perf_counter()
+
+            with self._lock:
+                self._timings[name] = {
+                    'load_seconds': loaded - start,
+                    'warmup_seconds': done - loaded
+                }
+            print(f"✅ [WARMUP] {name} sẵn sàng (load {loaded - start:.2f}s, warm-up {done - loaded:.2f}s)")
+            future.set_result(instance)
+
+        except Exception as e:
+            print(f"❌ [WARMUP] Không nạp được {name}: {e}")
+            future.set_exception(e)
+        finally:
+            self._events[name].set()
+
+
+# Singleton dùng chung cho toàn ứng dụng
+_warmup_instance = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup_service() -> ModelWarmupService:
+    """Lấy singleton ModelWarmupService (đã đăng ký 'arcface' và 'drowsiness')"""
+    global _warmup_instance
+    with _warmup_lock:
+        if _warmup_instance is None:
+            service = ModelWarmupService()
+            service.register('arcface', _load_arcface, _warmup_arcface)
+            service.register('drowsiness', _load_drowsiness, _warmup_drowsiness)
+            _warmup_instance = service
+    return _warmup_instance
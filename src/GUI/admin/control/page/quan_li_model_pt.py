@@ -163,13 +163,14 @@ def QuanLiModel(page_title, page):
                 config_data = json.load(f)
             
             # Cập nhật face_recognition settings (bao gồm file path)
-            config_data["face_recognition"] = {
+            # update() để giữ lại các nhánh cấu hình nâng cao (key_cache, gallery, ...)
+            config_data.setdefault("face_recognition", {}).update({
                 "model_name": selected_biometric.value,
                 "model_path": bio_file_path.value if bio_file_path.value != "Chưa chọn file" else "",
                 "confidence_threshold": float(bio_threshold.value),
                 "min_face_size": int(bio_min_face_size.value),
                 "cosine_threshold": float(bio_cosine_threshold.value)
-            }
+            })
             
             # Ghi lại file
             with open(config_path, "w", encoding="utf-8") as f:
@@ -229,6 +230,91 @@ def QuanLiModel(page_title, page):
         
         print(f"{'='*70}\n")
     
+    bio_cosine_slider = ft.Slider(min=0.2, max=1.0, divisions=80, value=default_cosine, on_change=update_bio_cosine_threshold)
+    
+    def calibrate_threshold(e):
+        """Hiệu chỉnh cosine_threshold từ các tài xế đã đăng ký (FAR / FRR / ROC)"""
+        from src.BUS.ai_core.login_user import face_calibration
+        
+        txt_result = ft.Text("⏳ Đang giải mã template và chấm điểm mọi cặp...", size=13, selectable=True)
+        plot_image = ft.Image(visible=False, width=620, fit=ft.ImageFit.CONTAIN)
+        suggestion_buttons = ft.Row(wrap=True, spacing=8)
+        
+        def apply_threshold(threshold: float):
+            """Áp dụng ngưỡng đề xuất: cập nhật slider + ghi model_config.json"""
+            threshold = min(max(threshold, bio_cosine_slider.min), bio_cosine_slider.max)
+            bio_cosine_slider.value = threshold
+            bio_cosine_threshold.value = f"{threshold:.2f}"
+            if current_face_model:
+                current_face_model.cosine_threshold = threshold
+            try:
+                face_calibration.write_threshold(threshold, config_path)
+                page.open(ft.SnackBar(
+                    content=ft.Text(f"✅ Đã lưu ngưỡng cosine {threshold:.3f}"),
+                    bgcolor=ft.Colors.GREEN_700
+                ))
+            except Exception as ex:
+                print(f"❌ [CALIBRATION] {ex}")
+                page.open(ft.SnackBar(content=ft.Text(f"❌ Lỗi lưu cấu hình: {ex}"), bgcolor=ft.Colors.RED_700))
+            page.close(dialog)
+            page.update()
+        
+        def worker():
+            try:
+                current = float(bio_cosine_threshold.value)
+                result = face_calibration.run_calibration(model=current_face_model)
+                face_calibration.print_report(result, current)
+                
+                if result['templates'] < 2:
+                    txt_result.value = "⚠️ Cần ít nhất 2 template đã đăng ký để hiệu chỉnh"
+                    page.update()
+                    return
+                
+                cur_far, cur_frr = face_calibration.rates_at(result, current)
+                lines = [
+                    f"📊 {result['drivers']} tài xế, {result['templates']} template "
+                    f"({result['genuine_pairs']:,} cặp genuine, {result['impostor_pairs']:,} cặp impostor)",
+                    f"⏱ Nạp ({result['source']}) {result['load_seconds']:.2f}s, chấm điểm {result['seconds']:.2f}s",
+                    f"EER {result['eer']:.2%} tại ngưỡng {result['eer_threshold']:.3f}",
+                    f"Ngưỡng hiện tại {current:.2f}: FAR {cur_far:.2e}, FRR {cur_frr:.2%}"
+                ]
+                if result['genuine_pairs'] == 0:
+                    lines.append("⚠️ Chưa có cặp genuine (gallery chỉ có 1 vector / tài xế) - chỉ tin được FAR")
+                else:
+                    lines.append("⚠️ Cặp genuine cùng 1 lần đăng ký - FRR thực tế sẽ cao hơn")
+                txt_result.value = "\n".join(lines)
+                
+                for s in result['suggestions']:
+                    suggestion_buttons.controls.append(ft.OutlinedButton(
+                        f"FAR≤{s['target_far']:g} → {s['threshold']:.3f} (FRR {s['frr']:.1%})",
+                        on_click=lambda _, t=s['threshold']: apply_threshold(t)
+                    ))
+                
+                import tempfile
+                plot_path = os.path.join(tempfile.gettempdir(), "face_calibration_roc.png")
+                if face_calibration.plot_curves(result, plot_path, current):
+                    plot_image.src = plot_path
+                    plot_image.visible = True
+            except Exception as ex:
+                print(f"❌ [CALIBRATION] {ex}")
+                import traceback
+                traceback.print_exc()
+                txt_result.value = f"❌ Lỗi hiệu chỉnh: {ex}"
+            page.update()
+        
+        dialog = ft.AlertDialog(
+            title=ft.Text("📈 Hiệu Chỉnh Ngưỡng Cosine"),
+            content=ft.Column([
+                txt_result,
+                plot_image,
+                ft.Text("Chọn ngưỡng theo FAR mục tiêu:", size=13, weight=ft.FontWeight.BOLD),
+                suggestion_buttons
+            ], width=640, height=520, scroll=ft.ScrollMode.AUTO),
+            actions=[ft.TextButton("Đóng", on_click=lambda _: page.close(dialog))]
+        )
+        page.open(dialog)
+        threading.Thread(target=worker, daemon=True).start()
+    
     biometric_config_card = ft.Container(
         bgcolor=ft.Colors.WHITE, border_radius=15, padding=20,
         shadow=ft.BoxShadow(blur_radius=10, spread_radius=1, color=ft.Colors.with_opacity(0.1, ft.Colors.BLACK)),
@@ -267,12 +353,13 @@ def QuanLiModel(page_title, page):
             ft.Row([
                 ft.Text("Ngưỡng Cosine Similarity: "), bio_cosine_threshold
             ]),
-            ft.Slider(min=0.2, max=1.0, divisions=80, value=default_cosine, on_change=update_bio_cosine_threshold),
+            bio_cosine_slider,
             
             ft.Container(height=10),
             ft.Row([
                 ft.ElevatedButton("Lưu Cấu Hình", icon=ft.Icons.SAVE, bgcolor=ft.Colors.BLUE, color=ft.Colors.WHITE, on_click=save_config),
-                ft.ElevatedButton("Test Model", icon=ft.Icons.PLAY_ARROW, bgcolor=ft.Colors.GREEN, color=ft.Colors.WHITE, on_click=test_biometric_model)
+                ft.ElevatedButton("Test Model", icon=ft.Icons.PLAY_ARROW, bgcolor=ft.Colors.GREEN, color=ft.Colors.WHITE, on_click=test_biometric_model),
+                ft.ElevatedButton("Hiệu Chỉnh Ngưỡng", icon=ft.Icons.QUERY_STATS, bgcolor=ft.Colors.INDIGO, color=ft.Colors.WHITE, on_click=calibrate_threshold)
             ])
         ])
     )
@@ -324,12 +411,12 @@ def QuanLiModel(page_title, page):
                 config_data = json.load(f)
             
             # Cập nhật drowsiness_detection settings (bao gồm file path)
-            config_data["drowsiness_detection"] = {
+            config_data.setdefault("drowsiness_detection", {}).update({
                 "model_name": selected_drowsiness.value,
                 "model_path": drowsy_file_path.value if drowsy_file_path.value != "Chưa chọn file" else "",
                 "confidence_threshold": float(drowsy_conf.value),
                 "iou_threshold": float(drowsy_iou.value)
-            }
+            })
             
             # Ghi lại file
             with open(config_path, "w", encoding="utf-8") as f:
@@ -1,6 +1,7 @@
 import flet as ft
 import json
 import os
+import threading
 
 # Đường dẫn file dữ liệu
 JSON_FILE = "src/GUI/data/accounts.json"
@@ -31,6 +32,13 @@ class QuanLiTaiXe(ft.Column):
             ft.Row([
                 ft.Text("👥 Quản Lý Tài Xế", size=24, weight=ft.FontWeight.BOLD),
                 ft.Row([
+                    ft.ElevatedButton(
+                        "Đăng Ký Khuôn Mặt Hàng Loạt",
+                        icon=ft.Icons.FACE_RETOUCHING_NATURAL,
+                        bgcolor=ft.Colors.BLUE,
+                        color=ft.Colors.WHITE,
+                        on_click=self.open_bulk_enroll_dialog
+                    ),
                     ft.ElevatedButton(
                         "Thêm Tài Xế", 
                         icon=ft.Icons.PERSON_ADD, 
@@ -90,6 +98,16 @@ class QuanLiTaiXe(ft.Column):
         
         self.update_table()
 
+    def remove_face_embedding(self, username):
+        # Xóa embedding khỏi kho nhị phân để face login không còn nhận tài xế đã xóa
+        try:
+            from src.BUS.ai_core.login_user.embedding_store import get_embedding_store
+            store = get_embedding_store()
+            if store is not None and username:
+                store.delete(username)
+        except Exception as e:
+            print(f"Lỗi xóa embedding khuôn mặt: {e}")
+
     def update_table(self):
         self.data_table.rows.clear()
         for driver in self.drivers:
@@ -255,6 +273,7 @@ class QuanLiTaiXe(ft.Column):
             if driver in self.drivers:
                 self.drivers.remove(driver)
                 self.save_data()
+                self.remove_face_embedding(driver.get("username"))
                 e.page.close(dialog)
                 e.page.open(ft.SnackBar(ft.Text("Đã xóa tài xế thành công!"), bgcolor=ft.Colors.RED))
 
@@ -266,4 +285,86 @@ class QuanLiTaiXe(ft.Column):
                 ft.ElevatedButton("Xóa", on_click=confirm_delete, bgcolor=ft.Colors.RED, color=ft.Colors.WHITE)
             ]
         )
-        e.page.open(dialog)
\ No newline at end of file
+        e.page.open(dialog)
+
+    # =========================================================================
+    # 5. ĐĂNG KÝ KHUÔN MẶT HÀNG LOẠT (thư mục ảnh / CSV)
+    # =========================================================================
+    def open_bulk_enroll_dialog(self, e):
+        page = e.page
+        txt_status = ft.Text("Chọn thư mục ảnh (<username>.jpg hoặc <username>/*.jpg) hoặc file CSV "
+                             "(username, password, name, driver_id, images)", size=13)
+        progress_bar = ft.ProgressBar(width=420, value=0, visible=False)
+        txt_report = ft.Text("", size=12, selectable=True)
+
+        def run_enroll(source):
+            from src.BUS.ai_core.login_user.bulk_enroll import bulk_enroll
+
+            btn_folder.disabled = btn_csv.disabled = True
+            progress_bar.visible = True
+            txt_status.value = f"Đang xử lý: {source}"
+            page.update()
+
+            def on_progress(done, total, result):
+                progress_bar.value = done / total
+                txt_status.value = f"Đã xử lý {done}/{total} tài xế ({result['username']})"
+                page.update()
+
+            def worker():
+                try:
+                    report = bulk_enroll(source, progress=on_progress)
+                    lines = [
+                        f"✅ Đã đăng ký {report['enrolled']}/{report['drivers']} tài xế",
+                        f"⏱ {report['images']} ảnh trong {report['seconds']:.1f}s "
+                        f"({report['images_per_second']:.2f} ảnh/s, {report['workers']} tiến trình)"
+                    ]
+                    if report['failures']:
+                        lines.append(f"❌ {len(report['failures'])} lỗi:")
+                        lines += [f"  - {f['username'] or '?'}: {os.path.basename(f['image']) or '-'} → {f['error']}"
+                                  for f in report['failures'][:20]]
+                    txt_status.value = "Hoàn tất"
+                    txt_report.value = "\n".join(lines)
+                    self.load_data()
+                except Exception as ex:
+                    txt_status.value = f"Lỗi: {ex}"
+                btn_folder.disabled = btn_csv.disabled = False
+                page.update()
+
+            threading.Thread(target=worker, daemon=True).start()
+
+        def on_folder_result(event: ft.FilePickerResultEvent):
+            if event.path:
+                run_enroll(event.path)
+
+        def on_csv_result(event: ft.FilePickerResultEvent):
+            if event.files:
+                run_enroll(event.files[0].path)
+
+        folder_picker = ft.FilePicker(on_result=on_folder_result)
+        csv_picker = ft.FilePicker(on_result=on_csv_result)
+        page.overlay.extend([folder_picker, csv_picker])
+        page.update()
+
+        btn_folder = ft.ElevatedButton("Chọn thư mục ảnh", icon=ft.Icons.FOLDER_OPEN,
+                                       on_click=lambda _: folder_picker.get_directory_path())
+        btn_csv = ft.ElevatedButton("Chọn file CSV", icon=ft.Icons.TABLE_CHART,
+                                    on_click=lambda _: csv_picker.pick_files(allowed_extensions=["csv"]))
+
+        def close(_):
+            page.close(dialog)
+            for picker in (folder_picker, csv_picker):
+                if picker in page.overlay:
+                    page.overlay.remove(picker)
+            page.update()
+
+        dialog = ft.AlertDialog(
+            title=ft.Text("Đăng Ký Khuôn Mặt Hàng Loạt"),
+            content=ft.Column([
+                txt_status,
+                ft.Row([btn_folder, btn_csv]),
+                progress_bar,
+                ft.Container(content=ft.Column([txt_report], scroll=ft.ScrollMode.AUTO), height=200)
+            ], width=460, height=320, tight=True),
+            actions=[ft.TextButton("Đóng", on_click=close)]
+        )
+        page.open(dialog)
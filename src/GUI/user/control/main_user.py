@@ -161,6 +161,9 @@ class UserApp:
 
     def handle_logout(self, e):
         self.running = False
+        # Xóa khóa giải mã khuôn mặt đã cache trong phiên
+        from src.BUS.ai_core.login_user.key_cache import wipe_key_cache
+        wipe_key_cache()
         if self.go_back_callback:
             self.page.controls.clear()
             self.page.update()
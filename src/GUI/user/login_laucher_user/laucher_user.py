@@ -97,6 +97,10 @@ def main(page: ft.Page, go_back_callback=None, user_account=None):
         
         time.sleep(0.5)
         
+        # Xóa khóa giải mã khuôn mặt đã cache trong phiên
+        from src.BUS.ai_core.login_user.key_cache import wipe_key_cache
+        wipe_key_cache()
+        
         if go_back_callback:
             page.controls.clear()
             page.update()
@@ -47,13 +47,20 @@ except Exception as e:
     ARCFACE_AVAILABLE = False
     ArcFaceModel = None
 
+from src.BUS.ai_core.model_warmup import get_warmup_service
+
 # Singleton instance của model (khởi tạo 1 lần duy nhất)
 _global_arcface_model = None
 
-def get_arcface_model(config=None):
+def get_arcface_model():
     """
     Lấy singleton instance của ArcFace model
     Chỉ khởi tạo 1 lần duy nhất trong toàn bộ ứng dụng
+    
+    Model được ModelWarmupService nạp sẵn từ main.py; nếu warm-up chưa xong
+    thì chờ tới khi xong, nếu chưa được khởi động thì nạp đồng bộ tại đây.
+    Cả 2 đường đều dùng cùng loader, cấu hình lấy từ model_config.json
+    (face_recognition) - không nhận config riêng.
     """
     global _global_arcface_model
     
@@ -62,16 +69,12 @@ def get_arcface_model(config=None):
         return None
     
     if _global_arcface_model is None:
-        if config is None:
-            config = {
-                'confidence_threshold': 0.5,
-                'min_face_size': 30,
-                'cosine_threshold': 0.5
-            }
-        
-        print("🔧 [MODEL] Initializing ArcFace model (first time)...")
-        _global_arcface_model = ArcFaceModel(config)
-        print("✅ [MODEL] ArcFace model initialized and cached")
+        service = get_warmup_service()
+        if not service.is_ready('arcface'):
+            print("🔧 [MODEL] Waiting for ArcFace warm-up...")
+        _global_arcface_model = service.get('arcface')
+        if _global_arcface_model is not None:
+            print("✅ [MODEL] ArcFace model initialized and cached")
     
     return _global_arcface_model
 
@@ -491,9 +494,6 @@ class UserUI:
         Xác thực khuôn mặt sau khi username/password đã đúng
         So sánh vector embedding với face_data đã lưu
         """
-        import cv2
-        import tempfile
-        from pathlib import Path
         from src.BUS.ai_core.login_user.camera_preview import LiveCameraPreview
         
         print("\n" + "="*70)
@@ -607,13 +607,7 @@ class UserUI:
                 dialog_message.update()
                 
                 print("\n🔧 [MODEL] Getting ArcFace model instance...")
-                config = {
-                    'confidence_threshold': 0.5,
-                    'min_face_size': 30,
-                    'cosine_threshold': 0.5
-                }
-                
-                arcface_model = get_arcface_model(config)
+                arcface_model = get_arcface_model()
                 
                 if arcface_model is None:
                     print("❌ [CRITICAL ERROR] Failed to get ArcFace model")
@@ -689,17 +683,14 @@ class UserUI:
             def process_face_verification():
                 nonlocal processing
                 try:
-                    # Lưu ảnh tạm
-                    temp_dir = tempfile.gettempdir()
-                    captured_image_path = str(Path(temp_dir) / "face_login_verify.jpg")
-                    cv2.imwrite(captured_image_path, frame)
-                    
-                    # Sử dụng verify_face của model để so sánh
-                    matched, similarity = arcface_model.verify_face(
-                        captured_image_path, 
-                        username, 
-                        password
+                    # So sánh 1 probe với tài khoản ứng viên (embedding trích xuất 1 lần)
+                    # Frame đưa thẳng vào model - không ghi ảnh tạm ra đĩa
+                    ranking = arcface_model.verify_many(
+                        frame,
+                        [{**account_data, 'username': username, 'password': password}]
                     )
+                    similarity = ranking[0][1] if ranking else 0.0
+                    matched = similarity >= arcface_model.cosine_threshold
                     
                     if matched:
                         # XÁC THỰC THÀNH CÔNG
@@ -940,9 +931,6 @@ class UserUI:
             driver_id = "TX999"
         
         # ==================== CAMERA PREVIEW ====================
-        import cv2
-        import tempfile
-        from pathlib import Path
         from src.BUS.ai_core.login_user.camera_preview import LiveCameraPreview
         
         print("\n" + "="*70)
@@ -1056,13 +1044,7 @@ class UserUI:
                 dialog_message.update()
                 
                 print("\n🔧 [OPTIMIZATION] Getting ArcFace model instance...")
-                config = {
-                    'confidence_threshold': 0.5,
-                    'min_face_size': 30,
-                    'cosine_threshold': 0.5
-                }
-                
-                arcface_model = get_arcface_model(config)
+                arcface_model = get_arcface_model()
                 
                 if arcface_model is None:
                     print("❌ [CRITICAL ERROR] Failed to get ArcFace model")
@@ -1079,10 +1061,13 @@ class UserUI:
                 dialog_message.value = "📷 Đang khởi động camera..."
                 dialog_message.update()
                 
+                enrollment = arcface_model.enrollment_config
                 camera = LiveCameraPreview(camera_index=0)
                 success = camera.start(
                     on_frame_callback=update_frame,
-                    on_auto_capture=lambda frame: on_auto_capture(frame, arcface_model)
+                    on_burst_capture=lambda frames: on_burst_capture(frames, arcface_model),
+                    burst_size=enrollment.get('burst_size', 8),
+                    burst_interval=enrollment.get('burst_interval', 0.1)
                 )
                 
                 if success:
@@ -1121,8 +1106,8 @@ class UserUI:
             except Exception as e:
                 print(f"⚠️  [FRAME UPDATE] Error: {e}")
         
-        def on_auto_capture(frame: 'np.ndarray', arcface_model):
-            """Callback khi tự động chụp ảnh - RUN IN BACKGROUND THREAD"""
+        def on_burst_capture(frames: list, arcface_model):
+            """Callback khi chụp xong 1 loạt frame - RUN IN BACKGROUND THREAD"""
             nonlocal processing
             
             if processing:
@@ -1142,11 +1127,6 @@ class UserUI:
             def process_face_registration():
                 nonlocal processing
                 try:
-                    # Lưu ảnh tạm
-                    temp_dir = tempfile.gettempdir()
-                    captured_image_path = str(Path(temp_dir) / "face_register_auto.jpg")
-                    cv2.imwrite(captured_image_path, frame)
-                    
                     # OPTIMIZATION: Sử dụng model đã khởi tạo sẵn
                     # Không cần load lại!
                     
@@ -1161,8 +1141,8 @@ class UserUI:
                     
                     print(f"✅ [USER DATA] Using form data: {name} ({username}) - {driver_id}")
                     
-                    # Register face với model đã sẵn sàng
-                    success = arcface_model.register_face(captured_image_path, user_data)
+                    # Register face từ loạt frame: chấm chất lượng, giữ K frame tốt nhất
+                    success = arcface_model.register_face_multi(frames, user_data)
                     
                     if success:
                         dialog_message.value = "✅ Đăng ký khuôn mặt thành công!"
@@ -1253,11 +1233,8 @@ class UserUI:
     
     def _handle_face_login(self):
         """Đăng nhập bằng khuôn mặt - Tự động quét tất cả accounts"""
-        import cv2
-        import tempfile
         import os
         import json
-        from pathlib import Path
         from src.BUS.ai_core.login_user.camera_preview import LiveCameraPreview
         
         # UI Elements
@@ -1350,6 +1327,10 @@ class UserUI:
         processing = False
         frame_counter = 0
         
+        # Cấu hình nhận diện liên tục (track-then-identify)
+        from src.BUS.ai_core.model_config import get_config_section
+        streaming_enabled = get_config_section("face_recognition", "streaming").get('enabled', True)
+        
         def update_frame(base64_img: str):
             """Update camera view - Batch update mỗi 2 frames"""
             nonlocal frame_counter
@@ -1370,6 +1351,197 @@ class UserUI:
             except Exception as e:
                 print(f"⚠️  [FRAME UPDATE] Error: {e}")
         
+        def show_error(message: str):
+            """Hiện lỗi trên dialog và cho phép thử lại"""
+            nonlocal processing
+            dialog_message.value = message
+            dialog_message.color = ft.Colors.RED
+            progress_ring.visible = False
+            processing = False
+            dialog_message.update()
+            progress_ring.update()
+        
+        def load_login_model():
+            """
+            Nạp model nhận diện theo model_config.json và gallery 1:N
+            
+            Returns:
+                Model đã nạp gallery hoặc None (lỗi đã hiện trên dialog)
+            """
+            face_config = get_config_section("face_recognition")
+            model_name = face_config.get('model_name', 'ArcFace (v2.1)')
+            
+            # Load model dynamically based on model_name
+            print(f"\n🤖 [MODEL] Loading {model_name}...")
+            model = None
+            
+            if "ArcFace" in model_name:
+                # Sử dụng singleton model
+                model = get_arcface_model()
+                if model:
+                    print(f"✅ [MODEL] ArcFace model loaded successfully!")
+                else:
+                    print(f"❌ [MODEL ERROR] Failed to get ArcFace model")
+                
+            elif "FaceNet" in model_name:
+                print(f"❌ [MODEL ERROR] FaceNet chưa được triển khai!")
+                print(f"   Vui lòng chọn ArcFace trong Model Test UI")
+                show_error("❌ Model FaceNet chưa được hỗ trợ!\nVui lòng chọn ArcFace trong cài đặt.")
+                return None
+                
+            elif "DeepFace" in model_name:
+                print(f"❌ [MODEL ERROR] DeepFace chưa được triển khai!")
+                print(f"   Vui lòng chọn ArcFace trong Model Test UI")
+                show_error("❌ Model DeepFace chưa được hỗ trợ!\nVui lòng chọn ArcFace trong cài đặt.")
+                return None
+            
+            else:
+                print(f"❌ [MODEL ERROR] Unknown model: {model_name}")
+                show_error(f"❌ Model không xác định: {model_name}")
+                return None
+            
+            # Final check if model loaded successfully
+            if model is None:
+                print(f"❌ [MODEL ERROR] Failed to load model: {model_name}")
+                print(f"   This should not happen if model_name is correct")
+                show_error(f"❌ Lỗi: Không thể load model {model_name}")
+                return None
+            
+            dialog_message.value = "🔍 Đang tải AI models..."
+            dialog_message.update()
+            
+            # Gallery 1:N - embedding đã giải mã sẵn, chỉ giải mã lại khi accounts.json thay đổi
+            gallery = model.load_gallery()
+            print(f"🔍 [SCAN] Gallery có {len(gallery)} khuôn mặt đã đăng ký")
+            return model
+        
+        def find_account(username: str):
+            """Tìm tài khoản user trong accounts.json theo username"""
+            print(f"📂 [FILE] Loading accounts.json...")
+            accounts_path = os.path.join(os.path.dirname(__file__), "..", "..", "data", "accounts.json")
+            print(f"📂 [FILE] Path: {accounts_path}")
+            with open(accounts_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                user_accounts = data.get("user_accounts", [])
+            return next((acc for acc in user_accounts if acc['username'] == username), None)
+        
+        def finish_login(matched_account: dict, similarity: float):
+            """Đăng nhập thành công: thông báo, đóng dialog và chuyển trang"""
+            print(f"\n✅ [SUCCESS] Tìm thấy: {matched_account['name']} ({similarity:.2%})")
+            
+            dialog_message.value = f"✅ Xin chào {matched_account['name']}!"
+            dialog_message.color = ft.Colors.GREEN
+            progress_ring.visible = False
+            dialog_message.update()
+            progress_ring.update()
+            
+            # Show success snackbar
+            self.page.open(ft.SnackBar(
+                ft.Text(f"✅ Đăng nhập thành công! Xin chào {matched_account['name']}"),
+                bgcolor=ft.Colors.GREEN_600
+            ))
+            
+            # Đóng dialog và chuyển trang
+            time.sleep(1.5)
+            close_dialog()
+            
+            # Chuyển sang main user với thông tin tài khoản
+            self.page.controls.clear()
+            self.page.update()
+            laucher_user.main(self.page, self.go_back_callback, user_account=matched_account)
+        
+        # ========== NHẬN DIỆN LIÊN TỤC ==========
+        
+        def on_stream_attempt(track_id: int, username, similarity: float):
+            """Worker vừa nhận diện xong 1 frame của track"""
+            if username is not None and similarity < (stream.threshold if stream else 1.0):
+                print(f"    Track #{track_id}: {username} - Similarity: {similarity:.2%} (❌ NO MATCH)")
+            if not processing:
+                dialog_message.value = "🔍 Đang nhận diện..."
+                dialog_message.color = ft.Colors.ORANGE
+                progress_ring.visible = True
+                dialog_message.update()
+                progress_ring.update()
+        
+        def on_stream_exhausted(track_id: int):
+            """Track đã thử đủ số lần mà không khớp - chờ track mới"""
+            print(f"\n❌ [FAILED] Track #{track_id}: không tìm thấy khuôn mặt khớp")
+            dialog_message.value = "❌ Không tìm thấy khuôn mặt trong hệ thống"
+            dialog_message.color = ft.Colors.RED
+            progress_ring.visible = False
+            dialog_message.update()
+            progress_ring.update()
+        
+        def on_stream_match(username: str, similarity: float, frame):
+            """Khớp chắc chắn đầu tiên - đăng nhập ngay"""
+            nonlocal processing
+            processing = True
+            print(f"    Best: {username} - Similarity: {similarity:.2%} (✅ MATCH)")
+            try:
+                matched_account = find_account(username)
+                if matched_account is None:
+                    # Gallery cũ hơn accounts.json (tài khoản vừa bị xóa): nạp lại và nhận diện tiếp
+                    show_error("❌ Không tìm thấy khuôn mặt trong hệ thống")
+                    restart_streaming(username)
+                    return
+                finish_login(matched_account, similarity)
+            except FileNotFoundError:
+                print(f"❌ [ERROR] Không tìm thấy file accounts.json")
+                show_error("❌ Lỗi: Không tìm thấy dữ liệu tài khoản")
+            except Exception as ex:
+                print(f"❌ [ERROR] Face login failed: {ex}")
+                import traceback
+                traceback.print_exc()
+                show_error(f"❌ Lỗi: {str(ex)}")
+        
+        stream = None
+        
+        def start_streaming():
+            """Nạp model + gallery rồi gắn worker nhận diện vào camera đang chạy"""
+            nonlocal stream
+            from src.BUS.ai_core.login_user.face_stream import StreamingIdentifier
+            try:
+                model = load_login_model()
+                if model is None:
+                    return
+                
+                stream = StreamingIdentifier(
+                    model,
+                    on_match=on_stream_match,
+                    on_attempt=on_stream_attempt,
+                    on_exhausted=on_stream_exhausted
+                )
+                if camera and camera.is_running:
+                    camera.attach_stream(stream)
+                    dialog_message.value = "✅ Camera sẵn sàng - Hãy đặt mặt vào khung oval"
+                    dialog_message.color = ft.Colors.GREEN_700
+                    dialog_message.update()
+            except Exception as ex:
+                print(f"❌ [ERROR] Face login failed: {ex}")
+                import traceback
+                traceback.print_exc()
+                show_error(f"❌ Lỗi: {str(ex)}")
+        
+        def restart_streaming(stale_username: str):
+            """
+            Gỡ worker cũ, bỏ tài khoản không còn tồn tại khỏi gallery rồi nhận diện lại
+            (chạy trên thread worker cũ - stop() không join chính nó)
+            """
+            nonlocal stream
+            old_stream, stream = stream, None
+            if camera:
+                camera.detach_stream()
+            if old_stream is not None:
+                old_stream.stop()
+                model = old_stream.model
+                model.load_gallery(force=True)
+                # Nguồn nhanh (kho / file niêm phong) vẫn còn user → xóa hẳn để không khớp lại
+                if stale_username in model.gallery:
+                    model.forget_user(stale_username)
+            start_streaming()
+        
+        # ========== CHỤP 1 LẦN (streaming tắt) ==========
+        
         def on_auto_capture(frame: 'np.ndarray'):
             """Callback khi tự động chụp ảnh - Quét tất cả accounts"""
             nonlocal processing
@@ -1397,217 +1569,47 @@ class UserUI:
                 nonlocal processing
                 print(f"\n🚀 [THREAD] process_face_login thread started!")
                 try:
-                    # Lưu ảnh tạm
-                    print(f"💾 [SAVE] Saving captured image...")
-                    temp_dir = tempfile.gettempdir()
-                    captured_image_path = str(Path(temp_dir) / "face_login_auto.jpg")
-                    cv2.imwrite(captured_image_path, frame)
-                    print(f"✅ [SAVE] Image saved to: {captured_image_path}")
-                    
-                    # Load config from central config file
-                    print(f"📂 [CONFIG] Loading model configuration...")
-                    config_path = os.path.join(os.path.dirname(__file__), "..", "..", "data", "model_config.json")
-                    
-                    model_name = "ArcFace (v2.1)"  # Default
-                    config = {
-                        'confidence_threshold': 0.75,
-                        'min_face_size': 40,
-                        'cosine_threshold': 0.3
-                    }
-                    
-                    try:
-                        with open(config_path, "r", encoding="utf-8") as f:
-                            model_config = json.load(f)
-                            face_config = model_config.get("face_recognition", {})
-                            
-                            # Get model name from config
-                            model_name = face_config.get('model_name', 'ArcFace (v2.1)')
-                            
-                            config = {
-                                'confidence_threshold': face_config.get('confidence_threshold', 0.75),
-                                'min_face_size': face_config.get('min_face_size', 40),
-                                'cosine_threshold': face_config.get('cosine_threshold', 0.3)
-                            }
-                            print(f"✅ [CONFIG] Loaded from model_config.json:")
-                            print(f"   ├─ Model: {model_name}")
-                            print(f"   ├─ Confidence: {config['confidence_threshold']}")
-                            print(f"   ├─ Min Face Size: {config['min_face_size']}px")
-                            print(f"   └─ Cosine Threshold: {config['cosine_threshold']}")
-                    except FileNotFoundError:
-                        print(f"⚠️  [CONFIG] model_config.json not found, using defaults")
-                    except Exception as e:
-                        print(f"⚠️  [CONFIG] Error loading config: {e}, using defaults")
-                    
-                    # Load model dynamically based on model_name
-                    print(f"\n🤖 [MODEL] Loading {model_name}...")
-                    model = None
-                    
-                    if "ArcFace" in model_name:
-                        # Sử dụng singleton model
-                        model = get_arcface_model(config)
-                        if model:
-                            print(f"✅ [MODEL] ArcFace model loaded successfully!")
-                        else:
-                            print(f"❌ [MODEL ERROR] Failed to get ArcFace model")
-
-                        
-                    elif "FaceNet" in model_name:
-                        print(f"❌ [MODEL ERROR] FaceNet chưa được triển khai!")
-                        print(f"   Vui lòng chọn ArcFace trong Model Test UI")
-                        
-                        # Update UI
-                        dialog_message.value = "❌ Model FaceNet chưa được hỗ trợ!\nVui lòng chọn ArcFace trong cài đặt."
-                        dialog_message.color = ft.Colors.RED
-                        progress_ring.visible = False
-                        processing = False
-                        dialog_message.update()
-                        progress_ring.update()
-                        return  # Stop execution
-                        
-                    elif "DeepFace" in model_name:
-                        print(f"❌ [MODEL ERROR] DeepFace chưa được triển khai!")
-                        print(f"   Vui lòng chọn ArcFace trong Model Test UI")
-                        
-                        # Update UI
-                        dialog_message.value = "❌ Model DeepFace chưa được hỗ trợ!\nVui lòng chọn ArcFace trong cài đặt."
-                        dialog_message.color = ft.Colors.RED
-                        progress_ring.visible = False
-                        processing = False
-                        dialog_message.update()
-                        progress_ring.update()
-                        return  # Stop execution
-                    
-                    else:
-                        print(f"❌ [MODEL ERROR] Unknown model: {model_name}")
-                        
-                        # Update UI
-                        dialog_message.value = f"❌ Model không xác định: {model_name}"
-                        dialog_message.color = ft.Colors.RED
-                        progress_ring.visible = False
-                        processing = False
-                        dialog_message.update()
-                        progress_ring.update()
-                        return  # Stop execution
-                    
-                    # Final check if model loaded successfully
+                    model = load_login_model()
                     if model is None:
-                        print(f"❌ [MODEL ERROR] Failed to load model: {model_name}")
-                        print(f"   This should not happen if model_name is correct")
-                        
-                        # Update UI
-                        dialog_message.value = f"❌ Lỗi: Không thể load model {model_name}"
-                        dialog_message.color = ft.Colors.RED
-                        progress_ring.visible = False
-                        processing = False
-                        dialog_message.update()
-                        progress_ring.update()
                         return
                     
-                    # Đọc tất cả user accounts
-                    print(f"📂 [FILE] Loading accounts.json...")
-                    accounts_path = os.path.join(os.path.dirname(__file__), "..", "..", "data", "accounts.json")
-                    print(f"📂 [FILE] Path: {accounts_path}")
-                    with open(accounts_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        user_accounts = data.get("user_accounts", [])
-                    
-                    print(f"🔍 [SCAN] Đang quét {len(user_accounts)} tài khoản...")
-                    dialog_message.value = "🔍 Đang tải AI models..."
+                    dialog_message.value = f"🔍 Đang nhận diện trong {len(model.gallery)} tài khoản..."
                     dialog_message.update()
                     
-                    # Quét từng account
+                    # Trích xuất embedding của ảnh hiện tại đúng 1 lần,
+                    # so với toàn bộ gallery bằng 1 phép nhân ma trận-vector
                     matched_account = None
                     best_similarity = 0.0
-                    accounts_with_face = [acc for acc in user_accounts if acc.get('face_data')]
-                    total_accounts = len(accounts_with_face)
+                    ranking = model.identify(frame, top_k=1)
                     
-                    print(f"🔍 [SCAN] Tìm thấy {total_accounts} tài khoản có face data")
-                    
-                    for idx, account in enumerate(accounts_with_face, 1):
-                        username = account['username']
-                        password = account['password']  # Lấy password từ JSON
-                        
-                        # Update UI với progress
-                        dialog_message.value = f"🔍 Đang quét ({idx}/{total_accounts}): {account.get('name', username)}..."
-                        dialog_message.update()
-                        
-                        print(f"  → [{idx}/{total_accounts}] Kiểm tra: {username}")
+                    if not ranking:
+                        print(f"⚠️  [SCAN] Không trích xuất được embedding từ ảnh")
+                    else:
+                        best_username, best_similarity = ranking[0]
+                        matched = best_similarity >= model.cosine_threshold
                         
-                        try:
-                            # Verify face
-                            matched, similarity = model.verify_face(
-                                captured_image_path,
-                                username,
-                                password
-                            )
-                            
-                            print(f"    Similarity: {similarity:.2%} ({'✅ MATCH' if matched else '❌ NO MATCH'})")
-                            
-                            if matched and similarity > best_similarity:
-                                best_similarity = similarity
-                                matched_account = account
-                                
-                                # Early termination nếu match rất cao (>90%)
-                                if similarity > 0.90:
-                                    print(f"    ⚡ High confidence match! Early termination.")
-                                    break
+                        print(f"    Best: {best_username} - Similarity: {best_similarity:.2%} ({'✅ MATCH' if matched else '❌ NO MATCH'})")
                         
-                        except Exception as e:
-                            print(f"    ⚠️  Lỗi khi verify {username}: {e}")
-                            continue
+                        if matched:
+                            matched_account = find_account(best_username)
                     
                     # Kết quả
                     if matched_account:
-                        print(f"\n✅ [SUCCESS] Tìm thấy: {matched_account['name']} ({best_similarity:.2%})")
-                        
-                        dialog_message.value = f"✅ Xin chào {matched_account['name']}!"
-                        dialog_message.color = ft.Colors.GREEN
-                        
-                        # Show success snackbar
-                        self.page.open(ft.SnackBar(
-                            ft.Text(f"✅ Đăng nhập thành công! Xin chào {matched_account['name']}"),
-                            bgcolor=ft.Colors.GREEN_600
-                        ))
-                        
-                        # Đóng dialog và chuyển trang
-                        import time
-                        time.sleep(1.5)
-                        close_dialog()
-                        
-                        # Chuyển sang main user với thông tin tài khoản
-                        self.page.controls.clear()
-                        self.page.update()
-                        laucher_user.main(self.page, self.go_back_callback, user_account=matched_account)
-                    else:
-                        print(f"\n❌ [FAILED] Không tìm thấy khuôn mặt khớp")
-                        
-                        dialog_message.value = "❌ Không tìm thấy khuôn mặt trong hệ thống"
-                        dialog_message.color = ft.Colors.RED
-                        processing = False
+                        finish_login(matched_account, best_similarity)
+                        return
                     
-                    progress_ring.visible = False
-                    dialog_message.update()
-                    progress_ring.update()
+                    print(f"\n❌ [FAILED] Không tìm thấy khuôn mặt khớp")
+                    show_error("❌ Không tìm thấy khuôn mặt trong hệ thống")
                     self.page.update()
                     
                 except FileNotFoundError:
                     print(f"❌ [ERROR] Không tìm thấy file accounts.json")
-                    dialog_message.value = "❌ Lỗi: Không tìm thấy dữ liệu tài khoản"
-                    dialog_message.color = ft.Colors.RED
-                    progress_ring.visible = False
-                    processing = False
-                    dialog_message.update()
-                    progress_ring.update()
+                    show_error("❌ Lỗi: Không tìm thấy dữ liệu tài khoản")
                 except Exception as ex:
                     print(f"❌ [ERROR] Face login failed: {ex}")
                     import traceback
                     traceback.print_exc()
-                    dialog_message.value = f"❌ Lỗi: {str(ex)}"
-                    dialog_message.color = ft.Colors.RED
-                    progress_ring.visible = False
-                    processing = False
-                    dialog_message.update()
-                    progress_ring.update()
+                    show_error(f"❌ Lỗi: {str(ex)}")
             
             # Chạy trong background thread
             # Start background thread
@@ -1622,6 +1624,8 @@ class UserUI:
             nonlocal camera
             if camera:
                 camera.stop()
+            if stream:
+                stream.stop()
             self.page.close(face_dialog)
             self.page.update()
         
@@ -1634,13 +1638,20 @@ class UserUI:
             camera = LiveCameraPreview(camera_index=0)
             success = camera.start(
                 on_frame_callback=update_frame,
-                on_auto_capture=on_auto_capture
+                on_auto_capture=None if streaming_enabled else on_auto_capture
             )
             
             if success:
-                dialog_message.value = "✅ Camera sẵn sàng - Hãy đặt mặt vào khung oval"
-                dialog_message.color = ft.Colors.GREEN_700
-                dialog_message.update()
+                if streaming_enabled:
+                    # Preview chạy ngay, model nạp song song rồi mới gắn worker nhận diện
+                    dialog_message.value = "🔍 Đang tải AI models..."
+                    dialog_message.color = ft.Colors.ORANGE
+                    dialog_message.update()
+                    threading.Thread(target=start_streaming, daemon=True).start()
+                else:
+                    dialog_message.value = "✅ Camera sẵn sàng - Hãy đặt mặt vào khung oval"
+                    dialog_message.color = ft.Colors.GREEN_700
+                    dialog_message.update()
             else:
                 dialog_message.value = "❌ Không thể mở camera"
                 dialog_message.color = ft.Colors.RED
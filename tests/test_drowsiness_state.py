@@ -0,0 +1,88 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.BUS.ai_core.laucher_user.drowsiness_state import DrowsinessStateMachine
+
+FRAME = 0.1
+
+
+def feed(machine, scores, start=0.0):
+    """Đưa chuỗi score (mỗi frame cách nhau FRAME giây), trả về (sự kiện, timestamp kế tiếp)"""
+    events = []
+    t = start
+    for score in scores:
+        event = machine.update(score, t)
+        if event is not None:
+            events.append(event)
+        t += FRAME
+    return events, t
+
+
+def test_single_missed_detection_does_not_reset_closure():
+    machine = DrowsinessStateMachine({'perclos_alert': 0})
+
+    events, t = feed(machine, [0.9] * 8)
+    closure_start = machine.closure_start
+    # 1 frame không thấy mắt nhắm (< recovery_seconds) rồi nhắm tiếp
+    more, t = feed(machine, [0.0] + [0.9] * 3, start=t)
+
+    assert events == [] and more == []
+    assert machine.is_closed
+    assert machine.closure_start == closure_start
+
+
+def test_score_between_thresholds_keeps_state():
+    machine = DrowsinessStateMachine({'closed_threshold': 0.5, 'open_threshold': 0.2, 'perclos_alert': 0})
+
+    _, t = feed(machine, [0.3] * 5)
+    assert not machine.is_closed
+
+    _, t = feed(machine, [0.8], start=t)
+    _, t = feed(machine, [0.3] * 5, start=t)
+    assert machine.is_closed
+
+
+def test_microsleep_start_and_stop_events():
+    machine = DrowsinessStateMachine({'perclos_alert': 0, 'microsleep_seconds': 1.5, 'recovery_seconds': 0.3})
+
+    events, t = feed(machine, [0.9] * 20)
+    assert [e['type'] for e in events] == ['start']
+    assert events[0]['reason'] == 'microsleep'
+    assert events[0]['duration'] == pytest.approx(1.5)
+
+    events, t = feed(machine, [0.0] * 5, start=t)
+    assert [e['type'] for e in events] == ['stop']
+    assert not machine.is_alerting and not machine.is_closed
+
+
+def test_blinks_do_not_alert_but_are_counted():
+    machine = DrowsinessStateMachine({'perclos_alert': 0, 'recovery_seconds': 0.0, 'window_seconds': 30.0})
+
+    # 1 lần chớp 0.2s mỗi giây trong 20s
+    pattern = ([0.9] * 2 + [0.0] * 8) * 20
+    events, _ = feed(machine, pattern)
+
+    assert events == []
+    assert machine.blink_rate == pytest.approx(60.0, rel=0.1)
+
+
+def test_perclos_over_window():
+    machine = DrowsinessStateMachine({'perclos_alert': 0, 'recovery_seconds': 0.0, 'window_seconds': 10.0})
+
+    # Nhắm 0.4s / mở 0.6s lặp lại → PERCLOS ~ 0.4
+    feed(machine, ([0.9] * 4 + [0.0] * 6) * 30)
+    assert machine.perclos == pytest.approx(0.4, abs=0.02)
+
+    # Mở mắt lâu hơn cửa sổ → mẫu cũ bị loại, PERCLOS về 0
+    feed(machine, [0.0] * 120, start=30.0)
+    assert machine.perclos == pytest.approx(0.0, abs=1e-6)
+
+
+def test_high_perclos_raises_alert():
+    machine = DrowsinessStateMachine({'perclos_alert': 0.3, 'recovery_seconds': 0.0, 'window_seconds': 10.0})
+
+    events, _ = feed(machine, ([0.9] * 5 + [0.0] * 5) * 10)
+
+    assert events and events[0]['type'] == 'start'
+    assert events[0]['reason'] == 'perclos'